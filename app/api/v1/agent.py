@@ -11,15 +11,21 @@ from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.config import get_settings
-from app.database import SessionLocal, get_db
-from app.services import agent_signal
+from app.database import SessionLocal, get_db, run_agent_db
+from app.services import agent_credential_cache, agent_signal
+from app.services import liveness_buffer
+from app.services import pending_work_service
+from app.services.agent_credential_cache import AgentCredential
 from app.services import announcement_service
-from app.models import Agent, AgentApplication, AgentSoftwareInventory, AgentStatusHistory, Application, Setting, TaskHistory
+from app.models import Agent, AgentApplication, AgentSoftwareInventory, AgentStatusHistory, Application, TaskHistory
 from app.services.heartbeat_service import process_heartbeat
 from app.services import runtime_config_service as runtime_config
+from app.services import settings_snapshot_service
+from app.services import software_catalog
 from app.schemas import (
     AnnouncementAckRequest,
     AgentConfig,
+    AgentInventoryDeltaRequest,
     AgentInventoryRequest,
     AgentInventoryResponse,
     AgentRegisterRequest,
@@ -35,6 +41,7 @@ from app.schemas import (
 )
 from app.services.deployment_service import queue_store_install_for_agent
 from app.services import inventory_service
+from app.services import inventory_upload
 from app.services import remote_support_service as rs
 from app.utils.file_handler import parse_range_header
 
@@ -100,10 +107,7 @@ settings = get_settings()
 
 
 def _get_setting(db: Session, key: str, default: str) -> str:
-    setting = db.query(Setting).filter(Setting.key == key).first()
-    if not setting:
-        return default
-    return setting.value
+    return settings_snapshot_service.get_snapshot(db).get_str(key, default)
 
 
 def _agent_config(db: Session) -> AgentConfig:
@@ -115,7 +119,8 @@ def _agent_config(db: Session) -> AgentConfig:
 
 def _authenticate_agent(db: Session, agent_uuid: str, agent_secret: str) -> Agent:
     agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
-    if agent and agent.secret_key and agent.secret_key == agent_secret:
+    if agent and agent_credential_cache.secrets_match(agent.secret_key, agent_secret):
+        agent_credential_cache.remember(agent_uuid, agent_secret, agent.platform)
         return agent
 
     recovery_enabled = _get_setting(db, "agent_auth_recovery_enabled", "false").strip().lower() in ("1", "true", "yes", "on")
@@ -137,6 +142,8 @@ def _authenticate_agent(db: Session, agent_uuid: str, agent_secret: str) -> Agen
             db.add(agent)
         db.commit()
         db.refresh(agent)
+        agent_credential_cache.invalidate(agent_uuid)
+        agent_credential_cache.remember(agent_uuid, agent_secret, agent.platform)
         # Recovery sonrasi ozellikle signal isteginde gelen ajanlar icin
         # hemen tam heartbeat/snapshot cekilmesini tetikle.
         agent_signal.notify_agent(agent_uuid)
@@ -145,6 +152,19 @@ def _authenticate_agent(db: Session, agent_uuid: str, agent_secret: str) -> Agen
     raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid agent credentials")
 
 
+def _authenticate_agent_identity(db: Session, agent_uuid: str, agent_secret: str) -> AgentCredential:
+    """Like _authenticate_agent, for endpoints that only need uuid/platform (no ORM hydration)."""
+    cached = agent_credential_cache.verify(agent_uuid, agent_secret)
+    if cached is not None:
+        return cached
+    row = db.query(Agent.secret_key, Agent.platform).filter(Agent.uuid == agent_uuid).first()
+    if row and agent_credential_cache.secrets_match(row.secret_key, agent_secret):
+        return agent_credential_cache.remember(agent_uuid, agent_secret, row.platform)
+    # Miss/mismatch: full path handles recovery and the 401.
+    agent = _authenticate_agent(db, agent_uuid, agent_secret)
+    return agent_credential_cache.remember(agent_uuid, agent_secret, agent.platform)
+
+
 def _normalize_platform(value: str | None) -> str:
     platform = (value or "windows").strip().lower()
     if platform not in VALID_PLATFORMS:
@@ -167,6 +187,7 @@ def _mark_agent_online_from_signal(agent_uuid: str) -> None:
         if not agent:
             return
         now = datetime.now(timezone.utc)
+        liveness_buffer.discard(agent_uuid)
         old_status = agent.status
         agent.status = "online"
         agent.last_seen = now
@@ -195,7 +216,7 @@ def _mark_agent_offline_if_signal_stale(agent_uuid: str, disconnected_at: dateti
             return
         now = datetime.now(timezone.utc)
         disconnected_utc = _as_utc(disconnected_at)
-        last_seen_utc = _as_utc(agent.last_seen)
+        last_seen_utc = _as_utc(liveness_buffer.pending_last_seen(agent_uuid) or agent.last_seen)
         # If we already observed a fresher update, skip stale disconnect transition.
         if last_seen_utc and disconnected_utc and last_seen_utc > disconnected_utc:
             return
@@ -224,6 +245,7 @@ def register_agent(payload: AgentRegisterRequest, db: Session = Depends(get_db))
     platform = _normalize_platform(payload.platform)
     agent = db.query(Agent).filter(Agent.uuid == payload.uuid).first()
     if agent:
+        software_catalog.move_agent(db, agent.uuid, agent.platform, platform)
         agent.hostname = payload.hostname
         agent.os_version = payload.os_version
         agent.platform = platform
@@ -260,26 +282,37 @@ def register_agent(payload: AgentRegisterRequest, db: Session = Depends(get_db))
 
     db.commit()
     db.refresh(agent)
+    agent_credential_cache.invalidate(agent.uuid)
 
     return AgentRegisterResponse(secret_key=agent.secret_key, config=_agent_config(db))
 
 
 @router.post("/heartbeat", response_model=HeartbeatResponse)
-def heartbeat(
+async def heartbeat(
     payload: HeartbeatRequest,
     x_agent_uuid: str = Header(..., alias="X-Agent-UUID"),
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
-    db: Session = Depends(get_db),
 ) -> HeartbeatResponse:
+    return await run_agent_db(_handle_heartbeat, payload, x_agent_uuid, x_agent_secret)
+
+
+def _handle_heartbeat(db: Session, payload: HeartbeatRequest, x_agent_uuid: str, x_agent_secret: str) -> HeartbeatResponse:
     agent = _authenticate_agent(db, x_agent_uuid, x_agent_secret)
     if payload.platform is not None:
-        agent.platform = _normalize_platform(payload.platform)
-    now, config, commands, _inv_sync, pending_announcements = process_heartbeat(db, agent, payload)
+        new_platform = _normalize_platform(payload.platform)
+        software_catalog.move_agent(db, agent.uuid, agent.platform, new_platform)
+        agent.platform = new_platform
+        agent_credential_cache.update_platform(x_agent_uuid, agent.platform)
+    work_checked_at = datetime.now(timezone.utc)
+    has_work = pending_work_service.has_pending(db, x_agent_uuid)
+    now, config, commands, _inv_sync, pending_announcements = process_heartbeat(
+        db, agent, payload, check_pending_work=has_work
+    )
 
     remote_req: RemoteSupportRequest | None = None
     remote_end: RemoteSupportEnd | None = None
     remote_support_allowed = runtime_config.is_remote_support_enabled(db) and bool(getattr(config, "remote_support_enabled", False))
-    if remote_support_allowed:
+    if remote_support_allowed and has_work:
         pending = rs.get_pending_for_agent(db, x_agent_uuid)
         if pending:
             remote_req = RemoteSupportRequest(
@@ -295,6 +328,9 @@ def heartbeat(
             if end_sig:
                 remote_end = RemoteSupportEnd(session_id=end_sig.id)
                 rs.mark_end_signal_delivered(db, end_sig.id, x_agent_uuid)
+    # A pending approval request is re-sent on every beat until the agent answers.
+    if has_work and remote_req is None:
+        pending_work_service.clear(x_agent_uuid, work_checked_at)
 
     return HeartbeatResponse(
         server_time=now,
@@ -313,7 +349,7 @@ def acknowledge_announcement(
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
 ):
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
     announcement_service.process_agent_ack(db, x_agent_uuid, payload.announcement_id)
     return {"status": "ok"}
 
@@ -324,11 +360,9 @@ async def wait_for_signal(
     x_agent_uuid: str = Header(..., alias="X-Agent-UUID"),
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
 ):
-    db = next(get_db())
-    try:
-        _authenticate_agent(db, x_agent_uuid, x_agent_secret)
-    finally:
-        db.close()
+    # Cache hit: no DB session at all for the long-poll re-auth.
+    if agent_credential_cache.verify(x_agent_uuid, x_agent_secret) is None:
+        await run_agent_db(_authenticate_agent_identity, x_agent_uuid, x_agent_secret)
     event = agent_signal.get_or_create_event(x_agent_uuid)
     agent_signal.mark_listener_active(x_agent_uuid)
     hold_timeout = min(timeout, SIGNAL_MAX_HOLD_SEC)
@@ -350,7 +384,7 @@ def download_application(
     range_header: str = Header(None, alias="Range"),
     db: Session = Depends(get_db),
 ):
-    agent = _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    agent = _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
 
     app = db.query(Application).filter(Application.id == app_id, Application.is_active.is_(True)).first()
     if not app:
@@ -415,14 +449,23 @@ def download_application(
 
 
 @router.post("/task/{task_id}/status", response_model=MessageResponse)
-def report_task_status(
+async def report_task_status(
     task_id: int,
     payload: TaskStatusRequest,
     x_agent_uuid: str = Header(..., alias="X-Agent-UUID"),
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
-    db: Session = Depends(get_db),
 ) -> MessageResponse:
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    return await run_agent_db(_handle_task_status, task_id, payload, x_agent_uuid, x_agent_secret)
+
+
+def _handle_task_status(
+    db: Session,
+    task_id: int,
+    payload: TaskStatusRequest,
+    x_agent_uuid: str,
+    x_agent_secret: str,
+) -> MessageResponse:
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
 
     task = db.query(TaskHistory).filter(TaskHistory.id == task_id).first()
     if not task:
@@ -485,18 +528,46 @@ def submit_inventory(
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
 ) -> AgentInventoryResponse:
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
     changes = inventory_service.submit_inventory(db, x_agent_uuid, payload.inventory_hash, payload.items)
     return AgentInventoryResponse(message="Inventory updated", changes=changes)
 
 
-@router.get("/store", response_model=StoreResponse)
-def get_store_applications(
+@router.post("/inventory/delta", response_model=AgentInventoryResponse)
+def submit_inventory_delta(
+    payload: AgentInventoryDeltaRequest,
     x_agent_uuid: str = Header(..., alias="X-Agent-UUID"),
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
+) -> AgentInventoryResponse:
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
+    changes = inventory_service.apply_inventory_delta(
+        db,
+        x_agent_uuid,
+        payload.base_hash,
+        payload.new_hash,
+        payload.software_count,
+        payload.added,
+        payload.removed,
+        payload.changed,
+    )
+    inventory_upload.note_delta(changes is not None, len(payload.added) + len(payload.removed) + len(payload.changed))
+    if changes is None:
+        # Not an error: the agent falls back to POST /inventory with the full list.
+        return AgentInventoryResponse(status="full_sync_required", message="Full inventory sync required", changes={})
+    return AgentInventoryResponse(message="Inventory updated", changes=changes)
+
+
+@router.get("/store", response_model=StoreResponse)
+async def get_store_applications(
+    x_agent_uuid: str = Header(..., alias="X-Agent-UUID"),
+    x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
 ) -> StoreResponse:
-    agent = _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    return await run_agent_db(_handle_store, x_agent_uuid, x_agent_secret)
+
+
+def _handle_store(db: Session, x_agent_uuid: str, x_agent_secret: str) -> StoreResponse:
+    agent = _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
     agent_platform = _normalize_platform(getattr(agent, "platform", None))
 
     rows = (
@@ -558,7 +629,7 @@ def install_from_store(
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
 ) -> MessageResponse:
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
     status_key, message = queue_store_install_for_agent(db, x_agent_uuid, app_id)
     return MessageResponse(status=status_key, message=message)
 
@@ -570,7 +641,7 @@ def download_agent_update(
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
 ):
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
 
     safe_name = Path(filename).name
     file_path = (Path(settings.upload_dir) / "agent_updates" / safe_name).resolve()
@@ -4,13 +4,14 @@ import asyncio
 import json
 import logging
 import time
+from collections import OrderedDict
 from datetime import datetime, timezone
 from typing import Any
 
 from fastapi import APIRouter, WebSocket
 from starlette.websockets import WebSocketDisconnect
 
-from app.database import get_db
+from app.database import run_agent_db, run_db_in_thread
 from app.models import (
     Agent,
     AgentApplication,
@@ -18,13 +19,22 @@ from app.models import (
     AgentStatusHistory,
     Announcement,
     AnnouncementDelivery,
-    Setting,
+    TaskHistory,
 )
-from app.schemas import ServiceItem
+from app.schemas import AgentInventoryDeltaRequest, ServiceItem
+from app.services import agent_credential_cache
 from app.services import announcement_service
+from app.services import event_bus
 from app.services import remote_support_service as rs
 from app.services import inventory_service
+from app.services import inventory_upload
+from app.services import software_catalog
+from app.services import liveness_buffer
+from app.services import pending_work_service
 from app.services import runtime_config_service as runtime_config
+from app.services import settings_snapshot_service
+from app.services import ws_admission
+from app.services import ws_codec
 from app.services.heartbeat_service import (
     _diff_services,
     _diff_system_profile,
@@ -43,6 +53,13 @@ from app.services.ws_manager import make_message, ws_manager
 router = APIRouter(tags=["agent"])
 logger = logging.getLogger("appcenter.ws.agent")
 MAX_MESSAGE_BYTES = 64 * 1024
+# task_id -> deployment_id for server.task.update topic routing (a task never changes deployment).
+TASK_DEPLOYMENT_CACHE_MAX = 4096
+_task_deployments: OrderedDict[int, int | None] = OrderedDict()
+# Inventory writes (up to inventory_upload.MAX_ITEMS rows of cleaning, matching
+# and diffing) run in the thread pool; this caps how many threads they hold.
+MAX_CONCURRENT_INVENTORY_WRITES = 4
+_inventory_write_slots = asyncio.Semaphore(MAX_CONCURRENT_INVENTORY_WRITES)
 
 
 def _utcnow() -> datetime:
@@ -54,11 +71,7 @@ def _utc_iso() -> str:
 
 
 def _setting_map(db, keys: list[str]) -> dict[str, str]:
-    rows = db.query(Setting).filter(Setting.key.in_(keys)).all()
-    out = {r.key: (r.value or "") for r in rows}
-    for key in keys:
-        out.setdefault(key, "")
-    return out
+    return settings_snapshot_service.get_snapshot(db).get_map(keys)
 
 
 def _to_bool(value: str | None, default: bool = False) -> bool:
@@ -117,10 +130,20 @@ async def _send_auth_error_and_close(websocket: WebSocket, code: int, message: s
     await websocket.close(code=code)
 
 
-def _parse_message(raw_text: str) -> tuple[str, dict[str, Any]]:
-    data = json.loads(raw_text)
+async def _receive_frame(websocket: WebSocket) -> ws_codec.Frame:
+    """Next text or binary frame (binary = MessagePack once negotiated)."""
+    message = await websocket.receive()
+    if message["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(message.get("code", 1000))
+    if message.get("bytes") is not None:
+        return message["bytes"]
+    return message.get("text") or ""
+
+
+def _parse_message(raw: ws_codec.Frame, codec: str = ws_codec.CODEC_JSON) -> tuple[str, dict[str, Any]]:
+    data = ws_codec.decode(codec, raw)
     if not isinstance(data, dict):
-        raise ValueError("Message must be a JSON object")
+        raise ValueError("Message must be an object")
     msg_type = str(data.get("type") or "").strip()
     payload = data.get("payload")
     if not isinstance(payload, dict):
@@ -128,24 +151,567 @@ def _parse_message(raw_text: str) -> tuple[str, dict[str, Any]]:
     return msg_type, payload
 
 
+def _load_ws_settings(db) -> dict[str, str]:
+    return _setting_map(
+        db,
+        [
+            "ws_agent_enabled",
+            "ws_auth_timeout_sec",
+            "ws_ping_interval_sec",
+            "ws_ping_timeout_sec",
+            "ws_resume_enabled",
+            "ws_resume_token_ttl_sec",
+            "ws_admission_rate_per_sec",
+            "ws_admission_burst",
+            "agent_auth_recovery_enabled",
+        ],
+    )
+
+
+def _authenticate_ws_agent(db, req_uuid: str, req_secret: str, settings_map: dict[str, str]) -> str | None:
+    agent = db.query(Agent).filter(Agent.uuid == req_uuid).first()
+    if agent and agent_credential_cache.secrets_match(agent.secret_key, req_secret):
+        agent_credential_cache.remember(req_uuid, req_secret, agent.platform)
+        return agent.uuid
+    recovery_enabled = _to_bool(settings_map.get("agent_auth_recovery_enabled"), default=False)
+    if not recovery_enabled:
+        return None
+    now = _utcnow()
+    if not agent:
+        agent = Agent(
+            uuid=req_uuid,
+            hostname=req_uuid,
+            status="online",
+            last_seen=now,
+            updated_at=now,
+            secret_key=req_secret,
+        )
+        db.add(agent)
+    else:
+        agent.secret_key = req_secret
+        agent.updated_at = now
+        db.add(agent)
+    db.commit()
+    db.refresh(agent)
+    agent_credential_cache.invalidate(req_uuid)
+    agent_credential_cache.remember(req_uuid, req_secret, agent.platform)
+    return agent.uuid
+
+
+def _apply_hello(db, agent_uuid: str, hello_payload: dict[str, Any]) -> None:
+    now = _utcnow()
+    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
+    if not agent:
+        return
+    full_ip_list: list[str] = []
+    for raw in hello_payload.get("full_ip") or []:
+        ip = (str(raw) or "").strip()
+        if ip and ip not in full_ip_list:
+            full_ip_list.append(ip)
+    payload_ip = (hello_payload.get("ip_address") or "").strip() or None
+    persisted_ip = (agent.ip_address or "").strip() or None
+    persisted_full_ip_first: str | None = None
+    if not payload_ip and not full_ip_list and agent.full_ip:
+        try:
+            existing_full = json.loads(agent.full_ip)
+            if isinstance(existing_full, list):
+                for raw in existing_full:
+                    ip = (str(raw) if raw is not None else "").strip()
+                    if ip:
+                        persisted_full_ip_first = ip
+                        break
+        except Exception:
+            persisted_full_ip_first = None
+    effective_ip = payload_ip or (full_ip_list[0] if full_ip_list else None) or persisted_ip or persisted_full_ip_first
+
+    old_hostname = agent.hostname
+    old_ip = agent.ip_address
+    new_hostname = (hello_payload.get("hostname") or "").strip() or agent.hostname
+    new_ip = effective_ip
+    if (old_hostname and new_hostname and old_hostname != new_hostname) or (
+        (old_ip or "") != (new_ip or "")
+    ):
+        db.add(
+            AgentIdentityHistory(
+                agent_uuid=agent.uuid,
+                detected_at=now,
+                old_hostname=old_hostname,
+                new_hostname=new_hostname,
+                old_ip_address=old_ip,
+                new_ip_address=new_ip,
+            )
+        )
+
+    old_status = agent.status
+    agent.hostname = new_hostname
+    agent.ip_address = effective_ip
+    if full_ip_list:
+        agent.full_ip = json.dumps(full_ip_list)
+    agent.os_version = (hello_payload.get("os_version") or agent.os_version)
+    new_platform = hello_payload.get("platform") or agent.platform or "windows"
+    software_catalog.move_agent(db, agent.uuid, agent.platform, new_platform)
+    agent.platform = new_platform
+    agent.arch = (hello_payload.get("arch") or agent.arch)
+    agent.distro = (hello_payload.get("distro") or agent.distro)
+    agent.distro_version = (hello_payload.get("distro_version") or agent.distro_version)
+    agent_version = hello_payload.get("agent_version") or hello_payload.get("version", "")
+    agent.version = (agent_version or agent.version)
+    agent.cpu_model = (hello_payload.get("cpu_model") or agent.cpu_model)
+    if hello_payload.get("ram_gb") is not None:
+        try:
+            agent.ram_gb = int(hello_payload.get("ram_gb"))
+        except Exception:
+            pass
+    agent.status = "online"
+    agent.last_seen = now
+    agent.updated_at = now
+    db.add(agent)
+    if old_status != agent.status:
+        db.add(
+            AgentStatusHistory(
+                agent_uuid=agent.uuid,
+                detected_at=now,
+                old_status=old_status,
+                new_status=agent.status,
+                reason="ws_hello",
+            )
+        )
+    db.commit()
+
+
+def _build_agent_config(db, agent_uuid: str, platform: str) -> dict[str, Any]:
+    # Served from the settings snapshot / capability index; no per-agent queries.
+    config = get_heartbeat_config(db, platform or "windows").model_dump()
+    config["store_tray_enabled"] = _is_store_tray_enabled_for_agent(db, agent_uuid)
+    config["remote_support_enabled"] = runtime_config.is_remote_support_enabled(db) and _is_remote_support_enabled_for_agent(db, agent_uuid)
+    config["inventory_scan_interval_min"] = _to_int(
+        _setting_map(db, ["inventory_scan_interval_min"]).get("inventory_scan_interval_min"),
+        10,
+    )
+    return config
+
+
+def _build_server_hello(
+    db, agent_uuid: str, hello_payload: dict[str, Any] | None = None, resume_ttl_sec: int = 0
+) -> dict[str, Any] | None:
+    """server.hello payload (config + pending work); None when the agent row is gone."""
+    now = _utcnow()
+    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
+    if not agent:
+        return None
+
+    config = _build_agent_config(db, agent.uuid, agent.platform or "windows")
+
+    pending_commands: list[dict] = []
+    pending_rs_request = None
+    pending_rs_end = None
+    pending_announcements: list[dict] = []
+    has_work = pending_work_service.has_pending(db, agent.uuid)
+    if has_work:
+        pending_commands = [c.model_dump() for c in _pending_commands(db, agent, now)]
+        pending_announcements = announcement_service.deliver_pending_to_agent(db, agent.uuid)
+        if pending_announcements:
+            _mark_pending_announcements_delivered(db, agent.uuid, pending_announcements, now)
+        try:
+            req = rs.get_pending_for_agent(db, agent.uuid)
+            if req:
+                pending_rs_request = {
+                    "session_id": req.id,
+                    "admin_name": rs.admin_name_for_session(db, req),
+                    "reason": req.reason or "",
+                    "requested_at": req.requested_at.isoformat() if req.requested_at else None,
+                    "timeout_at": req.approval_timeout_at.isoformat() if req.approval_timeout_at else None,
+                    "requires_approval": rs.is_approval_required_for_agent(db, agent.uuid),
+                }
+            else:
+                end_sig = rs.get_end_signal_for_agent(db, agent.uuid)
+                if end_sig:
+                    pending_rs_end = {"session_id": end_sig.id}
+                    rs.mark_end_signal_delivered(db, end_sig.id, agent.uuid)
+        except Exception:
+            pending_rs_request = None
+            pending_rs_end = None
+
+    db.commit()
+    if has_work and pending_rs_request is None:
+        pending_work_service.clear(agent_uuid, now)
+
+    out = {
+        "server_time": _utc_iso(),
+        "config": config,
+        "pending_commands": pending_commands,
+        "pending_rs_request": pending_rs_request,
+        "pending_rs_end": pending_rs_end,
+        "pending_announcements": pending_announcements,
+    }
+    if resume_ttl_sec > 0:
+        out["resume_token"] = ws_admission.issue_resume_token(
+            agent.uuid, agent.platform or "windows", config, hello_payload, resume_ttl_sec
+        )
+    return out
+
+
+def _try_resume(
+    db, agent_uuid: str, claims: dict[str, Any], hello_payload: dict[str, Any] | None, resume_ttl_sec: int
+) -> dict[str, Any] | None:
+    """Abbreviated server.hello when nothing changed since the token was issued; None -> full hello."""
+    if claims.get("hh") != ws_admission.hello_hash(hello_payload):
+        return None
+    if pending_work_service.has_pending(db, agent_uuid):
+        return None
+    platform = str(claims.get("pf") or "windows")
+    config = _build_agent_config(db, agent_uuid, platform)
+    if claims.get("cfg") != ws_admission.config_hash(config):
+        return None
+
+    now = _utcnow()
+    row = db.query(Agent.status).filter(Agent.uuid == agent_uuid).first()
+    if row is None:
+        return None
+    if row.status != "online":
+        db.query(Agent).filter(Agent.uuid == agent_uuid).update(
+            {Agent.status: "online", Agent.last_seen: now, Agent.updated_at: now}, synchronize_session=False
+        )
+        db.add(
+            AgentStatusHistory(
+                agent_uuid=agent_uuid,
+                detected_at=now,
+                old_status=row.status,
+                new_status="online",
+                reason="ws_resume",
+            )
+        )
+        db.commit()
+    else:
+        liveness_buffer.record(agent_uuid, now, ensure_online=True)
+    return {
+        "server_time": _utc_iso(),
+        "resumed": True,
+        "resume_token": ws_admission.issue_resume_token(agent_uuid, platform, config, hello_payload, resume_ttl_sec),
+    }
+
+
+def _handle_agent_message(
+    db, agent_uuid: str, msg_type: str, payload: dict[str, Any]
+) -> tuple[dict | None, dict | None]:
+    """Apply a state message; returns (UI status delta, reply to agent) for the caller to send."""
+    status_update: dict | None = None
+    reply: dict | None = None
+    now = _utcnow()
+    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
+    if not agent:
+        db.commit()
+        return None, None
+
+    if msg_type == "agent.status":
+        if payload.get("disk_free_gb") is not None:
+            try:
+                agent.disk_free_gb = int(float(payload.get("disk_free_gb")))
+            except Exception:
+                pass
+        if payload.get("uptime_sec") is not None:
+            try:
+                up = int(payload.get("uptime_sec"))
+                if up >= 0:
+                    agent.uptime_sec = up
+            except Exception:
+                pass
+        if payload.get("os_user") is not None:
+            agent.os_user = str(payload.get("os_user") or "").strip() or None
+        agent.status = "online"
+        agent.last_seen = now
+        agent.updated_at = now
+        db.add(agent)
+        status_update = {
+            "uuid": agent.uuid,
+            "hostname": agent.hostname,
+            "status": agent.status,
+            "ip_address": agent.ip_address,
+            "disk_free_gb": agent.disk_free_gb,
+            "cpu_usage": payload.get("cpu_usage"),
+            "ram_usage": payload.get("ram_usage"),
+            "current_status": payload.get("current_status"),
+            "last_seen": now.isoformat(),
+            "comm_mode": "ws",
+        }
+
+    elif msg_type == "agent.apps.changed":
+        apps = payload.get("installed_apps") or []
+        if isinstance(apps, list):
+            for item in apps:
+                if not isinstance(item, dict):
+                    continue
+                app_id = item.get("app_id")
+                version = str(item.get("version") or "").strip()
+                if not app_id:
+                    continue
+                row = (
+                    db.query(AgentApplication)
+                    .filter(AgentApplication.agent_uuid == agent.uuid, AgentApplication.app_id == int(app_id))
+                    .first()
+                )
+                if not row:
+                    row = AgentApplication(
+                        agent_uuid=agent.uuid,
+                        app_id=int(app_id),
+                        status="installed",
+                        installed_version=version or None,
+                        last_attempt=now,
+                    )
+                else:
+                    row.status = "installed"
+                    row.installed_version = version or row.installed_version
+                    row.last_attempt = now
+                db.add(row)
+        agent.last_seen = now
+        db.add(agent)
+
+    elif msg_type == "agent.services.changed":
+        incoming_services = payload.get("services") or []
+        if not isinstance(incoming_services, list):
+            incoming_services = []
+        service_items: list[ServiceItem] = []
+        for raw_item in incoming_services:
+            if not isinstance(raw_item, dict):
+                continue
+            try:
+                service_items.append(ServiceItem.model_validate(raw_item))
+            except Exception:
+                continue
+        normalized = _normalize_services(service_items)
+        incoming_hash = str(payload.get("services_hash") or "").strip() or _hash_json_list(normalized)
+        existing = agent.services or []
+        if agent.services_hash != incoming_hash or existing != normalized:
+            if existing and (agent.services_hash or "").strip():
+                for ch in _diff_services(existing, normalized):
+                    old = ch.get("old")
+                    new = ch.get("new")
+                    ref = new or old or {}
+                    from app.models import AgentServiceHistory
+
+                    db.add(
+                        AgentServiceHistory(
+                            agent_uuid=agent.uuid,
+                            detected_at=now,
+                            service_name=(ref.get("name") or "").strip() or "unknown",
+                            display_name=(ref.get("display_name") or "").strip() or None,
+                            change_type=ch["type"],
+                            old_status=(old or {}).get("status"),
+                            new_status=(new or {}).get("status"),
+                            old_startup_type=(old or {}).get("startup_type"),
+                            new_startup_type=(new or {}).get("startup_type"),
+                            old_payload_json=json.dumps(old) if old else None,
+                            new_payload_json=json.dumps(new) if new else None,
+                        )
+                    )
+            agent.services_json = json.dumps(normalized)
+            agent.services_hash = incoming_hash
+            agent.services_updated_at = now
+            db.add(agent)
+        agent.last_seen = now
+
+    elif msg_type == "agent.system_profile":
+        if isinstance(payload, dict):
+            profile_hash = _hash_json_dict(payload)
+            if agent.system_profile_hash != profile_hash:
+                from app.models import AgentSystemProfileHistory
+
+                changed_fields = _diff_system_profile(agent.system_profile, payload)
+                diff = _diff_system_profile_pairs(agent.system_profile, payload)
+                db.add(
+                    AgentSystemProfileHistory(
+                        agent_uuid=agent.uuid,
+                        detected_at=now,
+                        profile_hash=profile_hash,
+                        profile_json=json.dumps(payload),
+                        changed_fields_json=json.dumps(changed_fields),
+                        diff_json=json.dumps(diff),
+                    )
+                )
+                agent.system_profile_json = json.dumps(payload)
+                agent.system_profile_hash = profile_hash
+                agent.system_profile_updated_at = now
+                db.add(agent)
+        agent.last_seen = now
+
+    elif msg_type == "agent.inventory.hash":
+        incoming_hash = str(payload.get("hash") or "").strip()
+        if incoming_hash and inventory_service.check_inventory_hash(db, agent.uuid, incoming_hash):
+            # WS agents can answer with agent.inventory.begin/chunk/commit instead of HTTP POST /inventory.
+            # Agents whose last submit had base_hash may answer with agent.inventory.delta instead.
+            reply = make_message(
+                "server.inventory.sync_required",
+                {
+                    "ws_upload": True,
+                    "max_chunk_items": inventory_upload.MAX_CHUNK_ITEMS,
+                    "delta": True,
+                    "base_hash": agent.inventory_hash,
+                },
+            )
+        agent.last_seen = now
+        db.add(agent)
+
+    elif msg_type == "agent.rs.status":
+        incoming_state = str(payload.get("state") or "").strip().lower()
+        incoming_sid = int(payload.get("session_id") or 0)
+        active_sid = _resolve_active_remote_session_id(db, agent.uuid)
+        accept = False
+        if active_sid is None:
+            accept = incoming_state in {"idle", "ended", "none", ""}
+        else:
+            accept = (incoming_sid == active_sid) or (
+                incoming_sid == 0 and incoming_state in {"approved", "connecting", "active"}
+            )
+        if accept:
+            agent.remote_support_state = payload.get("state")
+            agent.remote_support_session_id = payload.get("session_id")
+            agent.remote_support_helper_running = bool(payload.get("helper_running"))
+            pid = payload.get("helper_pid")
+            agent.remote_support_helper_pid = int(pid) if pid else None
+            agent.remote_support_updated_at = now
+            db.add(agent)
+        agent.last_seen = now
+
+    else:
+        logger.info("ws agent unknown message uuid=%s type=%s", agent_uuid, msg_type)
+
+    db.commit()
+    return status_update, reply
+
+
+def _task_deployment_id(db, task_id: int) -> int | None:
+    row = db.query(TaskHistory.deployment_id).filter(TaskHistory.id == task_id).first()
+    return row[0] if row else None
+
+
+async def _task_update_topics(agent_uuid: str, task_id_raw: Any) -> tuple[str, ...]:
+    topics = ["agent:" + agent_uuid, "fleet-summary"]
+    # Only resolve the deployment when some UI client follows a deployment topic.
+    # With the event bus the update also reaches other workers, whose UI
+    # subscribers this worker cannot see, so always resolve it there.
+    if event_bus.is_distributed() or ws_manager.has_topic_subscribers("deployment:"):
+        try:
+            task_id = int(task_id_raw)
+        except (TypeError, ValueError):
+            return tuple(topics)
+        if task_id in _task_deployments:
+            _task_deployments.move_to_end(task_id)
+            deployment_id = _task_deployments[task_id]
+        else:
+            deployment_id = await run_agent_db(_task_deployment_id, task_id)
+            _task_deployments[task_id] = deployment_id
+            if len(_task_deployments) > TASK_DEPLOYMENT_CACHE_MAX:
+                _task_deployments.popitem(last=False)
+        if deployment_id is not None:
+            topics.append("deployment:%s" % deployment_id)
+    return tuple(topics)
+
+
+def _inventory_result(ok: bool, **extra: Any) -> dict:
+    return make_message("server.inventory.result", {"ok": ok, **extra})
+
+
+async def _handle_inventory_upload(
+    agent_uuid: str,
+    upload: inventory_upload.ChunkedInventoryUpload | None,
+    msg_type: str,
+    payload: dict[str, Any],
+) -> tuple[inventory_upload.ChunkedInventoryUpload | None, dict | None]:
+    """Advance the connection's chunked upload; returns (upload still in flight, reply)."""
+    try:
+        if msg_type == "agent.inventory.begin":
+            if upload is not None:
+                inventory_upload.note_aborted()
+                upload = None
+            upload = inventory_upload.ChunkedInventoryUpload(payload.get("inventory_hash"), payload.get("software_count"))
+            return upload, make_message(
+                "server.inventory.ready",
+                {"max_chunk_items": inventory_upload.MAX_CHUNK_ITEMS, "max_items": inventory_upload.MAX_ITEMS},
+            )
+        if upload is None:
+            return None, _inventory_result(False, error="no_upload")
+        if msg_type == "agent.inventory.chunk":
+            upload.add_chunk(payload.get("seq"), payload.get("items"))
+            return upload, None
+        items = upload.finish(payload.get("inventory_hash"))
+    except inventory_upload.InventoryUploadError as exc:
+        if upload is not None:
+            inventory_upload.note_aborted()
+        logger.warning("ws agent inventory upload rejected uuid=%s code=%s err=%s", agent_uuid, exc.code, exc)
+        return None, _inventory_result(False, error=exc.code, message=str(exc))
+
+    async with _inventory_write_slots:
+        changes = await run_db_in_thread(inventory_service.submit_inventory, agent_uuid, upload.inventory_hash, items)
+    logger.info("ws agent inventory stored uuid=%s items=%s chunks=%s", agent_uuid, len(items), upload.next_seq)
+    return None, _inventory_result(True, changes=changes, software_count=len(items))
+
+
+async def _handle_inventory_delta(agent_uuid: str, payload: dict[str, Any]) -> dict:
+    try:
+        delta = AgentInventoryDeltaRequest.model_validate(payload)
+    except Exception:
+        return _inventory_result(False, error="invalid", message="invalid inventory delta")
+    async with _inventory_write_slots:
+        changes = await run_db_in_thread(
+            inventory_service.apply_inventory_delta,
+            agent_uuid,
+            delta.base_hash,
+            delta.new_hash,
+            delta.software_count,
+            delta.added,
+            delta.removed,
+            delta.changed,
+        )
+    item_count = len(delta.added) + len(delta.removed) + len(delta.changed)
+    inventory_upload.note_delta(changes is not None, item_count)
+    if changes is None:
+        logger.info("ws agent inventory delta needs full sync uuid=%s base=%s", agent_uuid, delta.base_hash)
+        return _inventory_result(False, error="full_sync_required")
+    logger.info("ws agent inventory delta stored uuid=%s items=%s", agent_uuid, item_count)
+    return _inventory_result(True, changes=changes, software_count=delta.software_count)
+
+
+def _mark_ws_offline(db, agent_uuid: str) -> dict | None:
+    """Offline transition on disconnect; returns the UI status delta when it changed."""
+    now = _utcnow()
+    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
+    if not agent or agent.status == "offline":
+        return None
+    old_status = agent.status
+    agent.status = "offline"
+    agent.last_seen = now
+    agent.updated_at = now
+    db.add(agent)
+    db.add(
+        AgentStatusHistory(
+            agent_uuid=agent.uuid,
+            detected_at=now,
+            old_status=old_status,
+            new_status=agent.status,
+            reason="ws_disconnect",
+        )
+    )
+    db.commit()
+    return {
+        "uuid": agent.uuid,
+        "hostname": agent.hostname,
+        "status": "offline",
+        "ip_address": agent.ip_address,
+        "last_seen": now.isoformat(),
+        "comm_mode": "ws",
+    }
+
+
 @router.websocket("/ws")
 async def agent_ws_endpoint(websocket: WebSocket):
     await websocket.accept()
 
     # 1) Feature flag + WS config.
-    db = next(get_db())
-    try:
-        settings_map = _setting_map(
-            db,
-            [
-                "ws_agent_enabled",
-                "ws_auth_timeout_sec",
-                "ws_ping_interval_sec",
-                "agent_auth_recovery_enabled",
-            ],
-        )
-    finally:
-        db.close()
+    # Small lookups go through run_agent_db (async engine: socket waits yield).
+    # Handlers with real ORM / Python work run in the thread pool via
+    # run_db_in_thread, since run_sync would execute them on the loop thread
+    # and stall every other agent / UI socket and the ping wheel.
+    settings_map = await run_agent_db(_load_ws_settings)
 
     if not _to_bool(settings_map.get("ws_agent_enabled"), default=False):
         logger.info("ws agent rejected: feature disabled")
@@ -154,9 +720,21 @@ async def agent_ws_endpoint(websocket: WebSocket):
 
     auth_timeout_sec = max(1, _to_int(settings_map.get("ws_auth_timeout_sec"), 10))
     ping_interval_sec = max(5, _to_int(settings_map.get("ws_ping_interval_sec"), 30))
+    ping_timeout_sec = max(5, _to_int(settings_map.get("ws_ping_timeout_sec"), 15))
+    ws_manager.configure_ping(ping_interval_sec, ping_timeout_sec)
+    resume_ttl_sec = 0
+    if _to_bool(settings_map.get("ws_resume_enabled"), default=True):
+        resume_ttl_sec = max(60, _to_int(settings_map.get("ws_resume_token_ttl_sec"), ws_admission.DEFAULT_RESUME_TTL_SEC))
+    ws_admission.configure(
+        _to_int(settings_map.get("ws_admission_rate_per_sec"), int(ws_admission.DEFAULT_RATE_PER_SEC)),
+        _to_int(settings_map.get("ws_admission_burst"), ws_admission.DEFAULT_BURST),
+    )
 
     agent_uuid: str | None = None
-    ping_task: asyncio.Task | None = None
+    codec = ws_codec.CODEC_JSON
+    resume_claims: dict[str, Any] | None = None
+    pending_inventory: inventory_upload.ChunkedInventoryUpload | None = None
+    chunk_window = inventory_upload.ChunkWindow()
     buffered_msg: tuple[str, dict[str, Any]] | None = None
     msg_count = 0
     msg_window_start = time.monotonic()
@@ -165,12 +743,12 @@ async def agent_ws_endpoint(websocket: WebSocket):
     try:
         # 2) Wait agent.auth (timeout).
         try:
-            raw_auth = await asyncio.wait_for(websocket.receive_text(), timeout=auth_timeout_sec)
+            raw_auth = await asyncio.wait_for(_receive_frame(websocket), timeout=auth_timeout_sec)
         except asyncio.TimeoutError:
             logger.warning("ws agent auth timeout")
             await websocket.close(code=4003)
             return
-        if len(raw_auth.encode("utf-8")) > MAX_MESSAGE_BYTES:
+        if ws_codec.exceeds(raw_auth, MAX_MESSAGE_BYTES):
             await websocket.close(code=1009, reason="message_too_large")
             return
 
@@ -190,218 +768,80 @@ async def agent_ws_endpoint(websocket: WebSocket):
             await _send_auth_error_and_close(websocket, 4001, "Missing uuid/secret")
             return
 
-        db = next(get_db())
-        try:
-            agent = (
-                db.query(Agent)
-                .filter(
-                    Agent.uuid == req_uuid,
-                    Agent.secret_key == req_secret,
+        if resume_ttl_sec > 0:
+            resume_claims = ws_admission.read_resume_token(payload.get("resume_token"), req_uuid)
+        cached = agent_credential_cache.verify(req_uuid, req_secret) is not None
+        # Reconnect storms: only connections that will hit the database draw from the bucket.
+        if (not cached or resume_claims is None) and not ws_admission.try_admit():
+            await websocket.send_json(
+                make_message(
+                    "server.auth.result",
+                    {"ok": False, "error": "Server busy", "retry_after_sec": ws_admission.RETRY_AFTER_SEC},
                 )
-                .first()
             )
-            recovery_enabled = _to_bool(settings_map.get("agent_auth_recovery_enabled"), default=False)
-            if not agent and recovery_enabled:
-                agent = db.query(Agent).filter(Agent.uuid == req_uuid).first()
-                now = _utcnow()
-                if not agent:
-                    agent = Agent(
-                        uuid=req_uuid,
-                        hostname=req_uuid,
-                        status="online",
-                        last_seen=now,
-                        updated_at=now,
-                        secret_key=req_secret,
-                    )
-                    db.add(agent)
-                else:
-                    agent.secret_key = req_secret
-                    agent.updated_at = now
-                    db.add(agent)
-                db.commit()
-                db.refresh(agent)
-        finally:
-            db.close()
-
-        if not agent:
+            await websocket.close(code=1013, reason="server_busy")
+            return
+
+        if cached:
+            agent_uuid = req_uuid
+        else:
+            agent_uuid = await run_agent_db(_authenticate_ws_agent, req_uuid, req_secret, settings_map)
+
+        if not agent_uuid:
             logger.warning("ws agent auth failed uuid=%s", req_uuid)
             await _send_auth_error_and_close(websocket, 4001, "Invalid credentials")
             return
 
-        agent_uuid = agent.uuid
-        logger.info("ws agent auth success uuid=%s", agent_uuid)
-        await websocket.send_json(make_message("server.auth.ok", {"agent_uuid": agent.uuid}))
+        # Agents that offer no codecs (older builds) stay on JSON text frames.
+        codec = ws_codec.negotiate(payload.get("codecs"))
+        logger.info("ws agent auth success uuid=%s codec=%s", agent_uuid, codec)
+        # auth.ok is always JSON: it is what tells the agent which codec follows.
+        await websocket.send_json(make_message("server.auth.ok", {"agent_uuid": agent_uuid, "codec": codec}))
+        ws_codec.note_connection(
+            codec, "permessage-deflate" in websocket.headers.get("sec-websocket-extensions", "")
+        )
 
         # 3) Register connection.
-        await ws_manager.register_agent(websocket, agent_uuid=agent.uuid)
+        await ws_manager.register_agent(websocket, agent_uuid=agent_uuid, codec=codec)
         logger.info("ws agent connected uuid=%s", agent_uuid)
 
         # 4) Optional agent.hello (5s, non-fatal).
+        hello_payload: dict[str, Any] | None = None
         try:
-            raw_hello = await asyncio.wait_for(websocket.receive_text(), timeout=5)
-            if len(raw_hello.encode("utf-8")) > MAX_MESSAGE_BYTES:
+            raw_hello = await asyncio.wait_for(_receive_frame(websocket), timeout=5)
+            if ws_codec.exceeds(raw_hello, MAX_MESSAGE_BYTES):
                 await websocket.close(code=1009, reason="message_too_large")
                 return
             try:
-                hello_type, hello_payload = _parse_message(raw_hello)
+                hello_type, first_payload = _parse_message(raw_hello, codec)
                 if hello_type == "agent.hello":
-                    db = next(get_db())
-                    try:
-                        now = _utcnow()
-                        agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
-                        if agent:
-                            full_ip_list: list[str] = []
-                            for raw in hello_payload.get("full_ip") or []:
-                                ip = (str(raw) or "").strip()
-                                if ip and ip not in full_ip_list:
-                                    full_ip_list.append(ip)
-                            payload_ip = (hello_payload.get("ip_address") or "").strip() or None
-                            persisted_ip = (agent.ip_address or "").strip() or None
-                            persisted_full_ip_first: str | None = None
-                            if not payload_ip and not full_ip_list and agent.full_ip:
-                                try:
-                                    existing_full = json.loads(agent.full_ip)
-                                    if isinstance(existing_full, list):
-                                        for raw in existing_full:
-                                            ip = (str(raw) if raw is not None else "").strip()
-                                            if ip:
-                                                persisted_full_ip_first = ip
-                                                break
-                                except Exception:
-                                    persisted_full_ip_first = None
-                            effective_ip = payload_ip or (full_ip_list[0] if full_ip_list else None) or persisted_ip or persisted_full_ip_first
-
-                            old_hostname = agent.hostname
-                            old_ip = agent.ip_address
-                            new_hostname = (hello_payload.get("hostname") or "").strip() or agent.hostname
-                            new_ip = effective_ip
-                            if (old_hostname and new_hostname and old_hostname != new_hostname) or (
-                                (old_ip or "") != (new_ip or "")
-                            ):
-                                db.add(
-                                    AgentIdentityHistory(
-                                        agent_uuid=agent.uuid,
-                                        detected_at=now,
-                                        old_hostname=old_hostname,
-                                        new_hostname=new_hostname,
-                                        old_ip_address=old_ip,
-                                        new_ip_address=new_ip,
-                                    )
-                                )
-
-                            old_status = agent.status
-                            agent.hostname = new_hostname
-                            agent.ip_address = effective_ip
-                            if full_ip_list:
-                                agent.full_ip = json.dumps(full_ip_list)
-                            agent.os_version = (hello_payload.get("os_version") or agent.os_version)
-                            agent.platform = (hello_payload.get("platform") or agent.platform or "windows")
-                            agent.arch = (hello_payload.get("arch") or agent.arch)
-                            agent.distro = (hello_payload.get("distro") or agent.distro)
-                            agent.distro_version = (hello_payload.get("distro_version") or agent.distro_version)
-                            agent_version = hello_payload.get("agent_version") or hello_payload.get("version", "")
-                            agent.version = (agent_version or agent.version)
-                            agent.cpu_model = (hello_payload.get("cpu_model") or agent.cpu_model)
-                            if hello_payload.get("ram_gb") is not None:
-                                try:
-                                    agent.ram_gb = int(hello_payload.get("ram_gb"))
-                                except Exception:
-                                    pass
-                            agent.status = "online"
-                            agent.last_seen = now
-                            agent.updated_at = now
-                            db.add(agent)
-                            if old_status != agent.status:
-                                db.add(
-                                    AgentStatusHistory(
-                                        agent_uuid=agent.uuid,
-                                        detected_at=now,
-                                        old_status=old_status,
-                                        new_status=agent.status,
-                                        reason="ws_hello",
-                                    )
-                                )
-                            db.commit()
-                    finally:
-                        db.close()
+                    hello_payload = first_payload
                 else:
-                    buffered_msg = (hello_type, hello_payload)
+                    buffered_msg = (hello_type, first_payload)
             except Exception:
                 logger.warning("ws agent hello parse failed uuid=%s", agent_uuid)
         except asyncio.TimeoutError:
             pass
 
-        # 5) Send server.hello with config + pending work.
-        db = next(get_db())
-        try:
-            now = _utcnow()
-            agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
-            if not agent:
-                await websocket.close(code=1008)
-                return
-
-            config = get_heartbeat_config(db, agent.platform or "windows").model_dump()
-            config["store_tray_enabled"] = _is_store_tray_enabled_for_agent(db, agent.uuid)
-            config["remote_support_enabled"] = runtime_config.is_remote_support_enabled(db) and _is_remote_support_enabled_for_agent(db, agent.uuid)
-            config["inventory_scan_interval_min"] = _to_int(
-                _setting_map(db, ["inventory_scan_interval_min"]).get("inventory_scan_interval_min"),
-                10,
-            )
-
-            pending_commands = [c.model_dump() for c in _pending_commands(db, agent, now)]
-            pending_rs_request = None
-            pending_rs_end = None
-            pending_announcements = announcement_service.deliver_pending_to_agent(db, agent.uuid)
-            if pending_announcements:
-                _mark_pending_announcements_delivered(db, agent.uuid, pending_announcements, now)
-            try:
-                req = rs.get_pending_for_agent(db, agent.uuid)
-                if req:
-                    pending_rs_request = {
-                        "session_id": req.id,
-                        "admin_name": rs.admin_name_for_session(db, req),
-                        "reason": req.reason or "",
-                        "requested_at": req.requested_at.isoformat() if req.requested_at else None,
-                        "timeout_at": req.approval_timeout_at.isoformat() if req.approval_timeout_at else None,
-                        "requires_approval": rs.is_approval_required_for_agent(db, agent.uuid),
-                    }
-                else:
-                    end_sig = rs.get_end_signal_for_agent(db, agent.uuid)
-                    if end_sig:
-                        pending_rs_end = {"session_id": end_sig.id}
-                        rs.mark_end_signal_delivered(db, end_sig.id, agent.uuid)
-            except Exception:
-                pending_rs_request = None
-                pending_rs_end = None
-
-            db.commit()
-        finally:
-            db.close()
-
-        await websocket.send_json(
-            make_message(
-                "server.hello",
-                {
-                    "server_time": _utc_iso(),
-                    "config": config,
-                    "pending_commands": pending_commands,
-                    "pending_rs_request": pending_rs_request,
-                    "pending_rs_end": pending_rs_end,
-                    "pending_announcements": pending_announcements,
-                },
-            )
-        )
-
-        # 6) Ping loop.
-        async def _ping_loop():
-            while True:
-                await asyncio.sleep(ping_interval_sec)
+        # 5) server.hello: abbreviated when the resume token is still current, else config + pending work.
+        hello = None
+        if resume_claims is not None:
+            hello = await run_agent_db(_try_resume, agent_uuid, resume_claims, hello_payload, resume_ttl_sec)
+            ws_admission.note_resume(hello is not None)
+        if hello is None:
+            if hello_payload is not None:
                 try:
-                    await websocket.send_json(make_message("server.ping"))
+                    await run_db_in_thread(_apply_hello, agent_uuid, hello_payload)
                 except Exception:
-                    break
+                    logger.warning("ws agent hello apply failed uuid=%s", agent_uuid)
+            hello = await run_db_in_thread(_build_server_hello, agent_uuid, hello_payload, resume_ttl_sec)
+        if hello is None:
+            await websocket.close(code=1008)
+            return
+        # From here on every frame goes through the connection's single writer.
+        await ws_manager.send_to_agent(agent_uuid, make_message("server.hello", hello), ws=websocket)
 
-        ping_task = asyncio.create_task(_ping_loop())
+        # 6) Keepalive pings / pong deadlines are driven by ws_manager's shared ping wheel.
 
         # 7) Main message loop.
         while True:
@@ -409,37 +849,47 @@ async def agent_ws_endpoint(websocket: WebSocket):
                 msg_type, payload = buffered_msg
                 buffered_msg = None
             else:
-                raw = await websocket.receive_text()
-                if len(raw.encode("utf-8")) > MAX_MESSAGE_BYTES:
+                raw = await _receive_frame(websocket)
+                if ws_codec.exceeds(raw, MAX_MESSAGE_BYTES):
                     await websocket.close(code=1009, reason="message_too_large")
                     break
-                msg_type, payload = _parse_message(raw)
-
-            msg_count += 1
-            now_mono = time.monotonic()
-            if now_mono - msg_window_start >= 60:
-                msg_count = 1
-                msg_window_start = now_mono
-            elif msg_count > MAX_MSGS_PER_MINUTE:
-                logger.warning("ws agent rate limited uuid=%s", agent_uuid)
-                await websocket.close(code=4029, reason="rate_limited")
-                break
+                msg_type, payload = _parse_message(raw, codec)
+
+            # Chunks of an open upload have their own per-minute budget; begin counts here.
+            if msg_type == "agent.inventory.chunk" and pending_inventory is not None:
+                if not chunk_window.allow():
+                    logger.warning("ws agent inventory chunk rate limited uuid=%s", agent_uuid)
+                    inventory_upload.note_aborted()
+                    await websocket.close(code=4029, reason="rate_limited")
+                    break
+            else:
+                msg_count += 1
+                now_mono = time.monotonic()
+                if now_mono - msg_window_start >= 60:
+                    msg_count = 1
+                    msg_window_start = now_mono
+                elif msg_count > MAX_MSGS_PER_MINUTE:
+                    logger.warning("ws agent rate limited uuid=%s", agent_uuid)
+                    await websocket.close(code=4029, reason="rate_limited")
+                    break
 
             if msg_type == "agent.pong":
                 conn = ws_manager.get_agent(agent_uuid)
                 if conn:
                     conn.last_pong = time.monotonic()
-                # Keep agent online while WS is active.
-                pong_db = next(get_db())
-                try:
-                    pong_db.query(Agent).filter(Agent.uuid == agent_uuid).update(
-                        {"status": "online", "last_seen": _utcnow()}
-                    )
-                    pong_db.commit()
-                except Exception:
-                    pong_db.rollback()
-                finally:
-                    pong_db.close()
+                # Keep agent online while WS is active (coalesced, written in bulk).
+                liveness_buffer.record(agent_uuid, _utcnow(), ensure_online=True)
+                continue
+
+            if msg_type in ("agent.inventory.begin", "agent.inventory.chunk", "agent.inventory.commit"):
+                pending_inventory, result = await _handle_inventory_upload(agent_uuid, pending_inventory, msg_type, payload)
+                if result is not None:
+                    await ws_manager.send_to_agent(agent_uuid, result, ws=websocket)
+                continue
+
+            if msg_type == "agent.inventory.delta":
+                result = await _handle_inventory_delta(agent_uuid, payload)
+                await ws_manager.send_to_agent(agent_uuid, result, ws=websocket)
                 continue
 
             if msg_type == "agent.ack":
@@ -457,12 +907,8 @@ async def agent_ws_endpoint(websocket: WebSocket):
                         announcement_id_raw,
                     )
                     continue
-                ack_db = next(get_db())
-                try:
-                    announcement_service.process_agent_ack(ack_db, agent_uuid, announcement_id)
-                    logger.info("ws agent announcement ack uuid=%s announcement_id=%s", agent_uuid, announcement_id)
-                finally:
-                    ack_db.close()
+                await run_agent_db(announcement_service.process_agent_ack, agent_uuid, announcement_id)
+                logger.info("ws agent announcement ack uuid=%s announcement_id=%s", agent_uuid, announcement_id)
                 continue
 
             if msg_type == "agent.task.progress":
@@ -473,237 +919,31 @@ async def agent_ws_endpoint(websocket: WebSocket):
                     "progress_pct": payload.get("progress_pct"),
                     "message": payload.get("message"),
                 }
-                await ws_manager.broadcast_to_ui(make_message("server.task.update", out))
+                topics = await _task_update_topics(agent_uuid, out["task_id"])
+                await ws_manager.broadcast_to_ui(make_message("server.task.update", out), topics=topics)
                 continue
 
-            db = next(get_db())
-            try:
-                now = _utcnow()
-                agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
-                if not agent:
-                    db.commit()
-                    continue
-
-                if msg_type == "agent.status":
-                    if payload.get("disk_free_gb") is not None:
-                        try:
-                            agent.disk_free_gb = int(float(payload.get("disk_free_gb")))
-                        except Exception:
-                            pass
-                    if payload.get("uptime_sec") is not None:
-                        try:
-                            up = int(payload.get("uptime_sec"))
-                            if up >= 0:
-                                agent.uptime_sec = up
-                        except Exception:
-                            pass
-                    if payload.get("os_user") is not None:
-                        agent.os_user = str(payload.get("os_user") or "").strip() or None
-                    agent.status = "online"
-                    agent.last_seen = now
-                    agent.updated_at = now
-                    db.add(agent)
-                    await ws_manager.broadcast_to_ui(
-                        make_message(
-                            "server.agent.status",
-                            {
-                                "uuid": agent.uuid,
-                                "hostname": agent.hostname,
-                                "status": agent.status,
-                                "ip_address": agent.ip_address,
-                                "disk_free_gb": agent.disk_free_gb,
-                                "cpu_usage": payload.get("cpu_usage"),
-                                "ram_usage": payload.get("ram_usage"),
-                                "current_status": payload.get("current_status"),
-                                "last_seen": now.isoformat(),
-                                "comm_mode": "ws",
-                            },
-                        )
-                    )
-
-                elif msg_type == "agent.apps.changed":
-                    apps = payload.get("installed_apps") or []
-                    if isinstance(apps, list):
-                        for item in apps:
-                            if not isinstance(item, dict):
-                                continue
-                            app_id = item.get("app_id")
-                            version = str(item.get("version") or "").strip()
-                            if not app_id:
-                                continue
-                            row = (
-                                db.query(AgentApplication)
-                                .filter(AgentApplication.agent_uuid == agent.uuid, AgentApplication.app_id == int(app_id))
-                                .first()
-                            )
-                            if not row:
-                                row = AgentApplication(
-                                    agent_uuid=agent.uuid,
-                                    app_id=int(app_id),
-                                    status="installed",
-                                    installed_version=version or None,
-                                    last_attempt=now,
-                                )
-                            else:
-                                row.status = "installed"
-                                row.installed_version = version or row.installed_version
-                                row.last_attempt = now
-                            db.add(row)
-                    agent.last_seen = now
-                    db.add(agent)
-
-                elif msg_type == "agent.services.changed":
-                    incoming_services = payload.get("services") or []
-                    if not isinstance(incoming_services, list):
-                        incoming_services = []
-                    service_items: list[ServiceItem] = []
-                    for raw_item in incoming_services:
-                        if not isinstance(raw_item, dict):
-                            continue
-                        try:
-                            service_items.append(ServiceItem.model_validate(raw_item))
-                        except Exception:
-                            continue
-                    normalized = _normalize_services(service_items)
-                    incoming_hash = str(payload.get("services_hash") or "").strip() or _hash_json_list(normalized)
-                    existing = agent.services or []
-                    if agent.services_hash != incoming_hash or existing != normalized:
-                        if existing and (agent.services_hash or "").strip():
-                            for ch in _diff_services(existing, normalized):
-                                old = ch.get("old")
-                                new = ch.get("new")
-                                ref = new or old or {}
-                                from app.models import AgentServiceHistory
-
-                                db.add(
-                                    AgentServiceHistory(
-                                        agent_uuid=agent.uuid,
-                                        detected_at=now,
-                                        service_name=(ref.get("name") or "").strip() or "unknown",
-                                        display_name=(ref.get("display_name") or "").strip() or None,
-                                        change_type=ch["type"],
-                                        old_status=(old or {}).get("status"),
-                                        new_status=(new or {}).get("status"),
-                                        old_startup_type=(old or {}).get("startup_type"),
-                                        new_startup_type=(new or {}).get("startup_type"),
-                                        old_payload_json=json.dumps(old) if old else None,
-                                        new_payload_json=json.dumps(new) if new else None,
-                                    )
-                                )
-                        agent.services_json = json.dumps(normalized)
-                        agent.services_hash = incoming_hash
-                        agent.services_updated_at = now
-                        db.add(agent)
-                    agent.last_seen = now
-
-                elif msg_type == "agent.system_profile":
-                    if isinstance(payload, dict):
-                        profile_hash = _hash_json_dict(payload)
-                        if agent.system_profile_hash != profile_hash:
-                            from app.models import AgentSystemProfileHistory
-
-                            changed_fields = _diff_system_profile(agent.system_profile, payload)
-                            diff = _diff_system_profile_pairs(agent.system_profile, payload)
-                            db.add(
-                                AgentSystemProfileHistory(
-                                    agent_uuid=agent.uuid,
-                                    detected_at=now,
-                                    profile_hash=profile_hash,
-                                    profile_json=json.dumps(payload),
-                                    changed_fields_json=json.dumps(changed_fields),
-                                    diff_json=json.dumps(diff),
-                                )
-                            )
-                            agent.system_profile_json = json.dumps(payload)
-                            agent.system_profile_hash = profile_hash
-                            agent.system_profile_updated_at = now
-                            db.add(agent)
-                    agent.last_seen = now
-
-                elif msg_type == "agent.inventory.hash":
-                    incoming_hash = str(payload.get("hash") or "").strip()
-                    if incoming_hash and inventory_service.check_inventory_hash(db, agent.uuid, incoming_hash):
-                        await websocket.send_json(make_message("server.inventory.sync_required", {}))
-                    agent.last_seen = now
-                    db.add(agent)
-
-                elif msg_type == "agent.rs.status":
-                    incoming_state = str(payload.get("state") or "").strip().lower()
-                    incoming_sid = int(payload.get("session_id") or 0)
-                    active_sid = _resolve_active_remote_session_id(db, agent.uuid)
-                    accept = False
-                    if active_sid is None:
-                        accept = incoming_state in {"idle", "ended", "none", ""}
-                    else:
-                        accept = (incoming_sid == active_sid) or (
-                            incoming_sid == 0 and incoming_state in {"approved", "connecting", "active"}
-                        )
-                    if accept:
-                        agent.remote_support_state = payload.get("state")
-                        agent.remote_support_session_id = payload.get("session_id")
-                        agent.remote_support_helper_running = bool(payload.get("helper_running"))
-                        pid = payload.get("helper_pid")
-                        agent.remote_support_helper_pid = int(pid) if pid else None
-                        agent.remote_support_updated_at = now
-                        db.add(agent)
-                    agent.last_seen = now
-
-                else:
-                    logger.info("ws agent unknown message uuid=%s type=%s", agent_uuid, msg_type)
-
-                db.commit()
-            finally:
-                db.close()
+            status_update, reply = await run_db_in_thread(_handle_agent_message, agent_uuid, msg_type, payload)
+            if status_update is not None:
+                ws_manager.publish_agent_status(status_update)
+            if reply is not None:
+                await ws_manager.send_to_agent(agent_uuid, reply, ws=websocket)
 
     except WebSocketDisconnect:
         logger.info("ws agent disconnected uuid=%s", agent_uuid)
     except Exception as exc:
         logger.exception("ws agent handler error uuid=%s err=%s", agent_uuid, exc)
     finally:
-        if ping_task:
-            ping_task.cancel()
-            try:
-                await ping_task
-            except BaseException:
-                pass
+        if pending_inventory is not None:
+            inventory_upload.note_aborted()
         if agent_uuid:
             await ws_manager.unregister_agent(agent_uuid, ws=websocket)
             # Guard against reconnect races: if a newer WS for the same agent is active,
             # never force offline from this stale connection's teardown.
             if ws_manager.is_agent_connected(agent_uuid):
                 return
-            db = next(get_db())
-            try:
-                now = _utcnow()
-                agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
-                if agent and agent.status != "offline":
-                    old_status = agent.status
-                    agent.status = "offline"
-                    agent.last_seen = now
-                    agent.updated_at = now
-                    db.add(agent)
-                    db.add(
-                        AgentStatusHistory(
-                            agent_uuid=agent.uuid,
-                            detected_at=now,
-                            old_status=old_status,
-                            new_status=agent.status,
-                            reason="ws_disconnect",
-                        )
-                    )
-                    db.commit()
-                    await ws_manager.broadcast_to_ui(
-                        make_message(
-                            "server.agent.status",
-                            {
-                                "uuid": agent.uuid,
-                                "hostname": agent.hostname,
-                                "status": "offline",
-                                "ip_address": agent.ip_address,
-                                "last_seen": now.isoformat(),
-                                "comm_mode": "ws",
-                            },
-                        )
-                    )
-            finally:
-                db.close()
+            # The offline transition below writes last_seen itself.
+            liveness_buffer.discard(agent_uuid)
+            offline_update = await run_agent_db(_mark_ws_offline, agent_uuid)
+            if offline_update is not None:
+                ws_manager.publish_agent_status(offline_update)
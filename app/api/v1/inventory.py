@@ -15,6 +15,8 @@ from app.config import get_settings
 from app.database import get_db
 from app.models import Agent, AgentServiceHistory
 from app.services import inventory_service
+from app.services import normalization_reapply
+from app.services import software_catalog
 from app.services import system_profile_service
 from app.services import timeline_service
 from app.schemas import (
@@ -46,6 +48,8 @@ from app.schemas import (
     SamPerformanceResponse,
     SamPerformanceCheck,
     MessageResponse,
+    NormalizationReapplyStatusResponse,
+    SoftwareCatalogRebuildResponse,
     NormalizationRuleCreateRequest,
     NormalizationRuleListResponse,
     NormalizationRuleResponse,
@@ -790,6 +794,30 @@ def list_normalization_rules(
     )
 
 
+@router.get("/inventory/normalization/reapply", response_model=NormalizationReapplyStatusResponse)
+def get_normalization_reapply_status(
+    _user=Depends(require_permission("inventory.view")),
+):
+    return NormalizationReapplyStatusResponse(**normalization_reapply.status())
+
+
+@router.post("/inventory/normalization/reapply", response_model=NormalizationReapplyStatusResponse, status_code=202)
+def start_normalization_reapply(
+    _user=Depends(require_permission("inventory.manage")),
+):
+    # Rule create/update/delete already trigger this; the endpoint is for manual re-runs.
+    return NormalizationReapplyStatusResponse(**normalization_reapply.request())
+
+
+@router.post("/inventory/catalog/rebuild", response_model=SoftwareCatalogRebuildResponse)
+def rebuild_software_catalog(
+    db: Session = Depends(get_db),
+    _user=Depends(require_permission("inventory.manage")),
+):
+    # The catalog is kept up to date incrementally; this is the repair path.
+    return SoftwareCatalogRebuildResponse(**software_catalog.rebuild(db))
+
+
 @router.post("/inventory/normalization", response_model=NormalizationRuleResponse, status_code=201)
 def create_normalization_rule(
     payload: NormalizationRuleCreateRequest,
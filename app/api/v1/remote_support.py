@@ -22,7 +22,7 @@ from app.services import remote_support_service as rs
 from app.services import runtime_config_service as runtime_config
 from app.services import session_recording_service as recording
 from app.services import audit_service as audit
-from app.api.v1.agent import _authenticate_agent
+from app.api.v1.agent import _authenticate_agent_identity
 
 router = APIRouter(tags=["remote-support"])
 
@@ -447,7 +447,7 @@ def approve_remote_session(
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
 ):
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
     session = rs.approve_from_agent(db, session_id, x_agent_uuid, body.approved, body.monitor_count)
     if body.approved and session.status == "approved":
         runtime = runtime_config.get_remote_support_runtime(db)
@@ -475,7 +475,7 @@ def ready_remote_session(
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
 ):
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
     if body.vnc_ready:
         rs.mark_ready_from_agent(db, session_id, x_agent_uuid)
     return MessageResponse(status="ok", message="ready")
@@ -489,6 +489,6 @@ def ended_remote_session(
     x_agent_secret: str = Header(..., alias="X-Agent-Secret"),
     db: Session = Depends(get_db),
 ):
-    _authenticate_agent(db, x_agent_uuid, x_agent_secret)
+    _authenticate_agent_identity(db, x_agent_uuid, x_agent_secret)
     rs.end_session_from_agent(db, session_id, x_agent_uuid, body.ended_by)
     return MessageResponse(status="ok", message="ended")
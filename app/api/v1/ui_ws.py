@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import logging
 import time
 import asyncio
@@ -11,8 +12,9 @@ from starlette.websockets import WebSocketDisconnect
 
 from app.config import get_settings
 from app.database import get_db
-from app.models import Setting, User
-from app.services.ws_manager import ws_manager
+from app.models import User
+from app.services import settings_snapshot_service
+from app.services.ws_manager import UIConnection, make_message, ws_manager
 
 router = APIRouter(tags=["ui"])
 logger = logging.getLogger("appcenter.ws.ui")
@@ -28,12 +30,36 @@ def _to_bool(value: str | None, default: bool = False) -> bool:
 
 def _ui_ws_enabled(db) -> bool:
     # Canonical flag: ui_ws_enabled
-    row = db.query(Setting).filter(Setting.key == "ui_ws_enabled").first()
-    if row and row.value is not None and str(row.value).strip() != "":
-        return _to_bool(row.value, default=False)
+    snap = settings_snapshot_service.get_snapshot(db)
+    value = snap.get_str("ui_ws_enabled", "")
+    if value.strip() != "":
+        return _to_bool(value, default=False)
     # Backward compatibility with legacy key.
-    legacy = db.query(Setting).filter(Setting.key == "ws_ui_enabled").first()
-    return _to_bool((legacy.value if legacy else None), default=False)
+    return _to_bool(snap.get_str("ws_ui_enabled", ""), default=False)
+
+
+def _handle_ui_message(conn: UIConnection, text: str) -> dict | None:
+    """Apply ui.subscribe / ui.unsubscribe; returns the reply envelope (other types are ignored)."""
+    try:
+        msg = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(msg, dict):
+        return None
+    msg_type = msg.get("type")
+    if msg_type not in ("ui.subscribe", "ui.unsubscribe"):
+        return None
+    payload = msg.get("payload") if isinstance(msg.get("payload"), dict) else {}
+    topics = payload.get("topics")
+    if not isinstance(topics, list):
+        topics = []
+    topics = [str(t) for t in topics]
+    rejected: list[str] = []
+    if msg_type == "ui.subscribe":
+        current, rejected = ws_manager.subscribe_ui(conn, topics)
+    else:
+        current = ws_manager.unsubscribe_ui(conn, topics)
+    return make_message("server.subscribed", {"topics": current, "rejected": rejected})
 
 
 @router.websocket("/ws")
@@ -66,9 +92,13 @@ async def ui_ws_endpoint(websocket: WebSocket):
         if not user:
             await websocket.close(code=4001, reason="unauthorized")
             return
+        batch_ms = settings_snapshot_service.get_snapshot(db).get_int("ui_status_batch_interval_ms", 500, minimum=0, maximum=10000)
     finally:
         db.close()
-    await ws_manager.register_ui(websocket, user_id=user.id, role=user.role or "viewer")
+    ws_manager.set_status_batch_interval(batch_ms / 1000.0)
+    # Clients opt in to coalesced server.agent.status.batch frames with ?status_batch=1.
+    status_batch = _to_bool(websocket.query_params.get("status_batch"), default=False)
+    conn = await ws_manager.register_ui(websocket, user_id=user.id, role=user.role or "viewer", status_batch=status_batch)
     logger.info("ws ui connected user_id=%s", user.id)
     expiry_task: asyncio.Task | None = None
 
@@ -108,6 +138,10 @@ async def ui_ws_endpoint(websocket: WebSocket):
                 break
             if message.get("type") == "websocket.disconnect":
                 break
+            if isinstance(message.get("text"), str):
+                reply = _handle_ui_message(conn, message["text"])
+                if reply is not None:
+                    await ws_manager.send_to_ui_conn(conn, reply)
     except WebSocketDisconnect:
         pass
     finally:
@@ -6,13 +6,14 @@ from pathlib import Path
 from typing import Optional
 
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
+from fastapi.responses import PlainTextResponse
 from zoneinfo import ZoneInfo
 from sqlalchemy import func, text
 from sqlalchemy.orm import Session
 
 from app.auth import require_permission
 from app.config import get_settings
-from app.database import get_db
+from app.database import engine, get_db
 from app.group_policy import is_system_group_name
 from app.models import (
     Agent,
@@ -86,9 +87,22 @@ from app.services.application_service import (
     update_application_icon,
 )
 from app.services import audit_service as audit
+from app.services import agent_credential_cache
 from app.services import agent_signal
+from app.services import connection_registry
 from app.services import dynamic_group_service
+from app.services import event_bus
+from app.services import group_capability_index
+from app.services import heartbeat_service
+from app.services import inventory_upload
+from app.services import liveness_buffer
+from app.services import loop_monitor
+from app.services import metrics_service
+from app.services import pending_work_service
 from app.services import broadcast_service
+from app.services import settings_snapshot_service
+from app.services import software_catalog
+from app.services import ws_admission
 from app.services.deployment_service import (
     create_deployment,
     delete_deployment,
@@ -334,6 +348,7 @@ def agents_delete(
     # Explicit cleanup keeps delete order predictable across ORM cascade paths.
     db.query(AgentApplication).filter(AgentApplication.agent_uuid == agent_uuid).delete(synchronize_session=False)
     db.query(AgentGroup).filter(AgentGroup.agent_uuid == agent_uuid).delete(synchronize_session=False)
+    software_catalog.remove_agent(db, agent_uuid)
     db.query(AgentSoftwareInventory).filter(AgentSoftwareInventory.agent_uuid == agent_uuid).delete(
         synchronize_session=False
     )
@@ -363,6 +378,10 @@ def agents_delete(
 
     db.delete(agent)
     db.commit()
+    agent_credential_cache.invalidate(agent_uuid)
+    group_capability_index.invalidate()
+    pending_work_service.forget(agent_uuid)
+    liveness_buffer.discard(agent_uuid)
     audit.record_audit(
         db,
         user_id=user.id,
@@ -529,6 +548,7 @@ def groups_update(
     if group.is_dynamic and group.is_active:
         dynamic_group_service.apply_dynamic_group_membership_for_group(db, group)
         db.commit()
+    group_capability_index.invalidate()
     db.refresh(group)
     audit.record_audit(
         db,
@@ -598,6 +618,7 @@ def groups_assign_agents(
             db.add(agent)
 
     db.commit()
+    group_capability_index.invalidate()
     audit.record_audit(
         db,
         user_id=user.id,
@@ -630,6 +651,7 @@ def groups_delete(
     group.is_active = False
     db.add(group)
     db.commit()
+    group_capability_index.invalidate()
     audit.record_audit(
         db,
         user_id=user.id,
@@ -672,6 +694,7 @@ def groups_hard_delete(
     group_name = (group.name or "").strip()
     db.delete(group)
     db.commit()
+    group_capability_index.invalidate()
     audit.record_audit(
         db,
         user_id=user.id,
@@ -1645,6 +1668,7 @@ def settings_update(
             .update({Agent.remote_support_approval_required: None}, synchronize_session=False)
         )
     db.commit()
+    settings_snapshot_service.invalidate()
     audit.record_audit(
         db,
         user_id=user.id,
@@ -1658,11 +1682,7 @@ def settings_update(
             "remote_support_approval_cleared_agent_overrides": int(cleared_agent_overrides or 0),
         },
     )
-    if ws_manager.agent_count > 0:
-        changed = dict(payload.values)
-        msg = make_message("server.config.patch", {"changes": changed})
-        for uuid in ws_manager.agent_uuids:
-            ws_manager.schedule_send_to_agent(uuid, msg)
+    ws_manager.schedule_send_to_all_agents(make_message("server.config.patch", {"changes": dict(payload.values)}))
     return settings_list(db)
 
 
@@ -1671,7 +1691,7 @@ def ws_stats(
     db: Session = Depends(get_db),
     user: User = Depends(require_permission("settings.manage")),
 ):
-    ws_agents = ws_manager.agent_uuids
+    ws_agents = connection_registry.ws_agent_uuids(db)
     ws_agent_set = set(ws_agents)
 
     all_online = db.query(Agent.uuid).filter(Agent.status == "online").all()
@@ -1686,7 +1706,20 @@ def ws_stats(
     return {
         "ws_agent_connections": ws_manager.agent_count,
         "ws_ui_connections": ws_manager.ui_count,
+        "ui_broadcast": ws_manager.ui_stats(),
+        "agent_ping": ws_manager.ping_stats(),
+        "agent_send": ws_manager.agent_send_stats(),
+        "inventory_upload": inventory_upload.stats(),
+        "agent_traffic": ws_manager.agent_traffic_stats(),
+        "ws_admission": ws_admission.stats(),
         "signal_listeners": agent_signal.active_listener_count(),
+        "fleet": connection_registry.fleet_counts(db),
+        "connection_registry": connection_registry.stats(),
+        "liveness_buffer": liveness_buffer.stats(),
+        "heartbeat_latency": heartbeat_service.heartbeat_latency_stats(),
+        "pending_work": pending_work_service.stats(),
+        "event_loop_lag": loop_monitor.stats(),
+        "event_bus": event_bus.stats(),
         "agents_ws_mode": ws_agents,
         "agents_ws_count": len(ws_agents),
         "agents_http_mode": http_agents,
@@ -1696,6 +1729,49 @@ def ws_stats(
     }
 
 
+@router.get("/metrics", response_class=PlainTextResponse)
+def metrics(user: User = Depends(require_permission("settings.manage"))):
+    pool = engine.pool
+    gauges = {
+        "appcenter_ws_agent_connections": ("Agent WebSocket connections on this worker.", ws_manager.agent_count),
+        "appcenter_ws_ui_connections": ("UI WebSocket connections on this worker.", ws_manager.ui_count),
+        "appcenter_signal_listeners": ("Agents holding a /signal long-poll on this worker.", agent_signal.active_listener_count()),
+        "appcenter_liveness_buffer_pending": ("Buffered liveness updates awaiting flush.", liveness_buffer.stats().get("pending", 0)),
+        "appcenter_pending_work_agents": ("Agents flagged with pending work.", pending_work_service.stats().get("pending_agents", 0)),
+    }
+    ui = ws_manager.ui_stats()
+    gauges["appcenter_ws_ui_queue_depth_max"] = ("Deepest UI send queue on this worker.", ui["queue_depth_max"])
+    gauges["appcenter_ws_ui_dropped_messages"] = ("UI messages dropped for slow consumers since start.", ui["dropped_messages"])
+    gauges["appcenter_ws_ui_slow_disconnects"] = (
+        "UI clients disconnected as slow consumers since start.",
+        ui["slow_consumer_disconnects"] + ui["send_timeouts"],
+    )
+    ping = ws_manager.ping_stats()
+    gauges["appcenter_ws_agent_pong_timeouts"] = ("Agent WebSockets closed for a missing pong since start.", ping["pong_timeouts"])
+    agent_send = ws_manager.agent_send_stats()
+    gauges["appcenter_ws_agent_sent"] = ("Frames written to agent WebSockets since start.", agent_send["sent"])
+    gauges["appcenter_ws_agent_coalesced"] = ("Agent pushes merged into an already queued message since start.", agent_send["coalesced"])
+    gauges["appcenter_ws_agent_dropped"] = ("Agent pushes dropped (queue full or connection closing) since start.", agent_send["dropped"])
+    admission = ws_admission.stats()
+    gauges["appcenter_ws_admission_rejected"] = ("Agent WebSockets refused by admission control since start.", admission["rejected_busy"])
+    gauges["appcenter_ws_resumed"] = ("Agent WebSockets served an abbreviated server.hello since start.", admission["resume_accepted"])
+    lag = loop_monitor.stats()
+    gauges["appcenter_event_loop_lag_seconds"] = ("Latest event loop wakeup delay.", lag["current_ms"] / 1000.0)
+    gauges["appcenter_event_loop_lag_p99_seconds"] = ("p99 event loop wakeup delay over the last ~2 minutes.", lag["p99_ms"] / 1000.0)
+    bus = event_bus.stats()
+    gauges["appcenter_event_bus_published"] = ("Event bus messages published by this worker since start.", bus["published"])
+    gauges["appcenter_event_bus_received"] = ("Event bus messages received from other workers since start.", bus["received"])
+    gauges["appcenter_event_bus_dropped"] = (
+        "Event bus messages dropped (oversized, queue full or publish error) since start.",
+        bus["dropped_oversized"] + bus["dropped_queue_full"] + bus["publish_errors"],
+    )
+    if hasattr(pool, "checkedout"):
+        gauges["appcenter_db_pool_checked_out"] = ("Connections currently checked out.", pool.checkedout())
+        gauges["appcenter_db_pool_size"] = ("Configured pool size.", pool.size())
+        gauges["appcenter_db_pool_overflow"] = ("Current pool overflow.", pool.overflow())
+    return PlainTextResponse(metrics_service.render(gauges), media_type="text/plain; version=0.0.4")
+
+
 @router.post("/settings/agents/broadcast", response_model=SettingsAgentBroadcastResponse)
 def settings_agents_broadcast(
     payload: SettingsAgentBroadcastRequest,
@@ -1779,6 +1855,7 @@ async def upload_agent_update(
             item.updated_at = now
         db.add(item)
     db.commit()
+    settings_snapshot_service.invalidate()
     audit.record_audit(
         db,
         user_id=user.id,
@@ -1788,27 +1865,26 @@ async def upload_agent_update(
         details={"version": version},
     )
     # WS ajanlar HTTP heartbeat yapmadigi icin update metadata'sini reconnect beklemeden it.
-    if ws_manager.agent_count > 0:
-        ws_ids = ws_manager.agent_uuids
-        if ws_ids:
-            patch = {
-                "agent_latest_version": version,
-                "agent_download_url": download_url,
-                "agent_hash": f"sha256:{digest_hex}",
-            }
-            connected = (
-                db.query(Agent.uuid, Agent.platform)
-                .filter(Agent.uuid.in_(ws_ids))
-                .all()
+    ws_ids = connection_registry.ws_agent_uuids(db)
+    if ws_ids:
+        patch = {
+            "agent_latest_version": version,
+            "agent_download_url": download_url,
+            "agent_hash": f"sha256:{digest_hex}",
+        }
+        connected = (
+            db.query(Agent.uuid, Agent.platform)
+            .filter(Agent.uuid.in_(ws_ids))
+            .all()
+        )
+        for agent_uuid, agent_platform in connected:
+            p = (agent_platform or "windows").strip().lower()
+            if p != platform:
+                continue
+            ws_manager.schedule_send_to_agent(
+                agent_uuid,
+                make_message("server.config.patch", {"changes": patch}),
             )
-            for agent_uuid, agent_platform in connected:
-                p = (agent_platform or "windows").strip().lower()
-                if p != platform:
-                    continue
-                ws_manager.schedule_send_to_agent(
-                    agent_uuid,
-                    make_message("server.config.patch", {"changes": patch}),
-                )
 
     return AgentUpdateUploadResponse(
         status="success",
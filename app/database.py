@@ -2,12 +2,16 @@ from __future__ import annotations
 
 from datetime import datetime, timezone
 import json
-from typing import Generator
+import logging
+from typing import Any, Callable, Generator, TypeVar
 
 from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from starlette.concurrency import run_in_threadpool
 
 from app.config import get_settings
+from app.services import metrics_service
 from app.permissions import (
     ADMIN_DEFAULT_PERMISSIONS,
     OPERATOR_DEFAULT_PERMISSIONS,
@@ -24,12 +28,43 @@ engine = create_engine(
     settings.database_url,
     connect_args={},
     pool_pre_ping=True,
+    poolclass=metrics_service.TimedQueuePool,
 )
+metrics_service.instrument_engine(engine)
 
 
 SessionLocal = sessionmaker(bind=engine, autoflush=False, autocommit=False, expire_on_commit=False)
 Base = declarative_base()
 
+logger = logging.getLogger("appcenter.database")
+T = TypeVar("T")
+
+
+def _async_database_url(url: str) -> str:
+    return make_url(url).set(drivername="postgresql+asyncpg").render_as_string(hide_password=False)
+
+
+# Agent-facing endpoints run their (sync) handlers on this engine through
+# AsyncSession.run_sync: DB waits yield to the event loop instead of holding
+# one of Starlette's worker threads. Without asyncpg they use the thread pool.
+async_engine = None
+AsyncSessionLocal = None
+if settings.agent_async_db_enabled:
+    try:
+        from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine  # pylint: disable=import-outside-toplevel
+
+        async_engine = create_async_engine(
+            settings.async_database_url or _async_database_url(settings.database_url),
+            pool_pre_ping=True,
+            pool_size=settings.async_db_pool_size,
+            max_overflow=settings.async_db_max_overflow,
+            poolclass=metrics_service.TimedAsyncAdaptedQueuePool,
+        )
+        metrics_service.instrument_engine(async_engine.sync_engine)
+        AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+    except ImportError:
+        logger.warning("asyncpg is not installed; agent endpoints use the sync engine in the thread pool")
+
 
 DEFAULT_SETTINGS = {
     "bandwidth_limit_kbps": ("1024", "Agent download bandwidth limit (KB/s)"),
@@ -77,9 +112,14 @@ DEFAULT_SETTINGS = {
     "ws_ping_interval_sec": ("30", "WS server ping araligi (sn)"),
     "ws_ping_timeout_sec": ("15", "WS pong bekleme suresi (sn)"),
     "ws_auth_timeout_sec": ("10", "WS agent auth bekleme suresi (sn)"),
+    "ws_resume_enabled": ("true", "WS yeniden baglanmada resume token ile kisaltilmis server.hello"),
+    "ws_resume_token_ttl_sec": ("86400", "WS resume token gecerlilik suresi (sn)"),
+    "ws_admission_rate_per_sec": ("50", "DB gerektiren WS baglanti kabul hizi (worker basina, sn; 0 = sinirsiz)"),
+    "ws_admission_burst": ("200", "WS baglanti kabul token bucket kapasitesi"),
     "ws_status_interval_sec": ("300", "Agent status gonderim araligi (sn)"),
     "ui_ws_enabled": ("false", "UI WebSocket aktif/pasif"),
     "ui_ws_fallback_poll_sec": ("10", "UI WS yokken polling suresi (sn)"),
+    "ui_status_batch_interval_ms": ("500", "UI agent status batch frame araligi (ms, 0=kapali)"),
     "agent_auth_recovery_enabled": ("false", "Agent auth uyumsuzlugunda UUID/secret ile gecici otomatik toparlama"),
     "auth_ldap_enabled": ("false", "LDAP/AD login akisi aktif/pasif"),
     "auth_ldap_allow_local_fallback": ("true", "LDAP aktifken lokal kullanicilarin lokal sifre ile girisine izin ver"),
@@ -173,6 +213,37 @@ def get_db() -> Generator[Session, None, None]:
         db.close()
 
 
+def _call_with_session(fn: Callable[..., T], *args: Any) -> T:
+    db = SessionLocal()
+    try:
+        return fn(db, *args)
+    finally:
+        db.close()
+
+
+async def run_agent_db(fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn(db, *args)`` with a fresh session, on the async engine when available.
+
+    Only the driver's socket waits yield: ``run_sync`` executes ``fn`` itself
+    (ORM, hydration, Python) on the event-loop thread, so keep this for small
+    lookups and use :func:`run_db_in_thread` for heavy work.
+    """
+    if AsyncSessionLocal is None:
+        return await run_in_threadpool(_call_with_session, fn, *args)
+    async with AsyncSessionLocal() as adb:
+        return await adb.run_sync(fn, *args)
+
+
+async def run_db_in_thread(fn: Callable[..., T], *args: Any) -> T:
+    """Run ``fn(db, *args)`` with a fresh sync session in the thread pool, off the event loop."""
+    return await run_in_threadpool(_call_with_session, fn, *args)
+
+
+async def dispose_async_engine() -> None:
+    if async_engine is not None:
+        await async_engine.dispose()
+
+
 def init_db() -> None:
     from app import models  # pylint: disable=import-outside-toplevel
 
@@ -30,11 +30,11 @@ from app.api.v1.ui_ws import router as ui_ws_router
 from app.api.v1.users import router as users_router
 from app.api.v1.web import router as web_router
 from app.config import get_settings
-from app.database import SessionLocal, get_db, init_db, seed_initial_data
+from app.database import SessionLocal, dispose_async_engine, get_db, init_db, seed_initial_data
 from app.models import Setting
 from app.tasks.scheduler import start_scheduler, stop_scheduler
 from app.utils.file_handler import ensure_upload_dir
-from app.services import agent_signal, novnc_service
+from app.services import agent_signal, connection_registry, event_bus, liveness_buffer, loop_monitor, metrics_service, novnc_service, pending_work_service, software_catalog
 from app.services import runtime_config_service as runtime_config
 from app.services.ws_manager import ws_manager
 from sqlalchemy.orm import Session
@@ -401,17 +401,44 @@ templates.env.globals["NAV_ROLE"] = "admin"
 templates.env.globals["NAV_GET_MENU"] = build_nav_menu
 
 
+def _rebuild_pending_work() -> None:
+    db = SessionLocal()
+    try:
+        pending_work_service.rebuild(db)
+    finally:
+        db.close()
+
+
+def _ensure_software_catalog() -> None:
+    # First start after the catalog tables were added: build them from the inventory once.
+    db = SessionLocal()
+    try:
+        software_catalog.ensure_built(db)
+    finally:
+        db.close()
+
+
 @asynccontextmanager
 async def lifespan(_: FastAPI):
     ensure_upload_dir(settings.upload_dir)
     init_db()
     seed_initial_data()
+    _rebuild_pending_work()
+    _ensure_software_catalog()
     start_scheduler()
     ws_manager.set_loop(asyncio.get_running_loop())
+    event_bus.start(asyncio.get_running_loop(), settings.event_bus_backend, settings.database_url, settings.event_bus_channel)
+    loop_monitor.start()
     yield
+    await loop_monitor.stop()
+    await asyncio.to_thread(connection_registry.release_all)
+    await asyncio.to_thread(event_bus.stop)
     agent_signal.clear_all()
     await ws_manager.close_all()
     stop_scheduler()
+    # Persist buffered last_seen/uptime updates before the process exits.
+    liveness_buffer.flush()
+    await dispose_async_engine()
 
 
 app = FastAPI(
@@ -428,6 +455,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(metrics_service.RequestMetricsMiddleware)
 
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 app.mount("/uploads", StaticFiles(directory=settings.upload_dir), name="uploads")
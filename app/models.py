@@ -489,6 +489,40 @@ class SoftwareChangeHistory(Base):
     detected_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
 
 
+class SoftwareCatalogEntry(Base):
+    """Per catalog name (coalesce(normalized_name, software_name)) aggregate of agent_software_inventory."""
+
+    __tablename__ = "software_catalog"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    total_agents: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    windows_agents: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    linux_agents: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    install_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    windows_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    linux_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+class SoftwareCatalogVariant(Base):
+    """Install rows per catalog name, platform, raw name, version and publisher ('' for NULL)."""
+
+    __tablename__ = "software_catalog_variants"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    platform: Mapped[str] = mapped_column(String, primary_key=True)
+    software_name: Mapped[str] = mapped_column(String, primary_key=True)
+    software_version: Mapped[str] = mapped_column(String, primary_key=True)
+    publisher: Mapped[str] = mapped_column(String, primary_key=True)
+    install_rows: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+
+
+Index("idx_catalog_total_agents", SoftwareCatalogEntry.total_agents.desc(), SoftwareCatalogEntry.name)
+Index("idx_catalog_windows_agents", SoftwareCatalogEntry.windows_agents.desc(), SoftwareCatalogEntry.name)
+Index("idx_catalog_linux_agents", SoftwareCatalogEntry.linux_agents.desc(), SoftwareCatalogEntry.name)
+Index("idx_catalog_variant_raw_name", SoftwareCatalogVariant.software_name)
+
+
 class SoftwareNormalizationRule(Base):
     __tablename__ = "software_normalization_rules"
     __table_args__ = (
@@ -712,6 +746,33 @@ Index("idx_statushist_agent", AgentStatusHistory.agent_uuid)
 Index("idx_statushist_detected", AgentStatusHistory.detected_at)
 
 
+class AgentWorkMark(Base):
+    # Append-only "agent has new pending work" markers shared across workers.
+    __tablename__ = "agent_work_marks"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    agent_uuid: Mapped[str] = mapped_column(ForeignKey("agents.uuid", ondelete="CASCADE"), nullable=False)
+    kind: Mapped[str] = mapped_column(String, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+Index("idx_workmark_created", AgentWorkMark.created_at)
+
+
+class AgentConnectionOwner(Base):
+    # Which worker holds an agent's WS / long-poll; refreshed by the owner, stale rows expire.
+    __tablename__ = "agent_connection_owners"
+
+    agent_uuid: Mapped[str] = mapped_column(String, primary_key=True)
+    kind: Mapped[str] = mapped_column(String, primary_key=True)
+    worker_id: Mapped[str] = mapped_column(String, nullable=False)
+    refreshed_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=utcnow, nullable=False)
+
+
+Index("idx_connowner_worker", AgentConnectionOwner.worker_id)
+Index("idx_connowner_refreshed", AgentConnectionOwner.refreshed_at)
+
+
 class AgentServiceHistory(Base):
     __tablename__ = "agent_service_history"
     __table_args__ = (
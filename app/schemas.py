@@ -155,6 +155,8 @@ class HeartbeatRequest(BaseModel):
     logged_in_sessions: Optional[list[LoggedInSession]] = None
     system_profile: Optional[SystemProfile] = None
     remote_support: Optional[RemoteSupportHeartbeat] = None
+    # Optional agent-computed hash of the identity/session/profile/services sections.
+    state_fingerprint: Optional[str] = None
 
 
 class CommandItem(BaseModel):
@@ -177,6 +179,8 @@ class HeartbeatConfig(BaseModel):
     agent_download_url: Optional[str] = None
     agent_hash: Optional[str] = None
     inventory_sync_required: bool = False
+    # Hash the server holds; agents whose last submit had this hash may POST /inventory/delta.
+    inventory_base_hash: Optional[str] = None
     services_sync_required: bool = False
     service_monitoring_enabled: bool = False
     inventory_scan_interval_min: int = 10
@@ -780,6 +784,20 @@ class AgentInventoryRequest(BaseModel):
     items: list[SoftwareItem]
 
 
+class SoftwareItemRef(BaseModel):
+    name: str
+    architecture: Optional[str] = None
+
+
+class AgentInventoryDeltaRequest(BaseModel):
+    base_hash: str
+    new_hash: str
+    software_count: int = Field(ge=0)
+    added: list[SoftwareItem] = Field(default_factory=list)
+    removed: list[SoftwareItemRef] = Field(default_factory=list)
+    changed: list[SoftwareItem] = Field(default_factory=list)
+
+
 class AgentInventoryResponse(BaseModel):
     status: str = "ok"
     message: str
@@ -1133,6 +1151,24 @@ class NormalizationRuleListResponse(BaseModel):
     total: int
 
 
+class SoftwareCatalogRebuildResponse(BaseModel):
+    names: int
+    variants: int
+    duration_ms: float
+
+
+class NormalizationReapplyStatusResponse(BaseModel):
+    state: str
+    runs: int
+    names_done: int
+    rows_updated: int
+    started_at: Optional[str] = None
+    finished_at: Optional[str] = None
+    duration_ms: Optional[float] = None
+    error: Optional[str] = None
+    rerun_pending: bool = False
+
+
 # --- License schemas ---
 
 
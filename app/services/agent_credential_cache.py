@@ -0,0 +1,114 @@
+"""Bounded in-memory cache of agent credentials (uuid -> secret digest)."""
+
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import hmac
+import threading
+import time
+from typing import Optional
+
+MAX_ENTRIES = 50_000
+# Upper bound for how long a secret change / delete made by another worker
+# can go unnoticed here; local changes call invalidate() directly.
+TTL_SEC = 300.0
+
+
+@dataclass(frozen=True)
+class AgentCredential:
+    uuid: str
+    secret_digest: bytes
+    platform: Optional[str]
+    expires_at: float
+
+
+_lock = threading.Lock()
+_entries: "OrderedDict[str, AgentCredential]" = OrderedDict()
+_hits = 0
+_misses = 0
+
+
+def _digest(secret: str) -> bytes:
+    return hashlib.sha256((secret or "").encode("utf-8")).digest()
+
+
+def secrets_match(expected: Optional[str], provided: Optional[str]) -> bool:
+    """Constant-time comparison of a stored secret with the one presented by the agent."""
+    if not expected or not provided:
+        return False
+    return hmac.compare_digest(_digest(expected), _digest(provided))
+
+
+def verify(agent_uuid: str, agent_secret: str) -> Optional[AgentCredential]:
+    """Return the cached credential if it matches, ``None`` on miss/expiry/mismatch.
+
+    A mismatch is not a definitive rejection: the secret may have been rotated
+    by another worker, so callers fall back to the database.
+    """
+    global _hits, _misses
+    if not agent_uuid or not agent_secret:
+        return None
+    provided = _digest(agent_secret)
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(agent_uuid)
+        if entry is None or entry.expires_at <= now:
+            if entry is not None:
+                _entries.pop(agent_uuid, None)
+            _misses += 1
+            return None
+        if not hmac.compare_digest(entry.secret_digest, provided):
+            _misses += 1
+            return None
+        _entries.move_to_end(agent_uuid)
+        _hits += 1
+        return entry
+
+
+def remember(agent_uuid: str, agent_secret: str, platform: Optional[str] = None) -> Optional[AgentCredential]:
+    if not agent_uuid or not agent_secret:
+        return None
+    entry = AgentCredential(
+        uuid=agent_uuid,
+        secret_digest=_digest(agent_secret),
+        platform=platform,
+        expires_at=time.monotonic() + TTL_SEC,
+    )
+    with _lock:
+        _entries[agent_uuid] = entry
+        _entries.move_to_end(agent_uuid)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+    return entry
+
+
+def update_platform(agent_uuid: str, platform: Optional[str]) -> None:
+    with _lock:
+        entry = _entries.get(agent_uuid)
+        if entry is not None and entry.platform != platform:
+            _entries[agent_uuid] = AgentCredential(
+                uuid=entry.uuid,
+                secret_digest=entry.secret_digest,
+                platform=platform,
+                expires_at=entry.expires_at,
+            )
+
+
+def invalidate(agent_uuid: str) -> None:
+    with _lock:
+        _entries.pop(agent_uuid, None)
+
+
+def clear_all() -> None:
+    global _hits, _misses
+    with _lock:
+        _entries.clear()
+        _hits = 0
+        _misses = 0
+
+
+def stats() -> dict:
+    with _lock:
+        return {"size": len(_entries), "hits": _hits, "misses": _misses}
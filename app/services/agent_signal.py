@@ -7,6 +7,7 @@ import logging
 import threading
 from datetime import datetime, timezone
 
+from app.services import connection_registry, event_bus
 from app.services.ws_manager import ws_manager, make_message
 
 logger = logging.getLogger("appcenter.signal")
@@ -35,6 +36,12 @@ def get_or_create_event(agent_uuid: str) -> asyncio.Event:
 
 
 def notify_agent(agent_uuid: str) -> None:
+    # The agent's WS or long-poll may live on another worker; only its owner is notified.
+    event_bus.publish_to_agent_owner("signal", {"agent_uuid": agent_uuid}, agent_uuid)
+    _notify_local(agent_uuid)
+
+
+def _notify_local(agent_uuid: str) -> None:
     # 1) Try WS push first via WS manager scheduler (thread-safe).
     if ws_manager.is_agent_connected(agent_uuid):
         ws_manager.schedule_send_to_agent(agent_uuid, make_message("server.signal", {"reason": "wake"}))
@@ -57,14 +64,25 @@ def notify_agent(agent_uuid: str) -> None:
             _active_listeners.pop(agent_uuid, None)
 
 
+def _on_bus_signal(data: dict) -> None:
+    agent_uuid = str(data.get("agent_uuid") or "")
+    if agent_uuid:
+        _notify_local(agent_uuid)
+
+
+event_bus.register_handler("signal", _on_bus_signal)
+
+
 def mark_listener_active(agent_uuid: str) -> None:
     with _state_lock:
         _active_listeners[agent_uuid] = datetime.now(timezone.utc)
+    connection_registry.note_connected(agent_uuid, connection_registry.KIND_SIGNAL)
 
 
 def mark_listener_inactive(agent_uuid: str) -> None:
     with _state_lock:
         _active_listeners.pop(agent_uuid, None)
+    connection_registry.note_disconnected(agent_uuid, connection_registry.KIND_SIGNAL)
 
 
 def is_agent_listening(agent_uuid: str) -> bool:
@@ -86,9 +104,12 @@ def clear_all() -> None:
     with _state_lock:
         events = list(_agent_events.items())
         loops = dict(_agent_loops)
+        listeners = list(_active_listeners.keys())
         _agent_events.clear()
         _agent_loops.clear()
         _active_listeners.clear()
+    for agent_uuid in listeners:
+        connection_registry.note_disconnected(agent_uuid, connection_registry.KIND_SIGNAL)
 
     for agent_uuid, ev in events:
         loop = loops.get(agent_uuid)
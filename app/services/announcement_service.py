@@ -7,6 +7,9 @@ from typing import Any, Optional
 from sqlalchemy.orm import Session
 
 from app.models import Agent, AgentGroup, Announcement, AnnouncementDelivery, Group
+from app.services import agent_signal
+from app.services import connection_registry
+from app.services import pending_work_service
 from app.services.ws_manager import make_message, ws_manager
 
 logger = logging.getLogger("appcenter.announcement")
@@ -245,12 +248,19 @@ def publish_announcement(db: Session, announcement: Announcement) -> None:
         .filter(AnnouncementDelivery.announcement_id == announcement.id)
         .all()
     )
+    still_pending: list[str] = []
+    wake: list[str] = []
     for delivery in db_deliveries:
-        deliver_to_agent(db, announcement, delivery)
+        if deliver_to_agent(db, announcement, delivery, wake=wake) == "pending":
+            still_pending.append(delivery.agent_uuid)
+    pending_work_service.mark(db, still_pending, pending_work_service.KIND_ANNOUNCEMENT)
 
     announcement.status = "published"
     db.add(announcement)
     db.commit()
+    # Connected agents whose push could not be sent pull it on their next heartbeat.
+    for agent_uuid in wake:
+        agent_signal.notify_agent(agent_uuid)
     db.refresh(announcement)
     _check_and_complete(db, announcement)
     _broadcast_delivery_update(announcement)
@@ -289,29 +299,43 @@ def resolve_targets(db: Session, target_type: str, target_id: Optional[str]) ->
     return []
 
 
-def deliver_to_agent(db: Session, announcement: Announcement, delivery: AnnouncementDelivery) -> str:
+def deliver_to_agent(
+    db: Session,
+    announcement: Announcement,
+    delivery: AnnouncementDelivery,
+    wake: Optional[list[str]] = None,
+) -> str:
+    """Push to a WS-connected agent, else leave the delivery pending (or fail it for online_only).
+
+    A connected agent whose push was dropped (e.g. too large for the event bus)
+    stays pending and is appended to ``wake`` so the caller can signal it after commit.
+    """
     if delivery.status != "pending":
         return delivery.status
 
     now = _utcnow()
-    connected = ws_manager.is_agent_connected(delivery.agent_uuid)
-    if connected:
-        ws_manager.schedule_send_to_agent(
-            delivery.agent_uuid,
-            make_message(
-                "server.announcement.push",
-                {
-                    "announcement_id": announcement.id,
-                    "title": announcement.title,
-                    "message": announcement.message,
-                    "priority": announcement.priority,
-                },
-            ),
-        )
+    connected = connection_registry.is_ws_connected(db, delivery.agent_uuid)
+    sent = connected and ws_manager.schedule_send_to_agent(
+        delivery.agent_uuid,
+        make_message(
+            "server.announcement.push",
+            {
+                "announcement_id": announcement.id,
+                "title": announcement.title,
+                "message": announcement.message,
+                "priority": announcement.priority,
+            },
+        ),
+    )
+    if sent:
         delivery.status = "delivered"
         delivery.delivered_at = now
         announcement.delivered_count += 1
         result = "delivered"
+    elif connected:
+        if wake is not None:
+            wake.append(delivery.agent_uuid)
+        result = "pending"
     elif announcement.delivery_mode == "online_only":
         delivery.status = "failed"
         delivery.failed_at = now
@@ -470,7 +494,10 @@ def _broadcast_delivery_update(announcement: Announcement) -> None:
             - announcement.failed_count,
         ),
     }
-    ws_manager.schedule_broadcast_to_ui(make_message("ui.announcement.delivery_update", stats))
+    ws_manager.schedule_broadcast_to_ui(
+        make_message("ui.announcement.delivery_update", stats),
+        topics=("announcement:%s" % announcement.id,),
+    )
 
 
 def _check_and_complete(db: Session, announcement: Announcement) -> None:
@@ -4,7 +4,9 @@ from dataclasses import dataclass
 
 from sqlalchemy.orm import Session
 
-from app.models import Agent, Setting
+from app.models import Agent
+from app.services import connection_registry
+from app.services import settings_snapshot_service
 from app.services.ws_manager import make_message, ws_manager
 
 
@@ -31,11 +33,7 @@ def _normalize_platform(value: str | None) -> str:
 
 
 def _settings_map(db: Session, keys: list[str]) -> dict[str, str]:
-    rows = db.query(Setting).filter(Setting.key.in_(keys)).all()
-    out = {row.key: (row.value or "") for row in rows}
-    for key in keys:
-        out.setdefault(key, "")
-    return out
+    return settings_snapshot_service.get_snapshot(db).get_map(keys)
 
 
 def _self_update_payload(platform: str, settings_map: dict[str, str]) -> dict | None:
@@ -61,7 +59,7 @@ def _self_update_payload(platform: str, settings_map: dict[str, str]) -> dict |
 
 
 def dispatch_agent_broadcast(db: Session, action: str, mode: str = "normal") -> BroadcastDispatchResult:
-    ws_ids = ws_manager.agent_uuids
+    ws_ids = connection_registry.ws_agent_uuids(db)
     if not ws_ids:
         return BroadcastDispatchResult(action=action, targeted_agents=[], skipped_agents=[])
 
@@ -0,0 +1,243 @@
+"""Shared registry of which worker owns each agent's WS / long-poll connection."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import AgentConnectionOwner
+from app.services import event_bus
+
+logger = logging.getLogger("appcenter.conn_registry")
+
+KIND_WS = "ws"
+KIND_SIGNAL = "signal"
+KINDS = (KIND_WS, KIND_SIGNAL)
+
+FLUSH_INTERVAL_SEC = 2
+# Owners bump refreshed_at this often; rows older than the TTL are ignored and pruned.
+REFRESH_SEC = 15.0
+OWNER_TTL_SEC = 45
+MAX_ROWS_PER_STATEMENT = 1000
+
+# Targeted NOTIFY: one notification per live owner of the agent (used by event_bus).
+OWNER_NOTIFY_SQL = (
+    "SELECT pg_notify(%s || '_' || o.worker_id, %s) FROM ("
+    "SELECT DISTINCT worker_id FROM agent_connection_owners "
+    "WHERE agent_uuid = %s AND worker_id <> %s AND refreshed_at > now() - %s * interval '1 second') AS o"
+)
+_FRESH = "refreshed_at > now() - :ttl * interval '1 second'"
+
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+# Local truth, maintained by ws_manager / agent_signal.
+_active: dict[str, set[str]] = {kind: set() for kind in KINDS}
+# Rows this worker believes it owns in the table.
+_persisted: dict[str, set[str]] = {kind: set() for kind in KINDS}
+# Re-registered since the last flush: upsert again in case another worker took the row meanwhile.
+_dirty: dict[str, set[str]] = {kind: set() for kind in KINDS}
+_last_refresh = 0.0
+_stats = {"upserts": 0, "deletes": 0, "refreshes": 0, "pruned": 0, "flush_errors": 0}
+
+
+def note_connected(agent_uuid: str, kind: str) -> None:
+    with _lock:
+        _active[kind].add(agent_uuid)
+        _dirty[kind].add(agent_uuid)
+
+
+def note_disconnected(agent_uuid: str, kind: str) -> None:
+    with _lock:
+        _active[kind].discard(agent_uuid)
+        _dirty[kind].discard(agent_uuid)
+
+
+def _plan() -> dict[str, tuple[set[str], set[str]]]:
+    plan: dict[str, tuple[set[str], set[str]]] = {}
+    with _lock:
+        for kind in KINDS:
+            active = _active[kind]
+            persisted = _persisted[kind]
+            upserts = (active - persisted) | (_dirty[kind] & active)
+            deletes = persisted - active
+            _dirty[kind].clear()
+            if upserts or deletes:
+                plan[kind] = (upserts, deletes)
+    return plan
+
+
+def _upsert(db: Session, kind: str, uuids: list[str]) -> None:
+    values_sql: list[str] = []
+    params: dict = {"kind": kind, "worker": event_bus.worker_id()}
+    for idx, agent_uuid in enumerate(uuids):
+        values_sql.append(f"(:u{idx}, :kind, :worker, now())")
+        params[f"u{idx}"] = agent_uuid
+    db.execute(
+        text(
+            "INSERT INTO agent_connection_owners (agent_uuid, kind, worker_id, refreshed_at) "
+            f"VALUES {', '.join(values_sql)} "
+            "ON CONFLICT (agent_uuid, kind) DO UPDATE SET "
+            "worker_id = EXCLUDED.worker_id, refreshed_at = EXCLUDED.refreshed_at"
+        ),
+        params,
+    )
+
+
+def _delete(db: Session, kind: str, uuids: list[str]) -> None:
+    # worker_id guard: the agent may already have reconnected to another worker.
+    db.query(AgentConnectionOwner).filter(
+        AgentConnectionOwner.kind == kind,
+        AgentConnectionOwner.worker_id == event_bus.worker_id(),
+        AgentConnectionOwner.agent_uuid.in_(uuids),
+    ).delete(synchronize_session=False)
+
+
+def flush(db: Optional[Session] = None) -> int:
+    """Write ownership changes and the periodic refresh. No-op for a single worker."""
+    global _last_refresh
+    if not event_bus.is_distributed():
+        return 0
+    with _flush_lock:
+        plan = _plan()
+        refresh_due = time.monotonic() - _last_refresh >= REFRESH_SEC
+        if not plan and not refresh_due:
+            return 0
+        own_session = db is None
+        session = SessionLocal() if own_session else db
+        pruned = 0
+        try:
+            for kind, (upserts, deletes) in plan.items():
+                rows = sorted(upserts)
+                for offset in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+                    _upsert(session, kind, rows[offset : offset + MAX_ROWS_PER_STATEMENT])
+                rows = sorted(deletes)
+                for offset in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+                    _delete(session, kind, rows[offset : offset + MAX_ROWS_PER_STATEMENT])
+            if refresh_due:
+                session.execute(
+                    text("UPDATE agent_connection_owners SET refreshed_at = now() WHERE worker_id = :worker"),
+                    {"worker": event_bus.worker_id()},
+                )
+                pruned = session.execute(
+                    text("DELETE FROM agent_connection_owners WHERE refreshed_at < now() - :ttl * interval '1 second'"),
+                    {"ttl": OWNER_TTL_SEC * 2},
+                ).rowcount or 0
+            session.commit()
+        except Exception:
+            session.rollback()
+            with _lock:
+                for kind, (upserts, _deletes) in plan.items():
+                    _dirty[kind] |= upserts & _active[kind]
+                _stats["flush_errors"] += 1
+            logger.exception("connection registry flush failed")
+            return 0
+        finally:
+            if own_session:
+                session.close()
+
+        changed = 0
+        with _lock:
+            for kind, (upserts, deletes) in plan.items():
+                _persisted[kind] |= upserts
+                _persisted[kind] -= deletes
+                _stats["upserts"] += len(upserts)
+                _stats["deletes"] += len(deletes)
+                changed += len(upserts) + len(deletes)
+            if refresh_due:
+                _last_refresh = time.monotonic()
+                _stats["refreshes"] += 1
+                _stats["pruned"] += pruned
+        return changed
+
+
+def release_all() -> None:
+    """Drop this worker's rows on shutdown so pushes stop targeting it."""
+    if not event_bus.is_distributed():
+        return
+    db = SessionLocal()
+    try:
+        db.query(AgentConnectionOwner).filter(AgentConnectionOwner.worker_id == event_bus.worker_id()).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    except Exception as exc:
+        db.rollback()
+        logger.warning("connection registry release failed err=%s", exc)
+    finally:
+        db.close()
+    with _lock:
+        for kind in KINDS:
+            _persisted[kind].clear()
+
+
+def local_agents(kind: str) -> list[str]:
+    with _lock:
+        return list(_active[kind])
+
+
+def ws_agent_uuids(db: Session) -> list[str]:
+    """Agents with a live WS on any worker."""
+    local = local_agents(KIND_WS)
+    if not event_bus.is_distributed():
+        return local
+    rows = db.execute(
+        text(f"SELECT agent_uuid FROM agent_connection_owners WHERE kind = :kind AND {_FRESH}"),
+        {"kind": KIND_WS, "ttl": OWNER_TTL_SEC},
+    ).all()
+    return list(dict.fromkeys(local + [row[0] for row in rows]))
+
+
+def is_ws_connected(db: Session, agent_uuid: str) -> bool:
+    with _lock:
+        if agent_uuid in _active[KIND_WS]:
+            return True
+    if not event_bus.is_distributed():
+        return False
+    row = db.execute(
+        text(f"SELECT 1 FROM agent_connection_owners WHERE agent_uuid = :uuid AND kind = :kind AND {_FRESH}"),
+        {"uuid": agent_uuid, "kind": KIND_WS, "ttl": OWNER_TTL_SEC},
+    ).first()
+    return row is not None
+
+
+def fleet_counts(db: Session) -> dict:
+    """Fleet-wide WS / long-poll counts (this worker only in local mode)."""
+    if not event_bus.is_distributed():
+        with _lock:
+            return {"ws_agents": len(_active[KIND_WS]), "signal_listeners": len(_active[KIND_SIGNAL]), "workers": 1}
+    row = db.execute(
+        text(
+            "SELECT count(*) FILTER (WHERE kind = 'ws'), count(*) FILTER (WHERE kind = 'signal'), "
+            f"count(DISTINCT worker_id) FROM agent_connection_owners WHERE {_FRESH}"
+        ),
+        {"ttl": OWNER_TTL_SEC},
+    ).first()
+    return {"ws_agents": int(row[0] or 0), "signal_listeners": int(row[1] or 0), "workers": int(row[2] or 0)}
+
+
+def stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+        out["local_ws"] = len(_active[KIND_WS])
+        out["local_signal"] = len(_active[KIND_SIGNAL])
+        out["persisted"] = sum(len(items) for items in _persisted.values())
+    out["worker_id"] = event_bus.worker_id()
+    return out
+
+
+def clear_all() -> None:
+    global _last_refresh
+    with _lock:
+        for kind in KINDS:
+            _active[kind].clear()
+            _persisted[kind].clear()
+            _dirty[kind].clear()
+        for key in _stats:
+            _stats[key] = 0
+        _last_refresh = 0.0
@@ -11,6 +11,7 @@ from sqlalchemy.orm import Session
 from app.models import Agent, AgentApplication, AgentGroup, Application, Deployment
 from app.schemas import DeploymentCreateRequest, DeploymentUpdateRequest
 from app.services import agent_signal
+from app.services import pending_work_service
 
 logger = logging.getLogger(__name__)
 
@@ -84,6 +85,7 @@ def _seed_agent_applications(db: Session, deployment: Deployment) -> int:
     app_platform = (app.target_platform or "windows").strip().lower()
     agents = _resolve_target_agents(db, deployment.target_type, deployment.target_id)
     created = 0
+    queued: list[str] = []
     for agent in agents:
         agent_platform = (agent.platform or "windows").strip().lower()
         if agent_platform != app_platform:
@@ -105,6 +107,7 @@ def _seed_agent_applications(db: Session, deployment: Deployment) -> int:
             existing.deployment_id = deployment.id
             if deployment.force_update:
                 existing.status = "pending"
+                queued.append(agent.uuid)
             db.add(existing)
             continue
 
@@ -117,6 +120,8 @@ def _seed_agent_applications(db: Session, deployment: Deployment) -> int:
             )
         )
         created += 1
+        queued.append(agent.uuid)
+    pending_work_service.mark(db, queued, pending_work_service.KIND_DEPLOYMENT)
     return created
 
 
@@ -212,6 +217,7 @@ def queue_store_install_for_agent(db: Session, agent_uuid: str, app_id: int) ->
                 status="pending",
             )
         )
+        pending_work_service.mark(db, [agent_uuid], pending_work_service.KIND_STORE_INSTALL)
         db.commit()
         agent_signal.notify_agent(agent_uuid)
         return "queued", "Install request queued"
@@ -228,6 +234,7 @@ def queue_store_install_for_agent(db: Session, agent_uuid: str, app_id: int) ->
             agent_app.status = "pending"
             agent_app.error_message = None
             db.add(agent_app)
+            pending_work_service.mark(db, [agent_uuid], pending_work_service.KIND_STORE_INSTALL)
             db.commit()
             agent_signal.notify_agent(agent_uuid)
             return "queued", "Install request re-queued"
@@ -240,6 +247,7 @@ def queue_store_install_for_agent(db: Session, agent_uuid: str, app_id: int) ->
     agent_app.status = "pending"
     agent_app.error_message = None
     db.add(agent_app)
+    pending_work_service.mark(db, [agent_uuid], pending_work_service.KIND_STORE_INSTALL)
     db.commit()
     agent_signal.notify_agent(agent_uuid)
     return "queued", "Install request queued"
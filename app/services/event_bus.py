@@ -0,0 +1,312 @@
+"""Cross-worker pub/sub for agent wake signals, agent pushes and UI broadcasts."""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import re
+import select
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger("appcenter.event_bus")
+
+BACKEND_LOCAL = "local"
+BACKEND_POSTGRES = "postgres"
+DEFAULT_CHANNEL = "appcenter_events"
+# Postgres rejects NOTIFY payloads of 8000 bytes or more.
+MAX_PAYLOAD_BYTES = 7900
+PUBLISH_QUEUE_MAX = 10000
+PUBLISH_BATCH_MAX = 100
+LISTEN_POLL_SEC = 1.0
+RECONNECT_MAX_SEC = 30.0
+
+# Leaves room for the per-worker suffix within Postgres' 63-byte channel names.
+_CHANNEL_RE = re.compile(r"^[a-z_][a-z0-9_]{0,39}$")
+
+# Identifies this worker so it can skip its own notifications; also the suffix
+# of its private channel for targeted messages (must stay a valid identifier).
+_origin = "w%s_%s" % (os.getpid(), os.urandom(3).hex())
+_lock = threading.Lock()
+_handlers: dict[str, Callable[[dict], None]] = {}
+_backend: Optional["_PostgresBackend"] = None
+_loop: asyncio.AbstractEventLoop | None = None
+_stats = {
+    "published": 0,
+    "targeted": 0,
+    "received": 0,
+    "dispatched": 0,
+    "dropped_oversized": 0,
+    "dropped_queue_full": 0,
+    "publish_errors": 0,
+    "listen_reconnects": 0,
+}
+
+
+def _inc(key: str, n: int = 1) -> None:
+    with _lock:
+        _stats[key] += n
+
+
+def register_handler(kind: str, handler: Callable[[dict], None]) -> None:
+    """Handle ``kind`` events from other workers; called on the event loop thread."""
+    with _lock:
+        _handlers[kind] = handler
+
+
+def is_distributed() -> bool:
+    return _backend is not None
+
+
+def worker_id() -> str:
+    return _origin
+
+
+def _encode(kind: str, data: dict) -> str | None:
+    text = json.dumps({"o": _origin, "k": kind, "d": data}, ensure_ascii=False, separators=(",", ":"))
+    if len(text.encode("utf-8")) > MAX_PAYLOAD_BYTES:
+        _inc("dropped_oversized")
+        logger.warning("event bus payload too large kind=%s bytes=%s; not fanned out", kind, len(text))
+        return None
+    return text
+
+
+def publish(kind: str, data: dict) -> bool:
+    """Fan ``data`` out to the other workers; no-op in local mode. Never blocks.
+
+    Returns False when the message was dropped (oversized or publish queue full).
+    """
+    backend = _backend
+    if backend is None:
+        return True
+    text = _encode(kind, data)
+    if text is None:
+        return False
+    return backend.submit(text)
+
+
+def publish_to_agent_owner(kind: str, data: dict, agent_uuid: str) -> bool:
+    """Send ``data`` only to the worker(s) owning the agent's WS / long-poll (see connection_registry).
+
+    Returns False when the message was dropped (oversized or publish queue full).
+    """
+    backend = _backend
+    if backend is None:
+        return True
+    text = _encode(kind, data)
+    if text is None:
+        return False
+    _inc("targeted")
+    return backend.submit(text, agent_uuid)
+
+
+def _on_payload(text: str) -> None:
+    """Route one raw notification to its handler on the event loop."""
+    try:
+        envelope = json.loads(text)
+    except (TypeError, ValueError):
+        return
+    if not isinstance(envelope, dict) or envelope.get("o") == _origin:
+        return
+    _inc("received")
+    with _lock:
+        handler = _handlers.get(str(envelope.get("k") or ""))
+    data = envelope.get("d")
+    loop = _loop
+    if handler is None or not isinstance(data, dict) or loop is None or loop.is_closed():
+        return
+    try:
+        loop.call_soon_threadsafe(_dispatch, handler, data)
+    except RuntimeError:
+        pass
+
+
+def _dispatch(handler: Callable[[dict], None], data: dict) -> None:
+    _inc("dispatched")
+    try:
+        handler(data)
+    except Exception as exc:
+        logger.warning("event bus handler failed err=%s", exc)
+
+
+class _PostgresBackend:
+    """LISTEN/NOTIFY over two dedicated psycopg2 connections (listener + publisher threads)."""
+
+    def __init__(self, connect_kwargs: dict, channel: str):
+        self._connect_kwargs = connect_kwargs
+        self._channel = channel
+        self._queue: queue.Queue[tuple[str, str | None] | None] = queue.Queue(maxsize=PUBLISH_QUEUE_MAX)
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+
+    def _connect(self):
+        import psycopg2
+
+        conn = psycopg2.connect(**self._connect_kwargs)
+        conn.autocommit = True
+        return conn
+
+    def start(self) -> None:
+        for target, name in ((self._listen, "event-bus-listen"), (self._publish_loop, "event-bus-publish")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self) -> None:
+        self._stop.set()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+        for thread in self._threads:
+            thread.join(timeout=5.0)
+
+    def submit(self, text: str, agent_uuid: str | None = None) -> bool:
+        try:
+            self._queue.put_nowait((text, agent_uuid))
+        except queue.Full:
+            _inc("dropped_queue_full")
+            return False
+        return True
+
+    def _listen(self) -> None:
+        delay = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = self._connect()
+                with conn.cursor() as cur:
+                    cur.execute("LISTEN %s" % self._channel)
+                    cur.execute("LISTEN %s_%s" % (self._channel, _origin))
+                logger.info("event bus listening channel=%s", self._channel)
+                delay = 1.0
+                while not self._stop.is_set():
+                    readable, _, _ = select.select([conn], [], [], LISTEN_POLL_SEC)
+                    if not readable:
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        _on_payload(conn.notifies.pop(0).payload)
+            except Exception as exc:
+                if self._stop.is_set():
+                    break
+                _inc("listen_reconnects")
+                logger.warning("event bus listener error err=%s; retry in %.0fs", exc, delay)
+                self._stop.wait(delay)
+                delay = min(delay * 2, RECONNECT_MAX_SEC)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _publish_loop(self) -> None:
+        from app.services import connection_registry  # pylint: disable=import-outside-toplevel
+
+        conn = None
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < PUBLISH_BATCH_MAX:
+                try:
+                    nxt = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    self._stop.set()
+                    break
+                batch.append(nxt)
+            try:
+                if conn is None or conn.closed:
+                    conn = self._connect()
+                # One round trip per batch.
+                statements: list[str] = []
+                args: list = []
+                for text, agent_uuid in batch:
+                    if agent_uuid is None:
+                        statements.append("SELECT pg_notify(%s, %s)")
+                        args.extend((self._channel, text))
+                    else:
+                        statements.append(connection_registry.OWNER_NOTIFY_SQL)
+                        args.extend((self._channel, text, agent_uuid, _origin, connection_registry.OWNER_TTL_SEC))
+                sql = ";".join(statements)
+                with conn.cursor() as cur:
+                    cur.execute(sql, args)
+                _inc("published", len(batch))
+            except Exception as exc:
+                _inc("publish_errors", len(batch))
+                logger.warning("event bus publish failed batch=%s err=%s", len(batch), exc)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+                conn = None
+            if self._stop.is_set():
+                break
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _connect_kwargs(database_url: str) -> dict:
+    from sqlalchemy.engine import make_url
+
+    url = make_url(database_url)
+    kwargs = url.translate_connect_args(username="user", database="dbname")
+    kwargs.update({key: value for key, value in url.query.items() if isinstance(value, str)})
+    kwargs.setdefault("application_name", "appcenter-event-bus")
+    return kwargs
+
+
+def start(loop: asyncio.AbstractEventLoop, backend: str, database_url: str, channel: str = DEFAULT_CHANNEL) -> None:
+    """Start the configured backend; ``local`` (single worker) keeps everything in-process."""
+    global _backend, _loop
+    _loop = loop
+    backend = (backend or BACKEND_LOCAL).strip().lower()
+    if backend == BACKEND_LOCAL:
+        logger.info("event bus backend=local (single worker)")
+        return
+    if backend != BACKEND_POSTGRES:
+        logger.warning("unknown event_bus_backend=%s; using local", backend)
+        return
+    if not _CHANNEL_RE.match(channel or ""):
+        logger.warning("invalid event_bus_channel=%r; using local", channel)
+        return
+    if not database_url.startswith("postgresql"):
+        logger.warning("event bus postgres backend needs a PostgreSQL database_url; using local")
+        return
+    pg = _PostgresBackend(_connect_kwargs(database_url), channel)
+    pg.start()
+    _backend = pg
+    logger.info("event bus backend=postgres channel=%s origin=%s", channel, _origin)
+
+
+def stop() -> None:
+    global _backend, _loop
+    backend, _backend = _backend, None
+    _loop = None
+    if backend is not None:
+        backend.stop()
+
+
+def stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+    out["backend"] = BACKEND_POSTGRES if _backend is not None else BACKEND_LOCAL
+    out["origin"] = _origin
+    return out
+
+
+def clear_all() -> None:
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,120 @@
+"""In-memory index of agents in the capability groups ("Store", "Remote Support")."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import AgentGroup, Group
+
+logger = logging.getLogger("appcenter.groups")
+
+STORE = "store"
+REMOTE_SUPPORT = "remote support"
+CAPABILITY_GROUP_NAMES = (STORE, REMOTE_SUPPORT)
+
+# Membership changes made by other workers are detected by a cheap fingerprint
+# query at most this often; local changes call invalidate() after commit.
+REVALIDATE_INTERVAL_SEC = 5.0
+
+_lock = threading.Lock()
+_members: dict[str, frozenset[str]] = {name: frozenset() for name in CAPABILITY_GROUP_NAMES}
+_fingerprint: Optional[tuple] = None
+_checked_at = 0.0
+_force_reload = True
+
+
+def _group_ids(db: Session) -> dict[int, str]:
+    rows = (
+        db.query(Group.id, func.lower(Group.name))
+        .filter(func.lower(Group.name).in_(CAPABILITY_GROUP_NAMES))
+        .all()
+    )
+    return {int(gid): str(name) for gid, name in rows}
+
+
+def _membership_fingerprint(db: Session, group_ids: dict[int, str]) -> tuple:
+    if not group_ids:
+        return ((), 0, 0)
+    # agent_groups.id is serial: any insert raises max(id), any delete lowers count.
+    count, max_id = (
+        db.query(func.count(AgentGroup.id), func.max(AgentGroup.id))
+        .filter(AgentGroup.group_id.in_(list(group_ids)))
+        .one()
+    )
+    return (tuple(sorted(group_ids.items())), int(count or 0), int(max_id or 0))
+
+
+def _load(db: Session, group_ids: dict[int, str]) -> dict[str, frozenset[str]]:
+    buckets: dict[str, set[str]] = {name: set() for name in CAPABILITY_GROUP_NAMES}
+    if group_ids:
+        rows = (
+            db.query(AgentGroup.agent_uuid, AgentGroup.group_id)
+            .filter(AgentGroup.group_id.in_(list(group_ids)))
+            .all()
+        )
+        for agent_uuid, group_id in rows:
+            buckets[group_ids[int(group_id)]].add(agent_uuid)
+    return {name: frozenset(uuids) for name, uuids in buckets.items()}
+
+
+def _ensure_fresh(db: Session) -> None:
+    global _members, _fingerprint, _checked_at, _force_reload
+    now = time.monotonic()
+    with _lock:
+        force = _force_reload
+        if not force and (now - _checked_at) < REVALIDATE_INTERVAL_SEC:
+            return
+        _checked_at = now
+        _force_reload = False
+        previous = _fingerprint
+
+    try:
+        group_ids = _group_ids(db)
+        fingerprint = _membership_fingerprint(db, group_ids)
+        if not force and fingerprint == previous:
+            return
+        members = _load(db, group_ids)
+    except Exception:
+        with _lock:
+            _force_reload = True
+        if previous is None:
+            raise
+        logger.exception("capability group index refresh failed; serving previous membership")
+        return
+
+    with _lock:
+        _members = members
+        _fingerprint = fingerprint
+    logger.debug(
+        "capability group index loaded store=%s remote_support=%s",
+        len(members[STORE]),
+        len(members[REMOTE_SUPPORT]),
+    )
+
+
+def members(db: Session, group_name: str) -> frozenset[str]:
+    _ensure_fresh(db)
+    with _lock:
+        return _members.get(group_name, frozenset())
+
+
+def is_member(db: Session, group_name: str, agent_uuid: str) -> bool:
+    return agent_uuid in members(db, group_name)
+
+
+def invalidate() -> None:
+    """Force a reload on next lookup (call after committing membership changes)."""
+    global _force_reload
+    with _lock:
+        _force_reload = True
+
+
+def stats() -> dict:
+    with _lock:
+        return {name: len(uuids) for name, uuids in _members.items()}
@@ -1,17 +1,18 @@
 from __future__ import annotations
 
 import asyncio
+from collections import OrderedDict, deque
 import json
 import hashlib
+import threading
+import time
 from datetime import datetime, timezone
 
 from sqlalchemy.orm import Session
-from sqlalchemy import func
 
 from app.models import (
     Agent,
     AgentApplication,
-    AgentGroup,
     AgentIdentityHistory,
     Announcement,
     AnnouncementDelivery,
@@ -20,64 +21,42 @@ from app.models import (
     AgentSystemProfileHistory,
     Application,
     Deployment,
-    Group,
     RemoteSupportSession,
     TaskHistory,
 )
 from app.schemas import CommandItem, HeartbeatConfig, HeartbeatRequest, PendingAnnouncementItem, ServiceItem
 from app.services.announcement_service import deliver_pending_to_agent
+from app.services import group_capability_index
 from app.services import runtime_config_service as runtime_config
-from app.services.ws_manager import make_message, ws_manager
-
-
-def _get_setting(db: Session, key: str, default: str) -> str:
-    from app.models import Setting
-
-    setting = db.query(Setting).filter(Setting.key == key).first()
-    return setting.value if setting else default
+from app.services import liveness_buffer
+from app.services import settings_snapshot_service
+from app.services.ws_manager import ws_manager
 
 
 def get_heartbeat_config(db: Session, agent_platform: str) -> HeartbeatConfig:
+    snap = settings_snapshot_service.get_snapshot(db)
     platform = (agent_platform or "windows").strip().lower()
     if platform not in {"windows", "linux"}:
         platform = "windows"
-    latest_version = _get_setting(db, f"agent_latest_version_{platform}", "") or _get_setting(db, "agent_latest_version", "1.0.0")
-    download_url = _get_setting(db, f"agent_download_url_{platform}", "") or _get_setting(db, "agent_download_url", "")
-    agent_hash = _get_setting(db, f"agent_hash_{platform}", "") or _get_setting(db, "agent_hash", "")
+    latest_version = snap.get_str(f"agent_latest_version_{platform}", "") or snap.get_str("agent_latest_version", "1.0.0")
+    download_url = snap.get_str(f"agent_download_url_{platform}", "") or snap.get_str("agent_download_url", "")
+    agent_hash = snap.get_str(f"agent_hash_{platform}", "") or snap.get_str("agent_hash", "")
     return HeartbeatConfig(
-        bandwidth_limit_kbps=int(_get_setting(db, "bandwidth_limit_kbps", "1024")),
+        bandwidth_limit_kbps=int(snap.get_str("bandwidth_limit_kbps", "1024")),
         latest_agent_version=latest_version or "1.0.0",
         agent_download_url=download_url or None,
         agent_hash=agent_hash or None,
-        runtime_update_interval_min=int(_get_setting(db, "runtime_update_interval_min", "60")),
-        runtime_update_jitter_sec=int(_get_setting(db, "runtime_update_jitter_sec", "300")),
+        runtime_update_interval_min=int(snap.get_str("runtime_update_interval_min", "60")),
+        runtime_update_jitter_sec=int(snap.get_str("runtime_update_jitter_sec", "300")),
     )
 
 
 def _is_store_tray_enabled_for_agent(db: Session, agent_uuid: str) -> bool:
-    row = (
-        db.query(AgentGroup.agent_uuid)
-        .join(Group, Group.id == AgentGroup.group_id)
-        .filter(
-            AgentGroup.agent_uuid == agent_uuid,
-            func.lower(Group.name) == "store",
-        )
-        .first()
-    )
-    return row is not None
+    return group_capability_index.is_member(db, group_capability_index.STORE, agent_uuid)
 
 
 def _is_remote_support_enabled_for_agent(db: Session, agent_uuid: str) -> bool:
-    row = (
-        db.query(AgentGroup.agent_uuid)
-        .join(Group, Group.id == AgentGroup.group_id)
-        .filter(
-            AgentGroup.agent_uuid == agent_uuid,
-            func.lower(Group.name) == "remote support",
-        )
-        .first()
-    )
-    return row is not None
+    return group_capability_index.is_member(db, group_capability_index.REMOTE_SUPPORT, agent_uuid)
 
 
 def _sync_installed_apps(db: Session, agent: Agent, payload: HeartbeatRequest, now: datetime) -> None:
@@ -377,12 +356,8 @@ def _mark_pending_announcements_delivered(
         db.add(announcement)
 
 
-def process_heartbeat(
-    db: Session,
-    agent: Agent,
-    payload: HeartbeatRequest,
-) -> tuple[datetime, HeartbeatConfig, list[CommandItem], bool, list[PendingAnnouncementItem]]:
-    now = datetime.now(timezone.utc)
+def _apply_heartbeat_sections(db: Session, agent: Agent, payload: HeartbeatRequest, now: datetime) -> None:
+    """Identity, sessions, system profile and remote support state from a full heartbeat."""
     full_ip_list: list[str] = []
     if payload.full_ip is not None:
         seen: set[str] = set()
@@ -427,20 +402,10 @@ def process_heartbeat(
             )
         )
 
-    # Track status transitions (e.g. offline -> online when heartbeat resumes).
-    old_status = agent.status
-
     agent.hostname = payload.hostname
     agent.ip_address = effective_ip
     if payload.full_ip is not None:
         agent.full_ip = json.dumps(full_ip_list)
-    if payload.uptime_sec is not None:
-        try:
-            uptime = int(payload.uptime_sec)
-            if uptime >= 0:
-                agent.uptime_sec = uptime
-        except Exception:
-            pass
     agent.os_user = payload.os_user
     if payload.os_version is not None:
         agent.os_version = payload.os_version
@@ -456,8 +421,6 @@ def process_heartbeat(
         agent.cpu_model = payload.cpu_model
     if payload.ram_gb is not None:
         agent.ram_gb = payload.ram_gb
-    if payload.disk_free_gb is not None:
-        agent.disk_free_gb = payload.disk_free_gb
 
     # Logged-in sessions (local/RDP) - optional for backward compatibility.
     if payload.logged_in_sessions is not None:
@@ -521,9 +484,227 @@ def process_heartbeat(
             agent.remote_support_helper_pid = payload.remote_support.helper_pid
             agent.remote_support_updated_at = now
 
-    agent.last_seen = now
-    agent.status = "online"
-    agent.updated_at = now
+
+def _apply_services_snapshot(db: Session, agent: Agent, payload: HeartbeatRequest, now: datetime) -> None:
+    normalized = _normalize_services(payload.services)
+    incoming_hash = (payload.services_hash or "").strip() or _hash_json_list(normalized)
+    existing = agent.services or []
+    if agent.services_hash != incoming_hash or existing != normalized:
+        # Do not create noisy "initial" events when service monitoring is first enabled.
+        has_baseline = bool(existing) and bool((agent.services_hash or "").strip())
+        if has_baseline:
+            for ch in _diff_services(existing, normalized):
+                old = ch.get("old")
+                new = ch.get("new")
+                ref = new or old or {}
+                db.add(
+                    AgentServiceHistory(
+                        agent_uuid=agent.uuid,
+                        detected_at=now,
+                        service_name=(ref.get("name") or "").strip() or "unknown",
+                        display_name=(ref.get("display_name") or "").strip() or None,
+                        change_type=ch["type"],
+                        old_status=(old or {}).get("status"),
+                        new_status=(new or {}).get("status"),
+                        old_startup_type=(old or {}).get("startup_type"),
+                        new_startup_type=(new or {}).get("startup_type"),
+                        old_payload_json=json.dumps(old) if old else None,
+                        new_payload_json=json.dumps(new) if new else None,
+                    )
+                )
+        agent.services_json = json.dumps(normalized)
+        agent.services_hash = incoming_hash
+        agent.services_updated_at = now
+        db.add(agent)
+
+
+# Payload sections that _apply_heartbeat_sections / _apply_services_snapshot consume.
+_FINGERPRINT_FIELDS = {
+    "hostname",
+    "ip_address",
+    "full_ip",
+    "os_user",
+    "os_version",
+    "arch",
+    "distro",
+    "distro_version",
+    "agent_version",
+    "cpu_model",
+    "ram_gb",
+    "logged_in_sessions",
+    "system_profile",
+    "remote_support",
+    "services_hash",
+    "services",
+}
+_FINGERPRINT_MAX_ENTRIES = 50_000
+_fingerprint_lock = threading.Lock()
+_fingerprints: "OrderedDict[str, str]" = OrderedDict()
+
+_LATENCY_SAMPLES = 2048
+_latency_lock = threading.Lock()
+_latency_ms: dict[str, deque] = {
+    "fast": deque(maxlen=_LATENCY_SAMPLES),
+    "full": deque(maxlen=_LATENCY_SAMPLES),
+}
+_path_counts: dict[str, int] = {"fast": 0, "full": 0}
+
+
+def _payload_fingerprint(payload: HeartbeatRequest) -> str:
+    client_fp = (payload.state_fingerprint or "").strip()
+    if client_fp:
+        return "c:" + client_fp
+    raw = payload.model_dump_json(include=_FINGERPRINT_FIELDS)
+    return "s:" + hashlib.blake2b(raw.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _state_fingerprint(agent: Agent, payload_fp: str, services_enabled: bool) -> str:
+    # Stored columns the skipped sections write (or other writers such as WS
+    # hello / rs.status touch) are folded in, so any out-of-band change forces
+    # the full path on the next beat.
+    stamp = "|".join(
+        str(v)
+        for v in (
+            payload_fp,
+            services_enabled,
+            agent.hostname,
+            agent.ip_address,
+            agent.full_ip,
+            agent.os_user,
+            agent.version,
+            agent.logged_in_sessions_json,
+            agent.system_profile_hash,
+            agent.services_hash,
+            agent.remote_support_state,
+            agent.remote_support_session_id,
+            agent.remote_support_helper_running,
+            agent.remote_support_helper_pid,
+        )
+    )
+    return hashlib.blake2b(stamp.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _remember_fingerprint(agent_uuid: str, value: str) -> None:
+    with _fingerprint_lock:
+        _fingerprints[agent_uuid] = value
+        _fingerprints.move_to_end(agent_uuid)
+        while len(_fingerprints) > _FINGERPRINT_MAX_ENTRIES:
+            _fingerprints.popitem(last=False)
+
+
+def forget_fingerprint(agent_uuid: str) -> None:
+    with _fingerprint_lock:
+        _fingerprints.pop(agent_uuid, None)
+
+
+def _record_latency(path: str, started: float) -> None:
+    elapsed_ms = (time.perf_counter() - started) * 1000.0
+    with _latency_lock:
+        _latency_ms[path].append(elapsed_ms)
+        _path_counts[path] += 1
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return round(ordered[idx], 2)
+
+
+def heartbeat_latency_stats() -> dict:
+    with _latency_lock:
+        snapshot = {path: list(samples) for path, samples in _latency_ms.items()}
+        counts = dict(_path_counts)
+    out: dict = {}
+    for path, samples in snapshot.items():
+        out[path] = {
+            "count": counts[path],
+            "p50_ms": _percentile(samples, 50),
+            "p99_ms": _percentile(samples, 99),
+        }
+    return out
+
+
+def process_heartbeat(
+    db: Session,
+    agent: Agent,
+    payload: HeartbeatRequest,
+    check_pending_work: bool = True,
+) -> tuple[datetime, HeartbeatConfig, list[CommandItem], bool, list[PendingAnnouncementItem]]:
+    started = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    snap = settings_snapshot_service.get_snapshot(db)
+    global_service_enabled = str(snap.get_str("service_monitoring_enabled", "false")).strip().lower() in {
+        "1",
+        "true",
+        "yes",
+        "on",
+    }
+    effective_service_enabled = (
+        bool(agent.service_monitoring_enabled)
+        if agent.service_monitoring_enabled is not None
+        else global_service_enabled
+    )
+
+    # Track status transitions (e.g. offline -> online when heartbeat resumes).
+    old_status = agent.status
+    payload_fp = _payload_fingerprint(payload)
+    with _fingerprint_lock:
+        stored_fp = _fingerprints.get(agent.uuid)
+    # Fast path: nothing but liveness changed since the last processed beat.
+    fast_path = (
+        old_status == "online"
+        and stored_fp is not None
+        and stored_fp == _state_fingerprint(agent, payload_fp, effective_service_enabled)
+    )
+
+    uptime_value: int | None = None
+    if payload.uptime_sec is not None:
+        try:
+            uptime = int(payload.uptime_sec)
+            if uptime >= 0:
+                uptime_value = uptime
+        except Exception:
+            pass
+
+    if not fast_path:
+        _apply_heartbeat_sections(db, agent, payload, now)
+
+    if old_status == "online":
+        # Liveness-only columns go through the write-behind buffer; a heartbeat
+        # that changes nothing else then issues no UPDATE for this row. On the
+        # fast path the skipped sections' "updated at" stamps ride along, so a
+        # re-reported unchanged snapshot still shows as fresh.
+        sessions_seen_at = None
+        remote_support_seen_at = None
+        if fast_path:
+            if payload.logged_in_sessions is not None:
+                sessions_seen_at = now
+            if (
+                payload.remote_support is not None
+                and agent.remote_support_state == payload.remote_support.state
+                and agent.remote_support_session_id == payload.remote_support.session_id
+            ):
+                remote_support_seen_at = now
+        liveness_buffer.record(
+            agent.uuid,
+            now,
+            uptime_sec=uptime_value,
+            disk_free_gb=payload.disk_free_gb,
+            sessions_seen_at=sessions_seen_at,
+            remote_support_seen_at=remote_support_seen_at,
+        )
+    else:
+        # Status transition: write synchronously, superseding anything buffered.
+        liveness_buffer.discard(agent.uuid)
+        if uptime_value is not None:
+            agent.uptime_sec = uptime_value
+        if payload.disk_free_gb is not None:
+            agent.disk_free_gb = payload.disk_free_gb
+        agent.last_seen = now
+        agent.status = "online"
+        agent.updated_at = now
     db.add(agent)
 
     if old_status != agent.status:
@@ -538,7 +719,8 @@ def process_heartbeat(
         )
 
     _sync_installed_apps(db, agent, payload, now)
-    commands = _pending_commands(db, agent, now)
+    # Callers pass check_pending_work=False for agents not in the pending-work set.
+    commands = _pending_commands(db, agent, now) if check_pending_work else []
 
     inventory_sync_required = False
     if payload.inventory_hash is not None:
@@ -546,24 +728,15 @@ def process_heartbeat(
             inventory_sync_required = True
 
     config = get_heartbeat_config(db, agent.platform or "windows")
-    config.inventory_scan_interval_min = int(_get_setting(db, "inventory_scan_interval_min", "10"))
+    config.inventory_scan_interval_min = int(snap.get_str("inventory_scan_interval_min", "10"))
     config.inventory_sync_required = inventory_sync_required
+    if inventory_sync_required:
+        config.inventory_base_hash = agent.inventory_hash
     config.store_tray_enabled = _is_store_tray_enabled_for_agent(db, agent.uuid)
     config.remote_support_enabled = runtime_config.is_remote_support_enabled(db) and _is_remote_support_enabled_for_agent(db, agent.uuid)
     # WS agent-level enable: DB'de ws_agent_enabled=true ise tüm agentlara enable et
-    ws_agent_flag = _get_setting(db, "ws_agent_enabled", "false")
+    ws_agent_flag = snap.get_str("ws_agent_enabled", "false")
     config.websocket_enabled = ws_agent_flag.strip().lower() in ("true", "1", "yes")
-    global_service_enabled = str(_get_setting(db, "service_monitoring_enabled", "false")).strip().lower() in {
-        "1",
-        "true",
-        "yes",
-        "on",
-    }
-    effective_service_enabled = (
-        bool(agent.service_monitoring_enabled)
-        if agent.service_monitoring_enabled is not None
-        else global_service_enabled
-    )
     config.service_monitoring_enabled = effective_service_enabled
     services_sync_required = False
     if effective_service_enabled:
@@ -574,43 +747,15 @@ def process_heartbeat(
                 or agent.services_hash != (payload.services_hash or "").strip()
             )
         if payload.services is not None:
-            normalized = _normalize_services(payload.services)
-            incoming_hash = (payload.services_hash or "").strip() or _hash_json_list(normalized)
-            existing = agent.services or []
-            if agent.services_hash != incoming_hash or existing != normalized:
-                # Do not create noisy "initial" events when service monitoring is first enabled.
-                has_baseline = bool(existing) and bool((agent.services_hash or "").strip())
-                if has_baseline:
-                    for ch in _diff_services(existing, normalized):
-                        old = ch.get("old")
-                        new = ch.get("new")
-                        ref = new or old or {}
-                        db.add(
-                            AgentServiceHistory(
-                                agent_uuid=agent.uuid,
-                                detected_at=now,
-                                service_name=(ref.get("name") or "").strip() or "unknown",
-                                display_name=(ref.get("display_name") or "").strip() or None,
-                                change_type=ch["type"],
-                                old_status=(old or {}).get("status"),
-                                new_status=(new or {}).get("status"),
-                                old_startup_type=(old or {}).get("startup_type"),
-                                new_startup_type=(new or {}).get("startup_type"),
-                                old_payload_json=json.dumps(old) if old else None,
-                                new_payload_json=json.dumps(new) if new else None,
-                            )
-                        )
-                agent.services_json = json.dumps(normalized)
-                agent.services_hash = incoming_hash
-                agent.services_updated_at = now
-                db.add(agent)
+            if not fast_path:
+                _apply_services_snapshot(db, agent, payload, now)
             services_sync_required = False
     else:
         services_sync_required = False
     config.services_sync_required = services_sync_required
 
     pending_announcements: list[PendingAnnouncementItem] = []
-    pending_payloads = deliver_pending_to_agent(db, agent.uuid)
+    pending_payloads = deliver_pending_to_agent(db, agent.uuid) if check_pending_work else []
     if pending_payloads:
         for item in pending_payloads:
             try:
@@ -620,19 +765,20 @@ def process_heartbeat(
         if pending_announcements:
             _mark_pending_announcements_delivered(db, agent.uuid, pending_announcements, now)
 
+    new_fp = None if fast_path else _state_fingerprint(agent, payload_fp, effective_service_enabled)
     db.commit()
+    if new_fp is not None:
+        _remember_fingerprint(agent.uuid, new_fp)
+    _record_latency("fast" if fast_path else "full", started)
     if ws_manager.ui_count > 0:
-        ws_manager.schedule_broadcast_to_ui(
-            make_message(
-                "server.agent.status",
-                {
-                    "uuid": agent.uuid,
-                    "hostname": agent.hostname,
-                    "status": agent.status,
-                    "ip_address": agent.ip_address,
-                    "last_seen": agent.last_seen.isoformat() if agent.last_seen else None,
-                    "comm_mode": "http",
-                },
-            )
+        ws_manager.schedule_agent_status(
+            {
+                "uuid": agent.uuid,
+                "hostname": agent.hostname,
+                "status": agent.status,
+                "ip_address": agent.ip_address,
+                "last_seen": now.isoformat(),
+                "comm_mode": "http",
+            }
         )
     return now, config, commands, inventory_sync_required, pending_announcements
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import json
+import logging
 from datetime import datetime, timedelta, timezone
 import re
 import time
@@ -8,7 +9,7 @@ import unicodedata
 from typing import Optional
 
 from apscheduler.triggers.cron import CronTrigger
-from sqlalchemy import String, case, cast, func
+from sqlalchemy import exists, func, insert, or_, text
 from sqlalchemy.orm import Session
 
 from app.models import (
@@ -18,10 +19,17 @@ from app.models import (
     SamCostProfile,
     SamLifecyclePolicy,
     SamReportSchedule,
+    SoftwareCatalogEntry,
+    SoftwareCatalogVariant,
     SoftwareChangeHistory,
     SoftwareLicense,
     SoftwareNormalizationRule,
 )
+from app.services import normalization_matcher
+from app.services import normalization_reapply
+from app.services import software_catalog
+
+logger = logging.getLogger("appcenter.inventory")
 
 
 # --- Normalization helpers ---
@@ -79,22 +87,10 @@ def _strip_trailing_version_name(software_name: str) -> Optional[str]:
     return base
 
 
-def _apply_normalization(db: Session, software_name: str) -> Optional[str]:
-    rules = (
-        db.query(SoftwareNormalizationRule)
-        .filter(SoftwareNormalizationRule.is_active.is_(True))
-        .order_by(SoftwareNormalizationRule.id.asc())
-        .all()
-    )
-    lower_name = _canon_key(software_name)
-    for rule in rules:
-        pattern_lower = _canon_key(rule.pattern)
-        if rule.match_type == "exact" and lower_name == pattern_lower:
-            return rule.normalized_name
-        if rule.match_type == "contains" and pattern_lower in lower_name:
-            return rule.normalized_name
-        if rule.match_type == "starts_with" and lower_name.startswith(pattern_lower):
-            return rule.normalized_name
+def _apply_normalization(matcher: normalization_matcher.CompiledMatcher, software_name: str) -> Optional[str]:
+    normalized = matcher.match(_canon_key(software_name))
+    if normalized is not None:
+        return normalized
     generic = _strip_trailing_version_name(software_name)
     if generic:
         return generic
@@ -185,14 +181,127 @@ def _compute_diff(
     return changes
 
 
+_INVENTORY_FIELDS = (
+    "software_name",
+    "software_version",
+    "publisher",
+    "install_date",
+    "estimated_size_kb",
+    "architecture",
+    "normalized_name",
+)
+MAX_ROWS_PER_STATEMENT = 1000
+
+
+def _item_field(item, key: str):
+    return getattr(item, key) if hasattr(item, key) else item.get(key)
+
+
+def _inventory_values(matcher: normalization_matcher.CompiledMatcher, item) -> dict:
+    name = _clean_display_text(_item_field(item, "name")) or ""
+    return {
+        "software_name": name,
+        "software_version": _item_field(item, "version"),
+        "publisher": _normalize_publisher_name(_item_field(item, "publisher")),
+        "install_date": _item_field(item, "install_date"),
+        "estimated_size_kb": _item_field(item, "estimated_size_kb"),
+        "architecture": _item_field(item, "architecture"),
+        "normalized_name": _apply_normalization(matcher, name) or name,
+    }
+
+
+def _plan_inventory_writes(existing: list, targets: list[dict]) -> tuple[list[int], list[tuple[int, dict]], list[dict]]:
+    """(ids to delete, (id, values) to update, values to insert); identical rows are left alone.
+
+    Rows are grouped by canonical name (a package may be installed for several
+    architectures), so the stored rows always end up equal to ``targets``.
+    """
+    old_by_key: dict[str, list] = {}
+    for row in existing:
+        old_by_key.setdefault(_canon_key(row.software_name or ""), []).append(row)
+    new_by_key: dict[str, list[dict]] = {}
+    for values in targets:
+        new_by_key.setdefault(_canon_key(values["software_name"]), []).append(values)
+
+    deletes: list[int] = []
+    updates: list[tuple[int, dict]] = []
+    inserts: list[dict] = []
+    for key, wanted in new_by_key.items():
+        olds = old_by_key.pop(key, [])
+        changed: list[dict] = []
+        for values in wanted:
+            same = next(
+                (row for row in olds if all(getattr(row, f) == values[f] for f in _INVENTORY_FIELDS)),
+                None,
+            )
+            if same is not None:
+                olds.remove(same)
+            else:
+                changed.append(values)
+        for row, values in zip(olds, changed):
+            updates.append((row.id, values))
+        deletes.extend(row.id for row in olds[len(changed):])
+        inserts.extend(changed[len(olds):])
+    for olds in old_by_key.values():
+        deletes.extend(row.id for row in olds)
+    return deletes, updates, inserts
+
+
+def _update_inventory_rows(db: Session, updates: list[tuple[int, dict]]) -> None:
+    values_sql: list[str] = []
+    params: dict = {}
+    for idx, (row_id, values) in enumerate(updates):
+        values_sql.append(
+            f"(CAST(:id{idx} AS INTEGER), CAST(:n{idx} AS VARCHAR), CAST(:v{idx} AS VARCHAR), "
+            f"CAST(:p{idx} AS VARCHAR), CAST(:d{idx} AS VARCHAR), CAST(:s{idx} AS INTEGER), "
+            f"CAST(:a{idx} AS VARCHAR), CAST(:nn{idx} AS VARCHAR))"
+        )
+        params[f"id{idx}"] = row_id
+        params[f"n{idx}"] = values["software_name"]
+        params[f"v{idx}"] = values["software_version"]
+        params[f"p{idx}"] = values["publisher"]
+        params[f"d{idx}"] = values["install_date"]
+        params[f"s{idx}"] = values["estimated_size_kb"]
+        params[f"a{idx}"] = values["architecture"]
+        params[f"nn{idx}"] = values["normalized_name"]
+    db.execute(
+        text(
+            "UPDATE agent_software_inventory AS t SET "
+            "software_name = v.software_name, software_version = v.software_version, "
+            "publisher = v.publisher, install_date = v.install_date, "
+            "estimated_size_kb = v.estimated_size_kb, architecture = v.architecture, "
+            "normalized_name = v.normalized_name "
+            f"FROM (VALUES {', '.join(values_sql)}) AS v(id, software_name, software_version, publisher, "
+            "install_date, estimated_size_kb, architecture, normalized_name) "
+            "WHERE t.id = v.id"
+        ),
+        params,
+    )
+
+
+def _catalog_row(normalized_name, software_name, software_version, publisher) -> software_catalog.CatalogRow:
+    return (software_catalog.catalog_name(normalized_name, software_name), software_name, software_version, publisher)
+
+
 def submit_inventory(
     db: Session,
     agent_uuid: str,
     inventory_hash: str,
     items: list,
 ) -> dict:
+    # Row lock: concurrent submits for one agent apply one after the other.
+    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).with_for_update().first()
     existing = (
-        db.query(AgentSoftwareInventory)
+        db.query(
+            AgentSoftwareInventory.id,
+            AgentSoftwareInventory.software_name,
+            AgentSoftwareInventory.software_version,
+            AgentSoftwareInventory.publisher,
+            AgentSoftwareInventory.install_date,
+            AgentSoftwareInventory.estimated_size_kb,
+            AgentSoftwareInventory.architecture,
+            AgentSoftwareInventory.normalized_name,
+        )
         .filter(AgentSoftwareInventory.agent_uuid == agent_uuid)
         .all()
     )
@@ -200,44 +309,59 @@ def submit_inventory(
     is_first = len(existing) == 0
 
     counts = {"installed": 0, "removed": 0, "updated": 0}
+    now = datetime.now(timezone.utc)
 
     if not is_first:
         diff = _compute_diff(old_dict, items)
-        now = datetime.now(timezone.utc)
+        if diff:
+            db.execute(
+                insert(SoftwareChangeHistory),
+                [
+                    {
+                        "agent_uuid": agent_uuid,
+                        "software_name": ch["software_name"],
+                        "software_version": ch.get("software_version"),
+                        "publisher": ch.get("publisher"),
+                        "previous_version": ch.get("previous_version"),
+                        "change_type": ch["change_type"],
+                        "detected_at": now,
+                    }
+                    for ch in diff
+                ],
+            )
         for ch in diff:
-            db.add(SoftwareChangeHistory(
-                agent_uuid=agent_uuid,
-                software_name=ch["software_name"],
-                software_version=ch.get("software_version"),
-                publisher=ch.get("publisher"),
-                previous_version=ch.get("previous_version"),
-                change_type=ch["change_type"],
-                detected_at=now,
-            ))
             counts[ch["change_type"]] += 1
 
-    db.query(AgentSoftwareInventory).filter(
-        AgentSoftwareInventory.agent_uuid == agent_uuid
-    ).delete()
-
-    for item in items:
-        name = item.name if hasattr(item, "name") else item["name"]
-        name = _clean_display_text(name) or ""
-        db.add(AgentSoftwareInventory(
-            agent_uuid=agent_uuid,
-            software_name=name,
-            software_version=item.version if hasattr(item, "version") else item.get("version"),
-            publisher=_normalize_publisher_name(item.publisher if hasattr(item, "publisher") else item.get("publisher")),
-            install_date=item.install_date if hasattr(item, "install_date") else item.get("install_date"),
-            estimated_size_kb=item.estimated_size_kb if hasattr(item, "estimated_size_kb") else item.get("estimated_size_kb"),
-            architecture=item.architecture if hasattr(item, "architecture") else item.get("architecture"),
-            normalized_name=_apply_normalization(db, name) or name,
-        ))
+    # Only rows that differ are written; unchanged packages keep their row untouched.
+    matcher = normalization_matcher.get_matcher(db)
+    targets = [_inventory_values(matcher, item) for item in items]
+    deletes, updates, inserts = _plan_inventory_writes(existing, targets)
+    for offset in range(0, len(deletes), MAX_ROWS_PER_STATEMENT):
+        db.query(AgentSoftwareInventory).filter(
+            AgentSoftwareInventory.id.in_(deletes[offset : offset + MAX_ROWS_PER_STATEMENT])
+        ).delete(synchronize_session=False)
+    for offset in range(0, len(updates), MAX_ROWS_PER_STATEMENT):
+        _update_inventory_rows(db, updates[offset : offset + MAX_ROWS_PER_STATEMENT])
+    if inserts:
+        # executemany -> multi-row INSERT ... VALUES batches (SQLAlchemy insertmanyvalues).
+        db.execute(
+            insert(AgentSoftwareInventory),
+            [{"agent_uuid": agent_uuid, "created_at": now, **values} for values in inserts],
+        )
+    if deletes or updates or inserts:
+        software_catalog.apply_change(
+            db,
+            agent.platform if agent else None,
+            [_catalog_row(row.normalized_name, row.software_name, row.software_version, row.publisher) for row in existing],
+            [
+                _catalog_row(v["normalized_name"], v["software_name"], v["software_version"], v["publisher"])
+                for v in targets
+            ],
+        )
 
-    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
     if agent:
         agent.inventory_hash = inventory_hash
-        agent.inventory_updated_at = datetime.now(timezone.utc)
+        agent.inventory_updated_at = now
         agent.software_count = len(items)
         db.add(agent)
 
@@ -245,6 +369,169 @@ def submit_inventory(
     return counts
 
 
+def _delta_row_key(name: Optional[str], architecture: Optional[str]) -> tuple[str, str]:
+    return _canon_key(name or ""), (_clean_display_text(architecture) or "").casefold()
+
+
+def _match_delta_row(rows: list, item) -> Optional[object]:
+    """Row an item refers to: same name and architecture, or the only row with that name."""
+    name_key, arch_key = _delta_row_key(_item_field(item, "name"), _item_field(item, "architecture"))
+    candidates = [row for row in rows if _canon_key(row.software_name or "") == name_key]
+    for row in candidates:
+        if _delta_row_key(row.software_name, row.architecture)[1] == arch_key:
+            return row
+    if len(candidates) == 1 and not arch_key:
+        return candidates[0]
+    return None
+
+
+def apply_inventory_delta(
+    db: Session,
+    agent_uuid: str,
+    base_hash: str,
+    new_hash: str,
+    software_count: int,
+    added: list,
+    removed: list,
+    changed: list,
+) -> Optional[dict]:
+    """Apply an agent-side diff on top of the stored inventory.
+
+    Returns the change counts, or None when the agent must send a full inventory
+    (``base_hash`` is not the stored hash, or the delta does not fit the stored rows).
+    """
+    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).with_for_update().first()
+    if agent is None or not agent.inventory_hash or agent.inventory_hash != base_hash:
+        db.rollback()
+        return None
+
+    # Stored names are the cleaned agent-reported names, so exact matches find
+    # them; lower() only widens the net for case variants. _match_delta_row
+    # then picks rows by _canon_key (casefold), which Postgres lower() does not
+    # reproduce for names such as "İ" or "ß".
+    names = {_clean_display_text(_item_field(item, "name")) or "" for item in (*added, *removed, *changed)}
+    rows = (
+        db.query(
+            AgentSoftwareInventory.id,
+            AgentSoftwareInventory.software_name,
+            AgentSoftwareInventory.software_version,
+            AgentSoftwareInventory.publisher,
+            AgentSoftwareInventory.architecture,
+            AgentSoftwareInventory.normalized_name,
+        )
+        .filter(
+            AgentSoftwareInventory.agent_uuid == agent_uuid,
+            or_(
+                AgentSoftwareInventory.software_name.in_(names),
+                func.lower(AgentSoftwareInventory.software_name).in_({name.lower() for name in names}),
+            ),
+        )
+        .all()
+        if names
+        else []
+    )
+
+    matcher = normalization_matcher.get_matcher(db)
+    now = datetime.now(timezone.utc)
+    catalog_names: set[str] = set()
+    history: list[dict] = []
+    deletes: list[int] = []
+    updates: list[tuple[int, dict]] = []
+    inserts: list[dict] = []
+
+    for item in removed:
+        row = _match_delta_row(rows, item)
+        if row is None:
+            db.rollback()
+            return None
+        rows.remove(row)
+        deletes.append(row.id)
+        catalog_names.add(software_catalog.catalog_name(row.normalized_name, row.software_name))
+        history.append({
+            "software_name": row.software_name,
+            "software_version": row.software_version,
+            "publisher": row.publisher,
+            "previous_version": None,
+            "change_type": "removed",
+        })
+    for item in changed:
+        row = _match_delta_row(rows, item)
+        if row is None:
+            db.rollback()
+            return None
+        rows.remove(row)
+        values = _inventory_values(matcher, item)
+        updates.append((row.id, values))
+        catalog_names.add(software_catalog.catalog_name(row.normalized_name, row.software_name))
+        catalog_names.add(software_catalog.catalog_name(values["normalized_name"], values["software_name"]))
+        if values["software_version"] != row.software_version:
+            history.append({
+                "software_name": values["software_name"],
+                "software_version": values["software_version"],
+                "publisher": values["publisher"],
+                "previous_version": row.software_version,
+                "change_type": "updated",
+            })
+    for item in added:
+        values = _inventory_values(matcher, item)
+        new_key = _delta_row_key(values["software_name"], values["architecture"])
+        if any(_delta_row_key(row.software_name, row.architecture) == new_key for row in rows):
+            db.rollback()
+            return None
+        inserts.append(values)
+        catalog_names.add(software_catalog.catalog_name(values["normalized_name"], values["software_name"]))
+        history.append({
+            "software_name": values["software_name"],
+            "software_version": values["software_version"],
+            "publisher": values["publisher"],
+            "previous_version": None,
+            "change_type": "installed",
+        })
+
+    catalog_before = software_catalog.agent_rows(db, agent_uuid, catalog_names) if catalog_names else []
+    if deletes:
+        db.query(AgentSoftwareInventory).filter(AgentSoftwareInventory.id.in_(deletes)).delete(
+            synchronize_session=False
+        )
+    for offset in range(0, len(updates), MAX_ROWS_PER_STATEMENT):
+        _update_inventory_rows(db, updates[offset : offset + MAX_ROWS_PER_STATEMENT])
+    if inserts:
+        db.execute(
+            insert(AgentSoftwareInventory),
+            [{"agent_uuid": agent_uuid, "created_at": now, **values} for values in inserts],
+        )
+
+    # The agent's new_hash cannot be recomputed here; the row count is the consistency check.
+    stored = (
+        db.query(func.count(AgentSoftwareInventory.id))
+        .filter(AgentSoftwareInventory.agent_uuid == agent_uuid)
+        .scalar()
+    )
+    if int(stored or 0) != software_count:
+        db.rollback()
+        return None
+    if catalog_names:
+        software_catalog.apply_change(
+            db, agent.platform, catalog_before, software_catalog.agent_rows(db, agent_uuid, catalog_names)
+        )
+
+    if history:
+        db.execute(
+            insert(SoftwareChangeHistory),
+            [{"agent_uuid": agent_uuid, "detected_at": now, **ch} for ch in history],
+        )
+    agent.inventory_hash = new_hash
+    agent.inventory_updated_at = now
+    agent.software_count = software_count
+    db.add(agent)
+    db.commit()
+
+    counts = {"installed": 0, "removed": 0, "updated": 0}
+    for ch in history:
+        counts[ch["change_type"]] += 1
+    return counts
+
+
 def check_inventory_hash(db: Session, agent_uuid: str, inventory_hash: str) -> bool:
     agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
     if not agent or agent.inventory_hash is None:
@@ -283,46 +570,79 @@ def get_agent_change_history(
     return items, total
 
 
+_CATALOG_PLATFORM_AGENTS = {
+    "windows": SoftwareCatalogEntry.windows_agents,
+    "linux": SoftwareCatalogEntry.linux_agents,
+}
+_CATALOG_PLATFORM_ROWS = {
+    "windows": SoftwareCatalogEntry.windows_rows,
+    "linux": SoftwareCatalogEntry.linux_rows,
+}
+
+
+def _catalog_variant_sets(
+    db: Session,
+    names: list[str],
+    platform: Optional[str] = None,
+) -> dict[str, tuple[list[str], list[str]]]:
+    """Sorted distinct (versions, publishers) per catalog name, from the variant table."""
+    if not names:
+        return {}
+    q = (
+        db.query(
+            SoftwareCatalogVariant.name,
+            SoftwareCatalogVariant.software_version,
+            SoftwareCatalogVariant.publisher,
+        )
+        .filter(SoftwareCatalogVariant.name.in_(names))
+        .distinct()
+    )
+    if platform:
+        q = q.filter(SoftwareCatalogVariant.platform == platform)
+    versions: dict[str, set[str]] = {}
+    publishers: dict[str, set[str]] = {}
+    for name, version, publisher in q.all():
+        if version:
+            versions.setdefault(name, set()).add(version)
+        if publisher:
+            publishers.setdefault(name, set()).add(publisher)
+    return {
+        name: (sorted(versions.get(name, ())), sorted(publishers.get(name, ())))
+        for name in names
+    }
+
+
+def _agents_with_inventory(db: Session, platform: Optional[str] = None) -> int:
+    # One index probe per agent instead of count(distinct) over every inventory row.
+    q = db.query(func.count(Agent.uuid)).filter(
+        exists().where(AgentSoftwareInventory.agent_uuid == Agent.uuid)
+    )
+    if platform:
+        q = q.filter(func.lower(Agent.platform) == platform)
+    return int(q.scalar() or 0)
+
+
 def get_software_summary(
     db: Session,
     search: str = "",
     page: int = 1,
     per_page: int = 50,
 ) -> tuple[list[dict], int]:
-    name_col = func.coalesce(
-        AgentSoftwareInventory.normalized_name,
-        AgentSoftwareInventory.software_name,
-    )
-    versions_agg = func.string_agg(
-        func.distinct(cast(AgentSoftwareInventory.software_version, String)),
-        ",",
-    )
-    publisher_agg = func.string_agg(
-        func.distinct(cast(AgentSoftwareInventory.publisher, String)),
-        ",",
-    )
-
-    q = db.query(
-        name_col.label("name"),
-        func.count(func.distinct(AgentSoftwareInventory.agent_uuid)).label("agent_count"),
-        versions_agg.label("versions"),
-        publisher_agg.label("publishers"),
-    ).group_by(name_col)
-
+    q = db.query(SoftwareCatalogEntry)
     if search:
-        q = q.having(name_col.ilike(f"%{search}%"))
+        q = q.filter(SoftwareCatalogEntry.name.ilike(f"%{search}%"))
 
     total = q.count()
-    rows = q.order_by(name_col.asc()).offset((page - 1) * per_page).limit(per_page).all()
+    rows = q.order_by(SoftwareCatalogEntry.name.asc()).offset((page - 1) * per_page).limit(per_page).all()
+    variant_sets = _catalog_variant_sets(db, [row.name for row in rows])
 
     items = []
     for row in rows:
-        versions = [v for v in (row.versions or "").split(",") if v] if row.versions else []
-        publishers = [p for p in (row.publishers or "").split(",") if p] if row.publishers else []
+        versions, publishers = variant_sets.get(row.name, ([], []))
         items.append({
             "name": row.name,
             "publisher": publishers[0] if publishers else None,
-            "agent_count": row.agent_count,
+            "agent_count": row.total_agents,
             "versions": versions,
         })
     return items, total
@@ -351,16 +671,8 @@ def get_software_agents(db: Session, software_name: str) -> list[dict]:
 
 
 def get_inventory_dashboard_stats(db: Session) -> dict:
-    name_col = func.coalesce(
-        AgentSoftwareInventory.normalized_name,
-        AgentSoftwareInventory.software_name,
-    )
-    total_unique = db.query(func.count(func.distinct(name_col))).select_from(AgentSoftwareInventory).scalar() or 0
-    agents_with_inv = (
-        db.query(func.count(func.distinct(AgentSoftwareInventory.agent_uuid)))
-        .select_from(AgentSoftwareInventory)
-        .scalar() or 0
-    )
+    total_unique = db.query(func.count(SoftwareCatalogEntry.name)).scalar() or 0
+    agents_with_inv = _agents_with_inventory(db)
 
     report = get_license_usage_report(db)
     violations = sum(1 for r in report if r["is_violation"] and r["license_type"] == "licensed")
@@ -397,33 +709,13 @@ def get_inventory_dashboard_stats(db: Session) -> dict:
 
 
 def get_sam_dashboard(db: Session) -> dict:
-    name_col = func.coalesce(
-        AgentSoftwareInventory.normalized_name,
-        AgentSoftwareInventory.software_name,
-    )
     total_agents = db.query(func.count(Agent.uuid)).scalar() or 0
-    agents_with_inventory = (
-        db.query(func.count(func.distinct(AgentSoftwareInventory.agent_uuid)))
-        .select_from(AgentSoftwareInventory)
-        .scalar()
-        or 0
-    )
-    unique_raw = (
-        db.query(func.count(func.distinct(AgentSoftwareInventory.software_name)))
-        .select_from(AgentSoftwareInventory)
-        .scalar()
-        or 0
-    )
-    unique_normalized = (
-        db.query(func.count(func.distinct(name_col)))
-        .select_from(AgentSoftwareInventory)
-        .scalar()
-        or 0
-    )
+    agents_with_inventory = _agents_with_inventory(db)
+    unique_raw = db.query(func.count(func.distinct(SoftwareCatalogVariant.software_name))).scalar() or 0
+    unique_normalized = db.query(func.count(SoftwareCatalogEntry.name)).scalar() or 0
     normalized_rows = (
-        db.query(func.count(AgentSoftwareInventory.id))
-        .filter(AgentSoftwareInventory.normalized_name.is_not(None))
-        .filter(AgentSoftwareInventory.normalized_name != AgentSoftwareInventory.software_name)
+        db.query(func.coalesce(func.sum(SoftwareCatalogVariant.install_rows), 0))
+        .filter(SoftwareCatalogVariant.name != SoftwareCatalogVariant.software_name)
         .scalar()
         or 0
     )
@@ -439,25 +731,11 @@ def get_sam_dashboard(db: Session) -> dict:
             .scalar()
             or 0
         )
-        inv_agents_p = (
-            db.query(func.count(func.distinct(AgentSoftwareInventory.agent_uuid)))
-            .join(Agent, Agent.uuid == AgentSoftwareInventory.agent_uuid)
-            .filter(func.lower(Agent.platform) == platform)
-            .scalar()
-            or 0
-        )
-        unique_sw_p = (
-            db.query(func.count(func.distinct(name_col)))
-            .join(Agent, Agent.uuid == AgentSoftwareInventory.agent_uuid)
-            .filter(func.lower(Agent.platform) == platform)
-            .scalar()
-            or 0
-        )
+        agents_col = _CATALOG_PLATFORM_AGENTS[platform]
+        inv_agents_p = _agents_with_inventory(db, platform)
+        unique_sw_p = db.query(func.count(SoftwareCatalogEntry.name)).filter(agents_col > 0).scalar() or 0
         install_rows_p = (
-            db.query(func.count(AgentSoftwareInventory.id))
-            .join(Agent, Agent.uuid == AgentSoftwareInventory.agent_uuid)
-            .filter(func.lower(Agent.platform) == platform)
-            .scalar()
+            db.query(func.coalesce(func.sum(_CATALOG_PLATFORM_ROWS[platform]), 0)).scalar()
             or 0
         )
         changes_q = (
@@ -493,15 +771,11 @@ def get_sam_dashboard(db: Session) -> dict:
 
     top_software: list[dict] = []
     for platform in ("windows", "linux"):
+        agents_col = _CATALOG_PLATFORM_AGENTS[platform]
         rows = (
-            db.query(
-                name_col.label("name"),
-                func.count(func.distinct(AgentSoftwareInventory.agent_uuid)).label("agent_count"),
-            )
-            .join(Agent, Agent.uuid == AgentSoftwareInventory.agent_uuid)
-            .filter(func.lower(Agent.platform) == platform)
-            .group_by(name_col)
-            .order_by(func.count(func.distinct(AgentSoftwareInventory.agent_uuid)).desc(), name_col.asc())
+            db.query(SoftwareCatalogEntry.name, agents_col.label("agent_count"))
+            .filter(agents_col > 0)
+            .order_by(agents_col.desc(), SoftwareCatalogEntry.name.asc())
             .limit(5)
             .all()
         )
@@ -537,63 +811,39 @@ def get_sam_catalog(
     if safe_platform not in {"all", "windows", "linux"}:
         safe_platform = "all"
 
-    name_col = func.coalesce(
-        AgentSoftwareInventory.normalized_name,
-        AgentSoftwareInventory.software_name,
-    )
-    versions_agg = func.string_agg(
-        func.distinct(cast(AgentSoftwareInventory.software_version, String)),
-        ",",
-    )
-    q = (
-        db.query(
-            name_col.label("name"),
-            func.count(func.distinct(AgentSoftwareInventory.agent_uuid)).label("total_agents"),
-            func.count(
-                func.distinct(
-                    case(
-                        (func.lower(Agent.platform) == "windows", AgentSoftwareInventory.agent_uuid),
-                        else_=None,
-                    )
-                )
-            ).label("windows_agents"),
-            func.count(
-                func.distinct(
-                    case(
-                        (func.lower(Agent.platform) == "linux", AgentSoftwareInventory.agent_uuid),
-                        else_=None,
-                    )
-                )
-            ).label("linux_agents"),
-            func.count(AgentSoftwareInventory.id).label("install_rows"),
-            versions_agg.label("versions"),
-        )
-        .join(Agent, Agent.uuid == AgentSoftwareInventory.agent_uuid)
-        .group_by(name_col)
-    )
     if safe_platform in {"windows", "linux"}:
-        q = q.filter(func.lower(Agent.platform) == safe_platform)
+        agents_col = _CATALOG_PLATFORM_AGENTS[safe_platform]
+        rows_col = _CATALOG_PLATFORM_ROWS[safe_platform]
+    else:
+        agents_col = SoftwareCatalogEntry.total_agents
+        rows_col = SoftwareCatalogEntry.install_rows
+    q = db.query(SoftwareCatalogEntry).filter(agents_col > 0)
     if search:
-        q = q.having(name_col.ilike(f"%{search}%"))
+        q = q.filter(SoftwareCatalogEntry.name.ilike(f"%{search}%"))
 
     total = q.count()
     rows = (
-        q.order_by(func.count(func.distinct(AgentSoftwareInventory.agent_uuid)).desc(), name_col.asc())
+        q.order_by(agents_col.desc(), SoftwareCatalogEntry.name.asc())
         .offset((page - 1) * per_page)
         .limit(per_page)
         .all()
     )
+    variant_sets = _catalog_variant_sets(
+        db, [row.name for row in rows], safe_platform if safe_platform != "all" else None
+    )
     items: list[dict] = []
     for row in rows:
-        versions = [v for v in (row.versions or "").split(",") if v] if row.versions else []
+        # With a platform filter the other platform's agents are out of scope (as with the old WHERE).
+        windows_agents = int(row.windows_agents or 0) if safe_platform != "linux" else 0
+        linux_agents = int(row.linux_agents or 0) if safe_platform != "windows" else 0
         items.append(
             {
                 "name": row.name,
-                "total_agents": int(row.total_agents or 0),
-                "windows_agents": int(row.windows_agents or 0),
-                "linux_agents": int(row.linux_agents or 0),
-                "install_rows": int(row.install_rows or 0),
-                "versions": versions,
+                "total_agents": int(getattr(row, agents_col.key) or 0),
+                "windows_agents": windows_agents,
+                "linux_agents": linux_agents,
+                "install_rows": int(getattr(row, rows_col.key) or 0),
+                "versions": variant_sets.get(row.name, ([], []))[0],
             }
         )
     return items, total
@@ -620,7 +870,8 @@ def create_normalization_rule(
     db.add(rule)
     db.commit()
     db.refresh(rule)
-    reapply_normalization_rules(db)
+    normalization_matcher.invalidate()
+    normalization_reapply.request()
     return rule
 
 
@@ -637,7 +888,8 @@ def update_normalization_rule(
             setattr(rule, k, v)
     db.commit()
     db.refresh(rule)
-    reapply_normalization_rules(db)
+    normalization_matcher.invalidate()
+    normalization_reapply.request()
     return rule
 
 
@@ -647,25 +899,93 @@ def delete_normalization_rule(db: Session, rule_id: int) -> bool:
         return False
     db.delete(rule)
     db.commit()
-    reapply_normalization_rules(db)
+    normalization_matcher.invalidate()
+    normalization_reapply.request()
     return True
 
 
-def reapply_normalization_rules(db: Session) -> int:
-    all_inv = db.query(AgentSoftwareInventory).all()
-    count = 0
-    for inv in all_inv:
-        cleaned_name = _clean_display_text(inv.software_name) or inv.software_name
-        # Keep stored name tidy as well (e.g. trailing spaces / NBSP from registry entries).
-        if inv.software_name != cleaned_name:
-            inv.software_name = cleaned_name
-            count += 1
-        new_norm = _apply_normalization(db, cleaned_name) or cleaned_name
-        if inv.normalized_name != new_norm:
-            inv.normalized_name = new_norm
-            count += 1
-    db.commit()
-    return count
+REAPPLY_NAMES_PER_BATCH = 2000
+
+
+def reapply_normalization_rules(db: Session, progress=None) -> int:
+    """Recompute cleaned and normalized names per distinct ``software_name``; returns rows updated.
+
+    Names are walked in keyset order, ``REAPPLY_NAMES_PER_BATCH`` at a time, and
+    each batch is one set-based UPDATE in its own transaction, so no row is
+    loaded into the session. ``progress(names_done, rows_updated)`` is called
+    after every batch.
+    """
+    matcher = normalization_matcher.get_matcher(db)
+    last_name: Optional[str] = None
+    names_done = 0
+    rows_updated = 0
+    committed = 0
+    try:
+        while True:
+            query = db.query(
+                AgentSoftwareInventory.software_name,
+                func.min(AgentSoftwareInventory.normalized_name),
+                func.max(AgentSoftwareInventory.normalized_name),
+                func.count(AgentSoftwareInventory.id) - func.count(AgentSoftwareInventory.normalized_name),
+            )
+            if last_name is not None:
+                query = query.filter(AgentSoftwareInventory.software_name > last_name)
+            batch = (
+                query.group_by(AgentSoftwareInventory.software_name)
+                .order_by(AgentSoftwareInventory.software_name.asc())
+                .limit(REAPPLY_NAMES_PER_BATCH)
+                .all()
+            )
+            if not batch:
+                break
+            last_name = batch[-1][0]
+            names_done += len(batch)
+
+            changes: list[tuple[str, str, str]] = []
+            for name, min_norm, max_norm, missing in batch:
+                # Keep stored name tidy as well (e.g. trailing spaces / NBSP from registry entries).
+                cleaned = _clean_display_text(name) or name
+                new_norm = _apply_normalization(matcher, cleaned) or cleaned
+                if cleaned != name or missing or min_norm != new_norm or max_norm != new_norm:
+                    changes.append((name, cleaned, new_norm))
+
+            if changes:
+                values_sql: list[str] = []
+                params: dict = {}
+                for idx, (name, cleaned, new_norm) in enumerate(changes):
+                    values_sql.append(f"(CAST(:o{idx} AS VARCHAR), CAST(:c{idx} AS VARCHAR), CAST(:n{idx} AS VARCHAR))")
+                    params[f"o{idx}"] = name
+                    params[f"c{idx}"] = cleaned
+                    params[f"n{idx}"] = new_norm
+                result = db.execute(
+                    text(
+                        "UPDATE agent_software_inventory AS t "
+                        "SET software_name = v.cleaned, normalized_name = v.normalized "
+                        f"FROM (VALUES {', '.join(values_sql)}) AS v(name, cleaned, normalized) "
+                        "WHERE t.software_name = v.name "
+                        "AND (t.software_name IS DISTINCT FROM v.cleaned OR t.normalized_name IS DISTINCT FROM v.normalized)"
+                    ),
+                    params,
+                )
+                rows_updated += max(0, result.rowcount or 0)
+            db.commit()
+            committed = rows_updated
+            if progress is not None:
+                progress(names_done, rows_updated)
+    except Exception:
+        db.rollback()
+        if committed:
+            # Earlier pages already renamed rows; realign the catalog before re-raising.
+            try:
+                software_catalog.rebuild(db)
+            except Exception:
+                db.rollback()
+                logger.exception("software catalog rebuild after failed normalization reapply failed")
+        raise
+    if committed:
+        # Catalog names moved in bulk; recompute the aggregate instead of replaying per agent.
+        software_catalog.rebuild(db)
+    return rows_updated
 
 
 # --- Licenses ---
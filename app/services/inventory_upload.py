@@ -0,0 +1,165 @@
+"""Chunked software inventory upload over the agent WebSocket (begin / chunk / commit) and delta counters."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from typing import Any
+
+from pydantic import ValidationError
+
+from app.schemas import SoftwareItem
+
+# Each chunk is one WS frame, so it is also bound by agent_ws.MAX_MESSAGE_BYTES.
+MAX_CHUNK_ITEMS = 500
+MAX_ITEMS = 20000
+MAX_CHUNKS = 400
+# Chunks skip the per-connection message limit, so they get their own budget:
+# one maximum-size upload per minute.
+MAX_CHUNKS_PER_MINUTE = MAX_CHUNKS
+UPLOAD_TIMEOUT_SEC = 300
+
+_lock = threading.Lock()
+_stats = {
+    "started": 0,
+    "completed": 0,
+    "aborted": 0,
+    "chunks": 0,
+    "items": 0,
+    "hash_mismatches": 0,
+    "timeouts": 0,
+    "chunk_rate_limited": 0,
+    "delta_applied": 0,
+    "delta_full_sync_required": 0,
+    "delta_items": 0,
+}
+
+
+class InventoryUploadError(ValueError):
+    """Rejected upload; ``code`` goes back to the agent in server.inventory.result."""
+
+    def __init__(self, code: str, message: str):
+        super().__init__(message)
+        self.code = code
+
+
+def _inc(key: str, n: int = 1) -> None:
+    with _lock:
+        _stats[key] += n
+
+
+class ChunkedInventoryUpload:
+    """One in-flight upload; chunks are validated and hashed as they arrive.
+
+    ``inventory_hash`` must be the hex SHA-256 of ``json.dumps(items, sort_keys=True)``
+    over the full list; it is recomputed here incrementally, item by item.
+    """
+
+    __slots__ = ("inventory_hash", "software_count", "items", "next_seq", "started_at", "_hasher")
+
+    def __init__(self, inventory_hash: Any, software_count: Any):
+        inventory_hash = str(inventory_hash or "").strip().lower()
+        if not inventory_hash:
+            raise InventoryUploadError("invalid", "inventory_hash is required")
+        try:
+            count = int(software_count)
+        except (TypeError, ValueError):
+            raise InventoryUploadError("invalid", "software_count is required") from None
+        if count < 0 or count > MAX_ITEMS:
+            raise InventoryUploadError("too_large", "software_count exceeds %s" % MAX_ITEMS)
+        self.inventory_hash = inventory_hash
+        self.software_count = count
+        self.items: list[SoftwareItem] = []
+        self.next_seq = 0
+        self.started_at = time.monotonic()
+        self._hasher = hashlib.sha256(b"[")
+        _inc("started")
+
+    def _check_timeout(self) -> None:
+        if time.monotonic() - self.started_at > UPLOAD_TIMEOUT_SEC:
+            _inc("timeouts")
+            raise InventoryUploadError("timeout", "upload not committed within %s seconds" % UPLOAD_TIMEOUT_SEC)
+
+    def add_chunk(self, seq: Any, raw_items: Any) -> None:
+        self._check_timeout()
+        if seq != self.next_seq:
+            raise InventoryUploadError("out_of_order", "expected chunk %s" % self.next_seq)
+        if not isinstance(raw_items, list) or len(raw_items) > MAX_CHUNK_ITEMS:
+            raise InventoryUploadError("invalid", "items must be a list of at most %s" % MAX_CHUNK_ITEMS)
+        if self.next_seq >= MAX_CHUNKS or len(self.items) + len(raw_items) > self.software_count:
+            raise InventoryUploadError("too_large", "more items than announced")
+        parsed: list[SoftwareItem] = []
+        for raw in raw_items:
+            try:
+                parsed.append(SoftwareItem.model_validate(raw))
+            except ValidationError:
+                raise InventoryUploadError("invalid", "invalid item in chunk %s" % seq) from None
+        hasher = self._hasher
+        for idx, raw in enumerate(raw_items):
+            if self.items or idx:
+                hasher.update(b", ")
+            hasher.update(json.dumps(raw, sort_keys=True).encode("utf-8"))
+        self.items.extend(parsed)
+        self.next_seq += 1
+        _inc("chunks")
+        _inc("items", len(parsed))
+
+    def finish(self, inventory_hash: Any = None) -> list[SoftwareItem]:
+        """Check completeness and the content hash; returns the items to persist."""
+        self._check_timeout()
+        if inventory_hash and str(inventory_hash).strip().lower() != self.inventory_hash:
+            raise InventoryUploadError("invalid", "inventory_hash differs from begin")
+        if len(self.items) != self.software_count:
+            raise InventoryUploadError("incomplete", "received %s of %s items" % (len(self.items), self.software_count))
+        hasher = self._hasher.copy()
+        hasher.update(b"]")
+        if hasher.hexdigest() != self.inventory_hash:
+            _inc("hash_mismatches")
+            raise InventoryUploadError("hash_mismatch", "inventory_hash does not match the uploaded items")
+        _inc("completed")
+        return self.items
+
+
+class ChunkWindow:
+    """Per-connection fixed one-minute window over chunk frames, across uploads."""
+
+    __slots__ = ("count", "window_start")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.window_start = time.monotonic()
+
+    def allow(self) -> bool:
+        now = time.monotonic()
+        if now - self.window_start >= 60:
+            self.count = 0
+            self.window_start = now
+        self.count += 1
+        if self.count > MAX_CHUNKS_PER_MINUTE:
+            _inc("chunk_rate_limited")
+            return False
+        return True
+
+
+def note_aborted() -> None:
+    _inc("aborted")
+
+
+def note_delta(applied: bool, items: int) -> None:
+    """Count one delta submit (HTTP or WS); ``items`` is added + removed + changed."""
+    with _lock:
+        _stats["delta_applied" if applied else "delta_full_sync_required"] += 1
+        _stats["delta_items"] += items
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def clear_all() -> None:
+    with _lock:
+        for key in _stats:
+            _stats[key] = 0
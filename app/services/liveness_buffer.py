@@ -0,0 +1,225 @@
+"""Write-behind buffer for hot agent liveness columns (last_seen, uptime, disk, snapshot freshness)."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+import logging
+import threading
+import time
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+
+logger = logging.getLogger("appcenter.liveness")
+
+FLUSH_INTERVAL_SEC = 5
+# Keep a single UPDATE statement reasonably sized.
+MAX_ROWS_PER_STATEMENT = 1000
+
+
+@dataclass
+class _Pending:
+    last_seen: datetime
+    uptime_sec: Optional[int]
+    disk_free_gb: Optional[int]
+    ensure_online: bool
+    queued_at: float
+    # Set when a beat re-reported an unchanged sessions / remote support snapshot.
+    sessions_seen_at: Optional[datetime] = None
+    remote_support_seen_at: Optional[datetime] = None
+
+
+def _later(a: Optional[datetime], b: Optional[datetime]) -> Optional[datetime]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return max(a, b)
+
+
+_lock = threading.Lock()
+# Serialises flushes so batches reach the DB in the order they were taken.
+_flush_lock = threading.Lock()
+_pending: dict[str, _Pending] = {}
+_stats = {
+    "recorded": 0,
+    "coalesced": 0,
+    "flushes": 0,
+    "flushed_rows": 0,
+    "flush_errors": 0,
+    "last_batch_size": 0,
+    "max_batch_size": 0,
+    "last_flush_lag_sec": 0.0,
+    "max_flush_lag_sec": 0.0,
+    "last_flush_duration_ms": 0.0,
+}
+
+
+def record(
+    agent_uuid: str,
+    last_seen: datetime,
+    uptime_sec: Optional[int] = None,
+    disk_free_gb: Optional[int] = None,
+    ensure_online: bool = False,
+    sessions_seen_at: Optional[datetime] = None,
+    remote_support_seen_at: Optional[datetime] = None,
+) -> None:
+    """Queue a liveness update; repeated updates for one agent coalesce (latest wins)."""
+    with _lock:
+        _stats["recorded"] += 1
+        current = _pending.get(agent_uuid)
+        if current is None:
+            _pending[agent_uuid] = _Pending(
+                last_seen=last_seen,
+                uptime_sec=uptime_sec,
+                disk_free_gb=disk_free_gb,
+                ensure_online=ensure_online,
+                queued_at=time.monotonic(),
+                sessions_seen_at=sessions_seen_at,
+                remote_support_seen_at=remote_support_seen_at,
+            )
+            return
+        _stats["coalesced"] += 1
+        if last_seen >= current.last_seen:
+            current.last_seen = last_seen
+        if uptime_sec is not None:
+            current.uptime_sec = uptime_sec
+        if disk_free_gb is not None:
+            current.disk_free_gb = disk_free_gb
+        current.ensure_online = current.ensure_online or ensure_online
+        current.sessions_seen_at = _later(current.sessions_seen_at, sessions_seen_at)
+        current.remote_support_seen_at = _later(current.remote_support_seen_at, remote_support_seen_at)
+
+
+def discard(agent_uuid: str) -> None:
+    """Drop a queued update (synchronous state transitions write these columns themselves)."""
+    with _lock:
+        _pending.pop(agent_uuid, None)
+
+
+def pending_last_seen(agent_uuid: str) -> Optional[datetime]:
+    with _lock:
+        item = _pending.get(agent_uuid)
+        return item.last_seen if item else None
+
+
+def pending_count() -> int:
+    with _lock:
+        return len(_pending)
+
+
+def _requeue(batch: dict[str, _Pending]) -> None:
+    # Newer updates recorded while the failed flush ran take precedence.
+    with _lock:
+        for uuid, item in batch.items():
+            current = _pending.get(uuid)
+            if current is None:
+                _pending[uuid] = item
+                continue
+            if current.uptime_sec is None:
+                current.uptime_sec = item.uptime_sec
+            if current.disk_free_gb is None:
+                current.disk_free_gb = item.disk_free_gb
+            if item.last_seen > current.last_seen:
+                current.last_seen = item.last_seen
+            current.ensure_online = current.ensure_online or item.ensure_online
+            current.sessions_seen_at = _later(current.sessions_seen_at, item.sessions_seen_at)
+            current.remote_support_seen_at = _later(current.remote_support_seen_at, item.remote_support_seen_at)
+            current.queued_at = min(current.queued_at, item.queued_at)
+
+
+def _write_batch(db: Session, rows: list[tuple[str, _Pending]]) -> None:
+    values_sql: list[str] = []
+    params: dict = {}
+    for idx, (uuid, item) in enumerate(rows):
+        values_sql.append(
+            f"(:u{idx}, CAST(:t{idx} AS TIMESTAMPTZ), CAST(:up{idx} AS INTEGER), "
+            f"CAST(:d{idx} AS INTEGER), CAST(:o{idx} AS BOOLEAN), "
+            f"CAST(:s{idx} AS TIMESTAMPTZ), CAST(:r{idx} AS TIMESTAMPTZ))"
+        )
+        params[f"u{idx}"] = uuid
+        params[f"t{idx}"] = item.last_seen
+        params[f"up{idx}"] = item.uptime_sec
+        params[f"d{idx}"] = item.disk_free_gb
+        params[f"o{idx}"] = item.ensure_online
+        params[f"s{idx}"] = item.sessions_seen_at
+        params[f"r{idx}"] = item.remote_support_seen_at
+    # last_seen guard: never move a row backwards past a synchronous write.
+    db.execute(
+        text(
+            "UPDATE agents AS a SET "
+            "last_seen = v.last_seen, "
+            "updated_at = v.last_seen, "
+            "uptime_sec = COALESCE(v.uptime_sec, a.uptime_sec), "
+            "disk_free_gb = COALESCE(v.disk_free_gb, a.disk_free_gb), "
+            "status = CASE WHEN v.ensure_online THEN 'online' ELSE a.status END, "
+            "logged_in_sessions_updated_at = COALESCE(v.sessions_seen_at, a.logged_in_sessions_updated_at), "
+            "remote_support_updated_at = COALESCE(v.remote_support_seen_at, a.remote_support_updated_at) "
+            f"FROM (VALUES {', '.join(values_sql)}) "
+            "AS v(uuid, last_seen, uptime_sec, disk_free_gb, ensure_online, sessions_seen_at, remote_support_seen_at) "
+            "WHERE a.uuid = v.uuid AND (a.last_seen IS NULL OR a.last_seen <= v.last_seen)"
+        ),
+        params,
+    )
+
+
+def flush(db: Optional[Session] = None) -> int:
+    """Write all queued updates in bulk. Returns the number of agents flushed."""
+    with _flush_lock:
+        with _lock:
+            if not _pending:
+                return 0
+            batch = dict(_pending)
+            _pending.clear()
+
+        started = time.monotonic()
+        oldest = min(item.queued_at for item in batch.values())
+        own_session = db is None
+        session = SessionLocal() if own_session else db
+        try:
+            rows = list(batch.items())
+            for offset in range(0, len(rows), MAX_ROWS_PER_STATEMENT):
+                _write_batch(session, rows[offset : offset + MAX_ROWS_PER_STATEMENT])
+            session.commit()
+        except Exception:
+            session.rollback()
+            _requeue(batch)
+            with _lock:
+                _stats["flush_errors"] += 1
+            logger.exception("liveness flush failed rows=%s", len(batch))
+            return 0
+        finally:
+            if own_session:
+                session.close()
+
+        finished = time.monotonic()
+        size = len(batch)
+        lag = finished - oldest
+        with _lock:
+            _stats["flushes"] += 1
+            _stats["flushed_rows"] += size
+            _stats["last_batch_size"] = size
+            _stats["max_batch_size"] = max(_stats["max_batch_size"], size)
+            _stats["last_flush_lag_sec"] = round(lag, 3)
+            _stats["max_flush_lag_sec"] = round(max(_stats["max_flush_lag_sec"], lag), 3)
+            _stats["last_flush_duration_ms"] = round((finished - started) * 1000.0, 2)
+        return size
+
+
+def stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+        out["pending"] = len(_pending)
+        out["flush_interval_sec"] = FLUSH_INTERVAL_SEC
+        return out
+
+
+def clear_all() -> None:
+    with _lock:
+        _pending.clear()
+        for key in _stats:
+            _stats[key] = 0.0 if isinstance(_stats[key], float) else 0
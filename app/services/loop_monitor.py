@@ -0,0 +1,78 @@
+"""Event-loop lag sampler (how late a periodic wakeup fires on the server loop)."""
+
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger("appcenter.loop")
+
+SAMPLE_INTERVAL_SEC = 0.5
+WINDOW_SAMPLES = 240  # ~2 minutes
+WARN_LAG_SEC = 0.5
+
+_lock = threading.Lock()
+_samples: deque[float] = deque(maxlen=WINDOW_SAMPLES)
+_max_lag = 0.0
+_task: Optional[asyncio.Task] = None
+
+
+def _record(lag: float) -> None:
+    global _max_lag
+    with _lock:
+        _samples.append(lag)
+        if lag > _max_lag:
+            _max_lag = lag
+
+
+async def _run() -> None:
+    while True:
+        expected = time.perf_counter() + SAMPLE_INTERVAL_SEC
+        await asyncio.sleep(SAMPLE_INTERVAL_SEC)
+        lag = max(0.0, time.perf_counter() - expected)
+        _record(lag)
+        if lag >= WARN_LAG_SEC:
+            logger.warning("event loop lag %.0f ms", lag * 1000.0)
+
+
+def start() -> None:
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.get_running_loop().create_task(_run())
+
+
+async def stop() -> None:
+    global _task
+    task, _task = _task, None
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def stats() -> dict:
+    with _lock:
+        ordered = sorted(_samples)
+        current = _samples[-1] if _samples else 0.0
+        max_lag = _max_lag
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] if ordered else 0.0
+    return {
+        "current_ms": round(current * 1000.0, 2),
+        "p99_ms": round(p99 * 1000.0, 2),
+        "max_ms": round(max_lag * 1000.0, 2),
+        "samples": len(ordered),
+    }
+
+
+def clear_all() -> None:
+    global _max_lag
+    with _lock:
+        _samples.clear()
+        _max_lag = 0.0
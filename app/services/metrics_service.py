@@ -0,0 +1,323 @@
+"""Per-route SQL / request metrics and scheduler job timings in Prometheus text format."""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from contextvars import ContextVar
+from dataclasses import dataclass
+import functools
+import threading
+import time
+from typing import Any, Callable, Iterable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+JOB_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+BACKGROUND_ROUTE = "background"
+UNMATCHED_ROUTE = "unmatched"
+
+
+@dataclass
+class _Scope:
+    route: str
+    statements: int = 0
+    db_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    pool_wait_seconds: float = 0.0
+    checkouts: int = 0
+    # HTTP requests fold their totals into the route counters once the route is known.
+    deferred: bool = False
+
+
+_current: ContextVar[Optional[_Scope]] = ContextVar("appcenter_metrics_scope", default=None)
+
+
+class _Histogram:
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets: tuple) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+
+_lock = threading.Lock()
+# name -> labels tuple -> histogram / counter value
+_histograms: dict[str, dict[tuple, _Histogram]] = {}
+_counters: dict[str, dict[tuple, float]] = {}
+
+_HELP = {
+    "appcenter_http_request_duration_seconds": ("histogram", "HTTP request latency by route."),
+    "appcenter_http_request_db_statements": ("histogram", "SQL statements executed per HTTP request."),
+    "appcenter_http_request_db_seconds": ("histogram", "Total SQL time per HTTP request."),
+    "appcenter_http_request_db_slowest_seconds": ("histogram", "Slowest SQL statement per HTTP request."),
+    "appcenter_db_pool_checkout_wait_seconds": ("histogram", "Pool checkout wait (per HTTP request, per checkout elsewhere)."),
+    "appcenter_scheduler_job_duration_seconds": ("histogram", "Scheduler job run time."),
+    "appcenter_db_statements_total": ("counter", "SQL statements by route (includes WebSocket and background work)."),
+    "appcenter_db_statement_seconds_total": ("counter", "SQL time by route."),
+    "appcenter_http_requests_total": ("counter", "HTTP requests by route, method and status."),
+    "appcenter_scheduler_job_failures_total": ("counter", "Scheduler job runs that raised."),
+}
+
+
+def _observe(name: str, labels: tuple, buckets: tuple, value: float) -> None:
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        hist = series.get(labels)
+        if hist is None:
+            hist = series[labels] = _Histogram(buckets)
+        hist.observe(value)
+
+
+def _inc(name: str, labels: tuple, amount: float = 1.0) -> None:
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0.0) + amount
+
+
+# --- SQL hooks -------------------------------------------------------------
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    stack = conn.info.get("metrics_started")
+    if not stack:
+        return
+    elapsed = time.perf_counter() - stack.pop()
+    scope = _current.get()
+    route = scope.route if scope is not None else BACKGROUND_ROUTE
+    if scope is not None:
+        scope.statements += 1
+        scope.db_seconds += elapsed
+        if elapsed > scope.slowest_seconds:
+            scope.slowest_seconds = elapsed
+        if scope.deferred:
+            return
+    _count_statements(route, 1, elapsed)
+
+
+def _count_statements(route: str, statements: int, seconds: float) -> None:
+    with _lock:
+        totals = _counters.setdefault("appcenter_db_statements_total", {})
+        totals[(route,)] = totals.get((route,), 0.0) + statements
+        durations = _counters.setdefault("appcenter_db_statement_seconds_total", {})
+        durations[(route,)] = durations.get((route,), 0.0) + seconds
+
+
+def _handle_error(exception_context) -> None:
+    conn = exception_context.connection
+    if conn is not None:
+        stack = conn.info.get("metrics_started")
+        if stack:
+            stack.pop()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        finally:
+            self._record_wait(time.perf_counter() - started)
+        return record
+
+    @staticmethod
+    def _record_wait(waited: float) -> None:
+        scope = _current.get()
+        if scope is not None:
+            scope.checkouts += 1
+            scope.pool_wait_seconds += waited
+            if scope.deferred:
+                # Folded into one observation when the request finishes.
+                return
+        route = scope.route if scope is not None else BACKGROUND_ROUTE
+        _observe("appcenter_db_pool_checkout_wait_seconds", (route,), POOL_WAIT_BUCKETS, waited)
+
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """Checkout-wait timing for the asyncpg engine's pool."""
+
+
+def instrument_engine(engine: Engine) -> None:
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
+
+
+# --- request middleware ----------------------------------------------------
+
+
+class RequestMetricsMiddleware:
+    """ASGI middleware: attributes SQL work to the matched route template."""
+
+    def __init__(self, app) -> None:
+        self.app = app
+        self._templates: dict[Any, str] = {}
+
+    def _route_label(self, scope: dict) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return UNMATCHED_ROUTE
+        label = self._templates.get(endpoint)
+        if label is None:
+            label = UNMATCHED_ROUTE
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                if getattr(route, "endpoint", None) is endpoint or getattr(route, "app", None) is endpoint:
+                    label = getattr(route, "path", UNMATCHED_ROUTE)
+                    break
+            self._templates[endpoint] = label
+        return label
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        metrics_scope = _Scope(route=UNMATCHED_ROUTE)
+        token = _current.set(metrics_scope)
+        if scope["type"] == "websocket":
+            # Long-lived: only the per-route counters apply (WS paths carry no parameters).
+            metrics_scope.route = "ws:" + scope.get("path", "")
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _current.reset(token)
+            return
+
+        metrics_scope.deferred = True
+        started = time.perf_counter()
+        status_code = 500
+
+        async def _send(message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = int(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            _current.reset(token)
+            route = self._route_label(scope)
+            labels = (route,)
+            if metrics_scope.statements:
+                _count_statements(route, metrics_scope.statements, metrics_scope.db_seconds)
+            if metrics_scope.checkouts:
+                _observe("appcenter_db_pool_checkout_wait_seconds", labels, POOL_WAIT_BUCKETS, metrics_scope.pool_wait_seconds)
+            _observe("appcenter_http_request_duration_seconds", labels, DURATION_BUCKETS, time.perf_counter() - started)
+            _observe("appcenter_http_request_db_statements", labels, STATEMENT_BUCKETS, metrics_scope.statements)
+            _observe("appcenter_http_request_db_seconds", labels, DURATION_BUCKETS, metrics_scope.db_seconds)
+            _observe("appcenter_http_request_db_slowest_seconds", labels, DURATION_BUCKETS, metrics_scope.slowest_seconds)
+            _inc("appcenter_http_requests_total", (route, scope.get("method", ""), str(status_code)))
+
+
+# --- scheduler jobs --------------------------------------------------------
+
+
+def timed_job(func: Callable) -> Callable:
+    """Wrap a scheduler job: records its duration and labels its SQL with the job name."""
+    job_name = func.__name__
+
+    @functools.wraps(func)
+    def _wrapper(*args, **kwargs):
+        token = _current.set(_Scope(route="job:" + job_name))
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            _inc("appcenter_scheduler_job_failures_total", (job_name,))
+            raise
+        finally:
+            _current.reset(token)
+            _observe("appcenter_scheduler_job_duration_seconds", (job_name,), JOB_BUCKETS, time.perf_counter() - started)
+
+    return _wrapper
+
+
+# --- exposition ------------------------------------------------------------
+
+_LABEL_NAMES = {
+    "appcenter_http_requests_total": ("route", "method", "status"),
+    "appcenter_scheduler_job_duration_seconds": ("job",),
+    "appcenter_scheduler_job_failures_total": ("job",),
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Iterable[str], values: Iterable[Any], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def render(gauges: Optional[dict[str, tuple[str, float]]] = None) -> str:
+    """Prometheus text exposition; ``gauges`` maps metric name -> (help, value)."""
+    lines: list[str] = []
+    with _lock:
+        histograms = {
+            name: {labels: (list(h.counts), h.total, h.count, h.buckets) for labels, h in series.items()}
+            for name, series in _histograms.items()
+        }
+        counters = {name: dict(series) for name, series in _counters.items()}
+
+    for name in sorted(histograms):
+        names = _LABEL_NAMES.get(name, ("route",))
+        lines.append(f"# HELP {name} {_HELP.get(name, ('', ''))[1]}")
+        lines.append(f"# TYPE {name} histogram")
+        for labels in sorted(histograms[name]):
+            counts, total, count, buckets = histograms[name][labels]
+            cumulative = 0
+            for bound, bucket_count in zip(buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{name}_bucket{_labels(names, labels, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, labels)} {_fmt(total)}")
+            lines.append(f"{name}_count{_labels(names, labels)} {count}")
+
+    for name in sorted(counters):
+        names = _LABEL_NAMES.get(name, ("route",))
+        lines.append(f"# HELP {name} {_HELP.get(name, ('', ''))[1]}")
+        lines.append(f"# TYPE {name} counter")
+        for labels in sorted(counters[name]):
+            lines.append(f"{name}{_labels(names, labels)} {_fmt(counters[name][labels])}")
+
+    for name, (help_text, value) in sorted((gauges or {}).items()):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        lines.append(f"{name} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
@@ -0,0 +1,237 @@
+"""Compiled, cached matcher for software normalization rules (exact / starts_with / contains)."""
+
+from __future__ import annotations
+
+from collections import deque
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import SoftwareNormalizationRule
+
+logger = logging.getLogger("appcenter.normalization")
+
+# Rule edits on other workers are picked up by a cheap fingerprint query at most
+# this often; local edits call invalidate() and apply on the next lookup.
+REVALIDATE_INTERVAL_SEC = 5.0
+
+_NO_MATCH = (float("inf"), None)
+
+
+class _Trie:
+    """Prefix trie; each node keeps the lowest-id rule ending there."""
+
+    __slots__ = ("children", "ends")
+
+    def __init__(self) -> None:
+        self.children: list[dict[str, int]] = [{}]
+        self.ends: dict[int, tuple[int, str]] = {}
+
+    def add(self, key: str, rule_id: int, name: str) -> int:
+        node = 0
+        for ch in key:
+            nxt = self.children[node].get(ch)
+            if nxt is None:
+                nxt = len(self.children)
+                self.children[node][ch] = nxt
+                self.children.append({})
+            node = nxt
+        current = self.ends.get(node)
+        if current is None or rule_id < current[0]:
+            self.ends[node] = (rule_id, name)
+        return node
+
+
+class _PrefixMatcher(_Trie):
+    def best(self, text: str) -> tuple:
+        best = self.ends.get(0, _NO_MATCH)
+        node = 0
+        for ch in text:
+            node = self.children[node].get(ch, -1)
+            if node < 0:
+                break
+            hit = self.ends.get(node)
+            if hit is not None and hit[0] < best[0]:
+                best = hit
+        return best
+
+
+class _ContainsMatcher(_Trie):
+    """Aho-Corasick automaton; ``out[node]`` is the lowest-id rule matching at or via that node."""
+
+    __slots__ = ("fail", "out", "floor")
+
+    def build(self) -> None:
+        size = len(self.children)
+        self.fail = [0] * size
+        self.out: list[tuple] = [self.ends.get(node, _NO_MATCH) for node in range(size)]
+        queue: deque[int] = deque(self.children[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.children[node].items():
+                fallback = self.fail[node]
+                while fallback and ch not in self.children[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.children[fallback].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                if self.out[self.fail[child]][0] < self.out[child][0]:
+                    self.out[child] = self.out[self.fail[child]]
+                queue.append(child)
+        # Nothing can beat the lowest-id pattern; stop scanning once it is found.
+        self.floor = min((hit[0] for hit in self.ends.values()), default=_NO_MATCH[0])
+
+    def best(self, text: str) -> tuple:
+        best = self.out[0]
+        node = 0
+        children, fail, out, floor = self.children, self.fail, self.out, self.floor
+        for ch in text:
+            while node and ch not in children[node]:
+                node = fail[node]
+            node = children[node].get(ch, 0)
+            hit = out[node]
+            if hit[0] < best[0]:
+                best = hit
+                if best[0] == floor:
+                    break
+        return best
+
+
+class CompiledMatcher:
+    """Active rules compiled once; ``match`` takes an already canonicalized name.
+
+    Precedence is the same as scanning the rules by ascending id: the matching
+    rule with the lowest id wins, whatever its match type.
+    """
+
+    def __init__(self, rules: Iterable[tuple[int, str, str, str]], version: int = 0):
+        self.version = version
+        self.exact: dict[str, tuple[int, str]] = {}
+        self.prefix = _PrefixMatcher()
+        self.contains = _ContainsMatcher()
+        self.rule_count = 0
+        for rule_id, match_type, key, name in sorted(rules):
+            if match_type == "exact":
+                self.exact.setdefault(key, (rule_id, name))
+            elif match_type == "starts_with":
+                self.prefix.add(key, rule_id, name)
+            elif match_type == "contains":
+                self.contains.add(key, rule_id, name)
+            else:
+                continue
+            self.rule_count += 1
+        self.contains.build()
+
+    def match(self, key: str) -> Optional[str]:
+        best = self.exact.get(key, _NO_MATCH)
+        hit = self.prefix.best(key)
+        if hit[0] < best[0]:
+            best = hit
+        hit = self.contains.best(key)
+        if hit[0] < best[0]:
+            best = hit
+        return best[1]
+
+
+_lock = threading.Lock()
+_matcher: Optional[CompiledMatcher] = None
+_fingerprint: Optional[tuple] = None
+_checked_at = 0.0
+_force_reload = True
+_builds = 0
+
+
+def _rules_fingerprint(db: Session) -> tuple:
+    count, max_id, latest = db.query(
+        func.count(SoftwareNormalizationRule.id),
+        func.max(SoftwareNormalizationRule.id),
+        func.max(SoftwareNormalizationRule.updated_at),
+    ).one()
+    return (int(count or 0), int(max_id or 0), latest.isoformat() if latest is not None else "")
+
+
+def _load(db: Session, version: int) -> CompiledMatcher:
+    from app.services.inventory_service import _canon_key  # pylint: disable=import-outside-toplevel
+
+    rows = (
+        db.query(
+            SoftwareNormalizationRule.id,
+            SoftwareNormalizationRule.match_type,
+            SoftwareNormalizationRule.pattern,
+            SoftwareNormalizationRule.normalized_name,
+        )
+        .filter(SoftwareNormalizationRule.is_active.is_(True))
+        .all()
+    )
+    return CompiledMatcher(
+        ((int(rid), str(match_type), _canon_key(pattern or ""), name) for rid, match_type, pattern, name in rows),
+        version=version,
+    )
+
+
+def get_matcher(db: Session) -> CompiledMatcher:
+    global _matcher, _fingerprint, _checked_at, _force_reload, _builds
+    now = time.monotonic()
+    with _lock:
+        current = _matcher
+        force = _force_reload or current is None
+        if not force and (now - _checked_at) < REVALIDATE_INTERVAL_SEC:
+            return current  # type: ignore[return-value]
+        _checked_at = now
+        _force_reload = False
+        previous = _fingerprint
+
+    try:
+        fingerprint = _rules_fingerprint(db)
+        if not force and fingerprint == previous:
+            return current  # type: ignore[return-value]
+        started = time.perf_counter()
+        fresh = _load(db, (current.version + 1) if current is not None else 1)
+    except Exception:
+        with _lock:
+            _force_reload = True
+        if current is None:
+            raise
+        logger.exception("normalization matcher refresh failed; serving version=%s", current.version)
+        return current
+
+    with _lock:
+        _matcher = fresh
+        _fingerprint = fingerprint
+        _builds += 1
+    logger.info(
+        "normalization matcher built version=%s rules=%s ms=%.1f",
+        fresh.version,
+        fresh.rule_count,
+        (time.perf_counter() - started) * 1000.0,
+    )
+    return fresh
+
+
+def invalidate() -> None:
+    """Force a rebuild on next lookup (call after committing rule changes)."""
+    global _force_reload
+    with _lock:
+        _force_reload = True
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "version": _matcher.version if _matcher is not None else 0,
+            "rules": _matcher.rule_count if _matcher is not None else 0,
+            "builds": _builds,
+        }
+
+
+def clear_all() -> None:
+    global _matcher, _fingerprint, _checked_at, _force_reload, _builds
+    with _lock:
+        _matcher = None
+        _fingerprint = None
+        _checked_at = 0.0
+        _force_reload = True
+        _builds = 0
@@ -0,0 +1,132 @@
+"""Background job that re-applies normalization rules to the stored inventory."""
+
+from __future__ import annotations
+
+from datetime import datetime, timezone
+import logging
+import threading
+import time
+from typing import Optional
+
+logger = logging.getLogger("appcenter.normalization")
+
+_lock = threading.Lock()
+_thread: Optional[threading.Thread] = None
+# Set when rules change while a run is in progress; the worker starts one more pass.
+_rerun = False
+_state: dict = {
+    "state": "idle",
+    "runs": 0,
+    "names_done": 0,
+    "rows_updated": 0,
+    "started_at": None,
+    "finished_at": None,
+    "duration_ms": None,
+    "error": None,
+}
+
+
+def _progress(names_done: int, rows_updated: int) -> None:
+    with _lock:
+        _state["names_done"] = names_done
+        _state["rows_updated"] = rows_updated
+
+
+def _run_once() -> None:
+    from app.database import SessionLocal  # pylint: disable=import-outside-toplevel
+    from app.services.inventory_service import reapply_normalization_rules  # pylint: disable=import-outside-toplevel
+
+    with _lock:
+        _state.update(
+            state="running",
+            names_done=0,
+            rows_updated=0,
+            started_at=datetime.now(timezone.utc).isoformat(),
+            finished_at=None,
+            duration_ms=None,
+            error=None,
+        )
+    started = time.perf_counter()
+    db = SessionLocal()
+    try:
+        rows = reapply_normalization_rules(db, progress=_progress)
+        outcome, error = "done", None
+    except Exception as exc:
+        db.rollback()
+        rows, outcome, error = None, "failed", str(exc)
+        logger.exception("normalization reapply failed")
+    finally:
+        db.close()
+    duration_ms = round((time.perf_counter() - started) * 1000.0, 1)
+    with _lock:
+        _state["state"] = outcome
+        _state["runs"] += 1
+        _state["finished_at"] = datetime.now(timezone.utc).isoformat()
+        _state["duration_ms"] = duration_ms
+        _state["error"] = error
+        names_done = _state["names_done"]
+    logger.info(
+        "normalization reapply %s names=%s rows=%s ms=%.1f", outcome, names_done, rows, duration_ms
+    )
+
+
+def _worker() -> None:
+    global _thread, _rerun
+    while True:
+        _run_once()
+        with _lock:
+            if not _rerun:
+                _thread = None
+                return
+            _rerun = False
+
+
+def request() -> dict:
+    """Start a run in the background (or queue one more after the current run); returns status()."""
+    global _thread, _rerun
+    with _lock:
+        if _thread is not None:
+            _rerun = True
+        else:
+            _state["state"] = "queued"
+            _thread = threading.Thread(target=_worker, name="normalization-reapply", daemon=True)
+            _thread.start()
+    return status()
+
+
+def status() -> dict:
+    with _lock:
+        out = dict(_state)
+        out["rerun_pending"] = _rerun
+    return out
+
+
+def wait(timeout: float = 30.0) -> bool:
+    """Block until no run is active (tests / shutdown); False on timeout."""
+    deadline = time.monotonic() + timeout
+    while True:
+        with _lock:
+            thread = _thread
+        if thread is None:
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        thread.join(min(remaining, 0.1))
+
+
+def clear_all() -> None:
+    global _rerun
+    wait()
+    with _lock:
+        _rerun = False
+        _state.update(
+            state="idle",
+            runs=0,
+            names_done=0,
+            rows_updated=0,
+            started_at=None,
+            finished_at=None,
+            duration_ms=None,
+            error=None,
+        )
@@ -0,0 +1,194 @@
+"""Tracks which agents may have pending work so idle heartbeats can skip the work queries."""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+import logging
+import threading
+from typing import Iterable, Optional
+
+from sqlalchemy.orm import Session
+
+from app.models import AgentApplication, AgentWorkMark, AnnouncementDelivery, RemoteSupportSession
+
+logger = logging.getLogger("appcenter.pending_work")
+
+# How often each worker pulls markers written by other workers.
+SYNC_INTERVAL_SEC = 2.0
+# A marker written (but not yet committed) while a check ran must still count
+# after that check cleared the agent.
+CLEAR_MARGIN_SEC = 5.0
+# Safety net: every agent gets a full check at least this often.
+FULL_RECHECK_SEC = 600.0
+MARK_RETENTION_MIN = 60
+
+KIND_DEPLOYMENT = "deployment"
+KIND_STORE_INSTALL = "store_install"
+KIND_ANNOUNCEMENT = "announcement"
+KIND_REMOTE_SUPPORT = "remote_support"
+
+_lock = threading.Lock()
+_marked: dict[str, datetime] = {}
+_cleared: dict[str, datetime] = {}
+_started_at: datetime = datetime.now(timezone.utc)
+_synced_until: Optional[datetime] = None
+_stats = {"hits": 0, "skips": 0, "marks": 0, "synced_marks": 0}
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _note(agent_uuid: str, marked_at: datetime) -> None:
+    cleared = _cleared.get(agent_uuid)
+    if cleared is not None and marked_at <= cleared:
+        return
+    current = _marked.get(agent_uuid)
+    if current is None or marked_at > current:
+        _marked[agent_uuid] = marked_at
+
+
+def mark(db: Session, agent_uuids: Iterable[str], kind: str) -> None:
+    """Record new work for agents; persisted with the caller's transaction."""
+    now = _utcnow()
+    uuids = [u for u in dict.fromkeys(agent_uuids) if u]
+    if not uuids:
+        return
+    db.add_all([AgentWorkMark(agent_uuid=u, kind=kind, created_at=now) for u in uuids])
+    with _lock:
+        _stats["marks"] += len(uuids)
+        for agent_uuid in uuids:
+            _note(agent_uuid, now)
+
+
+def _sync(db: Session) -> None:
+    global _synced_until
+    now = _utcnow()
+    with _lock:
+        since = _synced_until
+        if since is not None and (now - since).total_seconds() < SYNC_INTERVAL_SEC:
+            return
+        _synced_until = now
+    # Overlap the window so markers committed late (older created_at) are not missed.
+    lower = (since or _started_at) - timedelta(seconds=CLEAR_MARGIN_SEC)
+    try:
+        rows = (
+            db.query(AgentWorkMark.agent_uuid, AgentWorkMark.created_at)
+            .filter(AgentWorkMark.created_at >= lower)
+            .all()
+        )
+    except Exception:
+        with _lock:
+            _synced_until = since
+        logger.exception("pending work marker sync failed")
+        return
+    with _lock:
+        _stats["synced_marks"] += len(rows)
+        for agent_uuid, created_at in rows:
+            _note(agent_uuid, _as_utc(created_at))
+
+
+def has_pending(db: Session, agent_uuid: str) -> bool:
+    _sync(db)
+    now = _utcnow()
+    with _lock:
+        if agent_uuid in _marked:
+            _stats["hits"] += 1
+            return True
+        cleared = _cleared.get(agent_uuid, _started_at)
+        if (now - cleared).total_seconds() >= FULL_RECHECK_SEC:
+            _stats["hits"] += 1
+            return True
+        _stats["skips"] += 1
+        return False
+
+
+def clear(agent_uuid: str, checked_at: datetime) -> None:
+    """Forget the agent after a full check that started at ``checked_at`` delivered everything."""
+    # Markers from the margin window may belong to transactions the check could
+    # not see yet; they keep (or later re-add) the agent for one more pass.
+    cutoff = checked_at - timedelta(seconds=CLEAR_MARGIN_SEC)
+    with _lock:
+        _cleared[agent_uuid] = cutoff
+        marked_at = _marked.get(agent_uuid)
+        if marked_at is not None and marked_at > cutoff:
+            return
+        _marked.pop(agent_uuid, None)
+
+
+def forget(agent_uuid: str) -> None:
+    with _lock:
+        _marked.pop(agent_uuid, None)
+        _cleared.pop(agent_uuid, None)
+
+
+def rebuild(db: Session) -> int:
+    """Seed the set from the database (startup)."""
+    global _started_at, _synced_until
+    now = _utcnow()
+    uuids: set[str] = set()
+    uuids.update(
+        u
+        for (u,) in db.query(AgentApplication.agent_uuid)
+        .filter(AgentApplication.status == "pending")
+        .distinct()
+        .all()
+    )
+    uuids.update(
+        u
+        for (u,) in db.query(AnnouncementDelivery.agent_uuid)
+        .filter(AnnouncementDelivery.status == "pending")
+        .distinct()
+        .all()
+    )
+    uuids.update(
+        u
+        for (u,) in db.query(RemoteSupportSession.agent_uuid)
+        .filter(
+            (RemoteSupportSession.status == "pending_approval")
+            | (RemoteSupportSession.end_signal_pending.is_(True))
+        )
+        .distinct()
+        .all()
+    )
+    with _lock:
+        _marked.clear()
+        _cleared.clear()
+        _started_at = now
+        _synced_until = now
+        for agent_uuid in uuids:
+            if agent_uuid:
+                _marked[agent_uuid] = now
+    logger.info("pending work set rebuilt agents=%s", len(uuids))
+    return len(uuids)
+
+
+def prune_marks(db: Session) -> int:
+    cutoff = _utcnow() - timedelta(minutes=MARK_RETENTION_MIN)
+    deleted = db.query(AgentWorkMark).filter(AgentWorkMark.created_at < cutoff).delete(synchronize_session=False)
+    db.commit()
+    return int(deleted or 0)
+
+
+def stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+        out["pending_agents"] = len(_marked)
+        return out
+
+
+def clear_all() -> None:
+    global _started_at, _synced_until
+    with _lock:
+        _marked.clear()
+        _cleared.clear()
+        _started_at = _utcnow()
+        _synced_until = None
+        for key in _stats:
+            _stats[key] = 0
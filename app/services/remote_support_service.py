@@ -11,9 +11,12 @@ from sqlalchemy import func
 from sqlalchemy.orm import Session
 
 from app.config import get_settings
-from app.models import Agent, AgentGroup, Group, RemoteSupportSession, Setting, User
+from app.models import Agent, AgentGroup, Group, RemoteSupportSession, User
 from app.services import agent_signal
+from app.services import connection_registry
+from app.services import pending_work_service
 from app.services import runtime_config_service as runtime_config
+from app.services import settings_snapshot_service
 from app.services.ws_manager import make_message, ws_manager
 
 settings = get_settings()
@@ -109,8 +112,7 @@ def _ensure_no_active_session(db: Session, agent_uuid: str) -> None:
 
 
 def _global_approval_required(db: Session) -> bool:
-    row = db.query(Setting).filter(Setting.key == "remote_support_approval_required").first()
-    raw = str(getattr(row, "value", "true") or "true").strip().lower()
+    raw = str(settings_snapshot_service.get_snapshot(db).get_str("remote_support_approval_required", "true") or "true").strip().lower()
     return raw in {"1", "true", "yes", "on"}
 
 
@@ -165,10 +167,11 @@ def create_session(
     db.add(session)
     db.flush()
     _set_agent_remote_state(db, agent_uuid, "pending_approval", session.id, helper_running=False)
+    pending_work_service.mark(db, [agent_uuid], pending_work_service.KIND_REMOTE_SUPPORT)
     db.commit()
     db.refresh(session)
     agent_signal.notify_agent(agent_uuid)
-    if ws_manager.is_agent_connected(agent_uuid):
+    if connection_registry.is_ws_connected(db, agent_uuid):
         approval_required = is_approval_required_for_agent(db, agent_uuid)
         ws_manager.schedule_send_to_agent(
             agent_uuid,
@@ -383,13 +386,15 @@ def end_session(db: Session, session_id: int, ended_by: str) -> RemoteSupportSes
     session.vnc_password = None
     # If admin ends the session, agent must be signaled via heartbeat.
     session.end_signal_pending = ended_by == "admin"
+    if session.end_signal_pending:
+        pending_work_service.mark(db, [session.agent_uuid], pending_work_service.KIND_REMOTE_SUPPORT)
     _set_agent_remote_state(db, session.agent_uuid, "idle", None, helper_running=False)
     db.add(session)
     db.commit()
     db.refresh(session)
     _stop_recording_best_effort(db, session.id, reason=f"session_end:{ended_by}")
     agent_signal.notify_agent(session.agent_uuid)
-    if ws_manager.is_agent_connected(session.agent_uuid):
+    if connection_registry.is_ws_connected(db, session.agent_uuid):
         ws_manager.schedule_send_to_agent(
             session.agent_uuid,
             make_message(
@@ -441,12 +446,13 @@ def cancel_pending_session(db: Session, session_id: int, admin_user_id: int | No
     # Notify agent to tear down any pre-started helper and pending consent flow.
     session.end_signal_pending = True
     _set_agent_remote_state(db, session.agent_uuid, "idle", None, helper_running=False)
+    pending_work_service.mark(db, [session.agent_uuid], pending_work_service.KIND_REMOTE_SUPPORT)
     db.add(session)
     db.commit()
     db.refresh(session)
     _stop_recording_best_effort(db, session.id, reason="pending_cancel")
     agent_signal.notify_agent(session.agent_uuid)
-    if ws_manager.is_agent_connected(session.agent_uuid):
+    if connection_registry.is_ws_connected(db, session.agent_uuid):
         ws_manager.schedule_send_to_agent(
             session.agent_uuid,
             make_message(
@@ -499,6 +505,7 @@ def check_max_durations(db: Session) -> int:
             s.vnc_password = None
             s.end_signal_pending = True
             _set_agent_remote_state(db, s.agent_uuid, "idle", None, helper_running=False)
+            pending_work_service.mark(db, [s.agent_uuid], pending_work_service.KIND_REMOTE_SUPPORT)
             db.add(s)
             _stop_recording_best_effort(db, s.id, reason="session_end:timeout")
             hit += 1
@@ -524,6 +531,7 @@ def end_sessions_for_offline_agents(db: Session, agent_uuids: list[str]) -> int:
         # Keep end signal pending so agent can self-heal stale local state after reconnect.
         s.end_signal_pending = True
         _set_agent_remote_state(db, s.agent_uuid, "idle", None, helper_running=False)
+        pending_work_service.mark(db, [s.agent_uuid], pending_work_service.KIND_REMOTE_SUPPORT)
         db.add(s)
         _stop_recording_best_effort(db, s.id, reason="session_end:agent_offline")
     if sessions:
@@ -4,7 +4,7 @@ from dataclasses import dataclass
 
 from sqlalchemy.orm import Session
 
-from app.models import Setting
+from app.services import settings_snapshot_service
 
 
 REMOTE_SUPPORT_ENABLED_KEY = "remote_support_enabled"
@@ -34,35 +34,19 @@ class RemoteSupportRuntimeConfig:
 
 
 def _setting_map(db: Session, keys: list[str]) -> dict[str, str]:
-    rows = db.query(Setting).filter(Setting.key.in_(keys)).all()
-    out = {row.key: (row.value or "") for row in rows}
-    for key in keys:
-        out.setdefault(key, "")
-    return out
+    return settings_snapshot_service.get_snapshot(db).get_map(keys)
 
 
 def get_str(db: Session, key: str, default: str) -> str:
-    row = db.query(Setting).filter(Setting.key == key).first()
-    if not row or row.value is None:
-        return default
-    return str(row.value)
+    return settings_snapshot_service.get_snapshot(db).get_str(key, default)
 
 
 def get_bool(db: Session, key: str, default: bool = False) -> bool:
-    raw = get_str(db, key, "true" if default else "false").strip().lower()
-    return raw in {"1", "true", "yes", "on"}
+    return settings_snapshot_service.get_snapshot(db).get_bool(key, default)
 
 
 def get_int(db: Session, key: str, default: int, minimum: int | None = None, maximum: int | None = None) -> int:
-    try:
-        value = int(get_str(db, key, str(default)).strip())
-    except Exception:
-        value = default
-    if minimum is not None:
-        value = max(minimum, value)
-    if maximum is not None:
-        value = min(maximum, value)
-    return value
+    return settings_snapshot_service.get_snapshot(db).get_int(key, default, minimum=minimum, maximum=maximum)
 
 
 def get_remote_support_runtime(db: Session) -> RemoteSupportRuntimeConfig:
@@ -17,7 +17,8 @@ from sqlalchemy.orm import Session
 
 from app.config import get_settings
 from app.database import SessionLocal
-from app.models import Agent, RemoteSupportRecording, RemoteSupportSession, Setting
+from app.models import Agent, RemoteSupportRecording, RemoteSupportSession
+from app.services import settings_snapshot_service
 
 settings = get_settings()
 
@@ -59,8 +60,7 @@ def _parse_bool(value: str, default: bool = False) -> bool:
 
 
 def _get_setting(db: Session, key: str, default: str) -> str:
-    item = db.query(Setting).filter(Setting.key == key).first()
-    return item.value if item else default
+    return settings_snapshot_service.get_snapshot(db).get_str(key, default)
 
 
 def _normalize_monitor(monitor_index: int | None) -> int:
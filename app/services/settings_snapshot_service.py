@@ -0,0 +1,141 @@
+"""Process-wide, versioned in-memory snapshot of the ``settings`` table."""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field, replace
+import logging
+import threading
+import time
+from types import MappingProxyType
+from typing import Mapping, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models import Setting
+
+logger = logging.getLogger("appcenter.settings")
+
+# Other workers (and direct DB edits) are picked up by a cheap fingerprint
+# query at most this often; local writes call invalidate() and apply at once.
+REVALIDATE_INTERVAL_SEC = 2.0
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+
+@dataclass(frozen=True)
+class SettingsSnapshot:
+    version: int
+    values: Mapping[str, str] = field(default_factory=lambda: MappingProxyType({}))
+    fingerprint: tuple = ()
+    loaded_at: float = 0.0
+
+    def has(self, key: str) -> bool:
+        return key in self.values
+
+    def get_str(self, key: str, default: str) -> str:
+        value = self.values.get(key)
+        if value is None:
+            return default
+        return value
+
+    def get_bool(self, key: str, default: bool = False) -> bool:
+        raw = self.get_str(key, "true" if default else "false").strip().lower()
+        return raw in _TRUTHY
+
+    def get_int(self, key: str, default: int, minimum: int | None = None, maximum: int | None = None) -> int:
+        try:
+            value = int(self.get_str(key, str(default)).strip())
+        except Exception:
+            value = default
+        if minimum is not None:
+            value = max(minimum, value)
+        if maximum is not None:
+            value = min(maximum, value)
+        return value
+
+    def get_map(self, keys: list[str]) -> dict[str, str]:
+        # Same contract as the old per-module _setting_map helpers: missing keys map to "".
+        return {key: (self.values.get(key) or "") for key in keys}
+
+
+_lock = threading.Lock()
+_snapshot: Optional[SettingsSnapshot] = None
+_checked_at = 0.0
+_force_reload = True
+
+
+def _fingerprint(db: Session) -> tuple:
+    row = db.query(func.count(Setting.key), func.max(Setting.updated_at)).one()
+    count = int(row[0] or 0)
+    latest = row[1].isoformat() if row[1] is not None else ""
+    return (count, latest)
+
+
+def _load(db: Session, fingerprint: tuple, previous: Optional[SettingsSnapshot]) -> SettingsSnapshot:
+    rows = db.query(Setting.key, Setting.value).all()
+    values = {str(key): ("" if value is None else str(value)) for key, value in rows}
+    if previous is None:
+        version = 1
+    elif dict(previous.values) == values:
+        version = previous.version
+    else:
+        version = previous.version + 1
+    return SettingsSnapshot(
+        version=version,
+        values=MappingProxyType(values),
+        fingerprint=fingerprint,
+        loaded_at=time.monotonic(),
+    )
+
+
+def get_snapshot(db: Session) -> SettingsSnapshot:
+    global _snapshot, _checked_at, _force_reload
+    now = time.monotonic()
+    with _lock:
+        current = _snapshot
+        force = _force_reload or current is None
+        due = force or (now - _checked_at) >= REVALIDATE_INTERVAL_SEC
+        if not due:
+            return current  # type: ignore[return-value]
+        # Claim the revalidation so concurrent callers keep serving the current snapshot.
+        _checked_at = now
+        _force_reload = False
+
+    try:
+        fingerprint = _fingerprint(db)
+        if not force and current is not None and current.fingerprint == fingerprint:
+            return current
+        fresh = _load(db, fingerprint, current)
+    except Exception:
+        with _lock:
+            _force_reload = _force_reload or force
+        if current is None:
+            raise
+        logger.exception("settings snapshot refresh failed; serving version=%s", current.version)
+        return current
+
+    with _lock:
+        latest = _snapshot
+        if latest is not None and latest is not current:
+            # Another thread swapped in a snapshot meanwhile; keep version numbers monotonic.
+            if latest.fingerprint == fresh.fingerprint:
+                fresh = latest
+            else:
+                fresh = replace(fresh, version=latest.version + 1)
+        _snapshot = fresh
+    if current is None or current.version != fresh.version:
+        logger.info("settings snapshot loaded version=%s keys=%s", fresh.version, len(fresh.values))
+    return fresh
+
+
+def current_version() -> int:
+    with _lock:
+        return _snapshot.version if _snapshot is not None else 0
+
+
+def invalidate() -> None:
+    """Force the next get_snapshot() call to reload (call after committing settings writes)."""
+    global _force_reload
+    with _lock:
+        _force_reload = True
@@ -0,0 +1,284 @@
+"""Incrementally maintained software catalog aggregates (software_catalog / software_catalog_variants)."""
+
+from __future__ import annotations
+
+from collections import Counter
+import logging
+import threading
+import time
+from typing import Iterable, Optional
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.models import Agent, AgentSoftwareInventory, SoftwareCatalogEntry
+
+logger = logging.getLogger("appcenter.catalog")
+
+# Increments take this advisory lock shared, rebuild takes it exclusive, so a
+# rebuild never interleaves with an in-flight inventory transaction.
+CATALOG_LOCK_KEY = 0x53574341  # "SWCA"
+MAX_ROWS_PER_STATEMENT = 1000
+
+# (catalog name, software_name, software_version, publisher) of one inventory row.
+CatalogRow = tuple[str, str, Optional[str], Optional[str]]
+
+_lock = threading.Lock()
+_stats = {"increments": 0, "rows_touched": 0, "rebuilds": 0, "last_rebuild_ms": 0.0}
+
+
+def platform_bucket(platform: Optional[str]) -> str:
+    # Same bucketing as the report queries (lower(agents.platform)).
+    return (platform or "").lower()
+
+
+def catalog_name(normalized_name: Optional[str], software_name: str) -> str:
+    return normalized_name if normalized_name is not None else software_name
+
+
+def agent_rows(db: Session, agent_uuid: str, names: Optional[set[str]] = None) -> list[CatalogRow]:
+    """Catalog view of an agent's stored rows, optionally only for the given catalog names."""
+    key = func.coalesce(AgentSoftwareInventory.normalized_name, AgentSoftwareInventory.software_name)
+    query = db.query(
+        key,
+        AgentSoftwareInventory.software_name,
+        AgentSoftwareInventory.software_version,
+        AgentSoftwareInventory.publisher,
+    ).filter(AgentSoftwareInventory.agent_uuid == agent_uuid)
+    if names is None:
+        return [tuple(row) for row in query.all()]
+    ordered = sorted(names)
+    out: list[CatalogRow] = []
+    for offset in range(0, len(ordered), MAX_ROWS_PER_STATEMENT):
+        chunk = ordered[offset : offset + MAX_ROWS_PER_STATEMENT]
+        out.extend(tuple(row) for row in query.filter(key.in_(chunk)).all())
+    return out
+
+
+def _lock_agent(db: Session, agent_uuid: str) -> tuple[bool, Optional[str]]:
+    """Lock the agent row like submit_inventory does; returns (exists, current platform)."""
+    row = db.query(Agent.platform).filter(Agent.uuid == agent_uuid).with_for_update().first()
+    return (row is not None, row[0] if row is not None else None)
+
+
+def _upsert_entries(db: Session, deltas: list[tuple[str, tuple[int, ...]]]) -> None:
+    values_sql: list[str] = []
+    params: dict = {}
+    for idx, (name, (agents, win_agents, lin_agents, rows, win_rows, lin_rows)) in enumerate(deltas):
+        values_sql.append(
+            f"(CAST(:n{idx} AS VARCHAR), :a{idx}, :wa{idx}, :la{idx}, :r{idx}, :wr{idx}, :lr{idx}, now())"
+        )
+        params.update({
+            f"n{idx}": name,
+            f"a{idx}": agents,
+            f"wa{idx}": win_agents,
+            f"la{idx}": lin_agents,
+            f"r{idx}": rows,
+            f"wr{idx}": win_rows,
+            f"lr{idx}": lin_rows,
+        })
+    db.execute(
+        text(
+            "INSERT INTO software_catalog AS c "
+            "(name, total_agents, windows_agents, linux_agents, install_rows, windows_rows, linux_rows, updated_at) "
+            f"VALUES {', '.join(values_sql)} "
+            "ON CONFLICT (name) DO UPDATE SET "
+            "total_agents = c.total_agents + EXCLUDED.total_agents, "
+            "windows_agents = c.windows_agents + EXCLUDED.windows_agents, "
+            "linux_agents = c.linux_agents + EXCLUDED.linux_agents, "
+            "install_rows = c.install_rows + EXCLUDED.install_rows, "
+            "windows_rows = c.windows_rows + EXCLUDED.windows_rows, "
+            "linux_rows = c.linux_rows + EXCLUDED.linux_rows, "
+            "updated_at = EXCLUDED.updated_at"
+        ),
+        params,
+    )
+
+
+def _upsert_variants(db: Session, platform: str, deltas: list[tuple[tuple[str, str, str, str], int]]) -> None:
+    values_sql: list[str] = []
+    params: dict = {"p": platform}
+    shrunk: list[str] = []
+    for idx, ((name, software_name, version, publisher), count) in enumerate(deltas):
+        values_sql.append(
+            f"(CAST(:n{idx} AS VARCHAR), CAST(:p AS VARCHAR), CAST(:s{idx} AS VARCHAR), "
+            f"CAST(:v{idx} AS VARCHAR), CAST(:b{idx} AS VARCHAR), :c{idx})"
+        )
+        params.update({
+            f"n{idx}": name,
+            f"s{idx}": software_name,
+            f"v{idx}": version,
+            f"b{idx}": publisher,
+            f"c{idx}": count,
+        })
+        if count < 0:
+            shrunk.append(values_sql[-1])
+    db.execute(
+        text(
+            "INSERT INTO software_catalog_variants AS v "
+            "(name, platform, software_name, software_version, publisher, install_rows) "
+            f"VALUES {', '.join(values_sql)} "
+            "ON CONFLICT (name, platform, software_name, software_version, publisher) "
+            "DO UPDATE SET install_rows = v.install_rows + EXCLUDED.install_rows"
+        ),
+        params,
+    )
+    if shrunk:
+        db.execute(
+            text(
+                "DELETE FROM software_catalog_variants AS v "
+                f"USING (VALUES {', '.join(shrunk)}) AS d(name, platform, software_name, software_version, publisher, c) "
+                "WHERE v.name = d.name AND v.platform = d.platform AND v.software_name = d.software_name "
+                "AND v.software_version = d.software_version AND v.publisher = d.publisher AND v.install_rows <= 0"
+            ),
+            params,
+        )
+
+
+def apply_change(
+    db: Session,
+    platform: Optional[str],
+    before: Iterable[CatalogRow],
+    after: Iterable[CatalogRow],
+) -> int:
+    """Fold one agent's row change into the catalog (caller commits); returns catalog rows touched.
+
+    ``before`` / ``after`` must cover every stored row of the agent for each
+    catalog name they mention, so per-name agent counts stay exact.
+    """
+    bucket = platform_bucket(platform)
+    variant_delta: Counter = Counter()
+    rows_before: Counter = Counter()
+    rows_after: Counter = Counter()
+    for name, software_name, version, publisher in before:
+        variant_delta[(name, software_name, version or "", publisher or "")] -= 1
+        rows_before[name] += 1
+    for name, software_name, version, publisher in after:
+        variant_delta[(name, software_name, version or "", publisher or "")] += 1
+        rows_after[name] += 1
+
+    entry_deltas: list[tuple[str, tuple[int, ...]]] = []
+    for name in sorted(set(rows_before) | set(rows_after)):
+        rows = rows_after[name] - rows_before[name]
+        agents = int(name in rows_after) - int(name in rows_before)
+        if not rows and not agents:
+            continue
+        entry_deltas.append((
+            name,
+            (
+                agents,
+                agents if bucket == "windows" else 0,
+                agents if bucket == "linux" else 0,
+                rows,
+                rows if bucket == "windows" else 0,
+                rows if bucket == "linux" else 0,
+            ),
+        ))
+    variant_deltas = sorted((key, count) for key, count in variant_delta.items() if count)
+    if not entry_deltas and not variant_deltas:
+        return 0
+
+    db.execute(text("SELECT pg_advisory_xact_lock_shared(:k)"), {"k": CATALOG_LOCK_KEY})
+    for offset in range(0, len(entry_deltas), MAX_ROWS_PER_STATEMENT):
+        _upsert_entries(db, entry_deltas[offset : offset + MAX_ROWS_PER_STATEMENT])
+    shrunk_names = [name for name, delta in entry_deltas if delta[3] < 0]
+    for offset in range(0, len(shrunk_names), MAX_ROWS_PER_STATEMENT):
+        db.query(SoftwareCatalogEntry).filter(
+            SoftwareCatalogEntry.name.in_(shrunk_names[offset : offset + MAX_ROWS_PER_STATEMENT]),
+            SoftwareCatalogEntry.install_rows <= 0,
+        ).delete(synchronize_session=False)
+    for offset in range(0, len(variant_deltas), MAX_ROWS_PER_STATEMENT):
+        _upsert_variants(db, bucket, variant_deltas[offset : offset + MAX_ROWS_PER_STATEMENT])
+
+    touched = len(entry_deltas) + len(variant_deltas)
+    with _lock:
+        _stats["increments"] += 1
+        _stats["rows_touched"] += touched
+    return touched
+
+
+def remove_agent(db: Session, agent_uuid: str) -> None:
+    """Call before deleting an agent's inventory rows (caller commits).
+
+    The agent row stays locked until the caller's commit, so no inventory
+    submit can land between reading the rows and applying the decrement.
+    """
+    exists, platform = _lock_agent(db, agent_uuid)
+    if exists:
+        apply_change(db, platform, agent_rows(db, agent_uuid), [])
+
+
+def move_agent(db: Session, agent_uuid: str, old_platform: Optional[str], new_platform: Optional[str]) -> None:
+    """Re-bucket an agent's rows before a platform change is stored (caller commits).
+
+    ``old_platform`` only short-circuits the common no-change case; the
+    bucket actually moved from is re-read under the agent row lock.
+    """
+    if platform_bucket(old_platform) == platform_bucket(new_platform):
+        return
+    exists, old_platform = _lock_agent(db, agent_uuid)
+    if not exists or platform_bucket(old_platform) == platform_bucket(new_platform):
+        return
+    rows = agent_rows(db, agent_uuid)
+    if rows:
+        apply_change(db, old_platform, rows, [])
+        apply_change(db, new_platform, [], rows)
+
+
+def rebuild(db: Session) -> dict:
+    """Recompute both tables from agent_software_inventory in one transaction."""
+    started = time.perf_counter()
+    db.execute(text("SELECT pg_advisory_xact_lock(:k)"), {"k": CATALOG_LOCK_KEY})
+    db.execute(text("DELETE FROM software_catalog_variants"))
+    db.execute(text("DELETE FROM software_catalog"))
+    variants = db.execute(
+        text(
+            "INSERT INTO software_catalog_variants "
+            "(name, platform, software_name, software_version, publisher, install_rows) "
+            "SELECT COALESCE(i.normalized_name, i.software_name), lower(COALESCE(a.platform, '')), i.software_name, "
+            "COALESCE(i.software_version, ''), COALESCE(i.publisher, ''), count(*) "
+            "FROM agent_software_inventory i JOIN agents a ON a.uuid = i.agent_uuid "
+            "GROUP BY 1, 2, 3, 4, 5"
+        )
+    ).rowcount
+    entries = db.execute(
+        text(
+            "INSERT INTO software_catalog "
+            "(name, total_agents, windows_agents, linux_agents, install_rows, windows_rows, linux_rows, updated_at) "
+            "SELECT s.name, count(DISTINCT s.agent_uuid), "
+            "count(DISTINCT s.agent_uuid) FILTER (WHERE s.platform = 'windows'), "
+            "count(DISTINCT s.agent_uuid) FILTER (WHERE s.platform = 'linux'), "
+            "count(*), count(*) FILTER (WHERE s.platform = 'windows'), count(*) FILTER (WHERE s.platform = 'linux'), now() "
+            "FROM (SELECT COALESCE(i.normalized_name, i.software_name) AS name, i.agent_uuid, "
+            "lower(COALESCE(a.platform, '')) AS platform "
+            "FROM agent_software_inventory i JOIN agents a ON a.uuid = i.agent_uuid) AS s "
+            "GROUP BY s.name"
+        )
+    ).rowcount
+    db.commit()
+    elapsed_ms = round((time.perf_counter() - started) * 1000.0, 1)
+    with _lock:
+        _stats["rebuilds"] += 1
+        _stats["last_rebuild_ms"] = elapsed_ms
+    logger.info("software catalog rebuilt names=%s variants=%s ms=%.1f", entries, variants, elapsed_ms)
+    return {"names": int(entries or 0), "variants": int(variants or 0), "duration_ms": elapsed_ms}
+
+
+def ensure_built(db: Session) -> bool:
+    """Build the catalog once for existing installs (empty catalog, non-empty inventory)."""
+    if db.query(SoftwareCatalogEntry.name).first() is not None:
+        return False
+    if db.query(AgentSoftwareInventory.id).first() is None:
+        return False
+    rebuild(db)
+    return True
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def clear_all() -> None:
+    with _lock:
+        _stats.update(increments=0, rows_touched=0, rebuilds=0, last_rebuild_ms=0.0)
@@ -0,0 +1,139 @@
+"""Agent WS reconnect-storm protection: resume tokens and an accept token bucket."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Optional
+
+from jose import JWTError, jwt
+
+from app.config import get_settings
+
+settings = get_settings()
+
+RESUME_TOKEN_KIND = "agent_ws_resume"
+DEFAULT_RESUME_TTL_SEC = 86400
+DEFAULT_RATE_PER_SEC = 50.0
+DEFAULT_BURST = 200
+# Suggested client backoff when the bucket is empty.
+RETRY_AFTER_SEC = 5
+
+_lock = threading.Lock()
+_rate = DEFAULT_RATE_PER_SEC
+_burst = float(DEFAULT_BURST)
+_tokens = float(DEFAULT_BURST)
+_refilled_at = time.monotonic()
+_stats = {
+    "admitted": 0,
+    "rejected_busy": 0,
+    "resume_issued": 0,
+    "resume_accepted": 0,
+    "resume_invalid": 0,
+    "resume_stale": 0,
+}
+
+
+def _inc(key: str) -> None:
+    with _lock:
+        _stats[key] += 1
+
+
+def configure(rate_per_sec: float, burst: int) -> None:
+    """Apply runtime settings; a rate of 0 disables admission control."""
+    global _rate, _burst, _tokens
+    with _lock:
+        _rate = max(0.0, float(rate_per_sec))
+        new_burst = float(max(1, int(burst)))
+        if new_burst != _burst:
+            _tokens = min(_tokens, new_burst)
+            _burst = new_burst
+
+
+def try_admit() -> bool:
+    """Take one token for a connection that needs the database (full auth or full hello)."""
+    global _tokens, _refilled_at
+    now = time.monotonic()
+    with _lock:
+        if _rate <= 0:
+            _stats["admitted"] += 1
+            return True
+        _tokens = min(_burst, _tokens + (now - _refilled_at) * _rate)
+        _refilled_at = now
+        if _tokens >= 1.0:
+            _tokens -= 1.0
+            _stats["admitted"] += 1
+            return True
+        _stats["rejected_busy"] += 1
+        return False
+
+
+def _digest(value: Any) -> str:
+    text = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:16]
+
+
+def config_hash(config: dict) -> str:
+    return _digest(config)
+
+
+def hello_hash(hello_payload: Optional[dict]) -> str:
+    return _digest(hello_payload or {})
+
+
+def issue_resume_token(
+    agent_uuid: str, platform: str, config: dict, hello_payload: Optional[dict], ttl_sec: int = DEFAULT_RESUME_TTL_SEC
+) -> str:
+    """Token for the next reconnect: what the agent was told (config) and what it last reported (hello)."""
+    payload = {
+        "kind": RESUME_TOKEN_KIND,
+        "sub": agent_uuid,
+        "pf": platform,
+        "cfg": config_hash(config),
+        "hh": hello_hash(hello_payload),
+        "exp": datetime.now(timezone.utc) + timedelta(seconds=max(60, int(ttl_sec))),
+    }
+    _inc("resume_issued")
+    return jwt.encode(payload, settings.secret_key, algorithm=settings.jwt_algorithm)
+
+
+def read_resume_token(token: Any, agent_uuid: str) -> Optional[dict]:
+    """Claims of a valid token issued to ``agent_uuid``; None otherwise (the agent gets a full hello)."""
+    if not token or not isinstance(token, str):
+        return None
+    try:
+        claims = jwt.decode(token, settings.secret_key, algorithms=[settings.jwt_algorithm])
+    except JWTError:
+        _inc("resume_invalid")
+        return None
+    if claims.get("kind") != RESUME_TOKEN_KIND or claims.get("sub") != agent_uuid:
+        _inc("resume_invalid")
+        return None
+    return claims
+
+
+def note_resume(accepted: bool) -> None:
+    _inc("resume_accepted" if accepted else "resume_stale")
+
+
+def stats() -> dict:
+    with _lock:
+        out = dict(_stats)
+        out["rate_per_sec"] = _rate
+        out["burst"] = int(_burst)
+        out["tokens"] = round(_tokens, 1)
+    return out
+
+
+def clear_all() -> None:
+    global _rate, _burst, _tokens, _refilled_at
+    with _lock:
+        _rate = DEFAULT_RATE_PER_SEC
+        _burst = float(DEFAULT_BURST)
+        _tokens = float(DEFAULT_BURST)
+        _refilled_at = time.monotonic()
+        for key in _stats:
+            _stats[key] = 0
@@ -0,0 +1,148 @@
+"""Agent WebSocket frame codecs (JSON text, MessagePack binary) and traffic counters."""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from typing import Any, Union
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency path
+    msgpack = None
+
+CODEC_JSON = "json"
+CODEC_MSGPACK = "msgpack"
+
+Frame = Union[str, bytes]
+
+_lock = threading.Lock()
+_stats: dict[str, dict[str, float]] = {}
+
+
+def available() -> list[str]:
+    """Codecs this server can speak, most compact first."""
+    return [CODEC_MSGPACK, CODEC_JSON] if msgpack is not None else [CODEC_JSON]
+
+
+def negotiate(offered: Any) -> str:
+    """Pick the first agent-offered codec we support; old agents offer nothing and get JSON."""
+    if not isinstance(offered, list):
+        return CODEC_JSON
+    supported = available()
+    for name in offered:
+        if name in supported:
+            return name
+    return CODEC_JSON
+
+
+def exceeds(frame: Frame, limit: int) -> bool:
+    """Size guard without re-encoding text frames unless they could be near the limit."""
+    if isinstance(frame, bytes):
+        return len(frame) > limit
+    size = len(frame)
+    if size > limit:
+        return True
+    if size * 4 <= limit:  # UTF-8 uses at most 4 bytes per code point
+        return False
+    return len(frame.encode("utf-8")) > limit
+
+
+def _bucket(codec: str) -> dict[str, float]:
+    bucket = _stats.get(codec)
+    if bucket is None:
+        bucket = _stats[codec] = {
+            "frames_in": 0,
+            "frames_out": 0,
+            "bytes_in": 0,
+            "bytes_out": 0,
+            "codec_seconds": 0.0,
+            "connection_seconds": 0.0,
+            "connections": 0,
+            "deflate_connections": 0,
+        }
+    return bucket
+
+
+def encode(codec: str, message: dict, record: bool = True) -> Frame:
+    """Serialize ``message``; pass record=False when the frame is fanned out (count via note_sent)."""
+    started = time.perf_counter()
+    if codec == CODEC_MSGPACK and msgpack is not None:
+        frame: Frame = msgpack.packb(message, use_bin_type=True)
+    else:
+        frame = json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+    elapsed = time.perf_counter() - started
+    with _lock:
+        bucket = _bucket(codec)
+        bucket["codec_seconds"] += elapsed
+        if record:
+            bucket["frames_out"] += 1
+            # Text frames count code points; close enough for ASCII-heavy envelopes.
+            bucket["bytes_out"] += len(frame)
+    return frame
+
+
+def note_sent(codec: str, frame: Frame) -> None:
+    with _lock:
+        bucket = _bucket(codec)
+        bucket["frames_out"] += 1
+        bucket["bytes_out"] += len(frame)
+
+
+def decode(codec: str, frame: Frame) -> Any:
+    """Decode one inbound frame; text frames are JSON even on a MessagePack connection."""
+    started = time.perf_counter()
+    if isinstance(frame, bytes):
+        if msgpack is None:
+            raise ValueError("binary frames need msgpack")
+        data = msgpack.unpackb(frame, raw=False)
+    else:
+        data = json.loads(frame)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        bucket = _bucket(codec)
+        bucket["frames_in"] += 1
+        bucket["bytes_in"] += len(frame)
+        bucket["codec_seconds"] += elapsed
+    return data
+
+
+def note_connection(codec: str, deflate: bool) -> None:
+    with _lock:
+        bucket = _bucket(codec)
+        bucket["connections"] += 1
+        if deflate:
+            bucket["deflate_connections"] += 1
+
+
+def note_connection_closed(codec: str, seconds: float) -> None:
+    with _lock:
+        _bucket(codec)["connection_seconds"] += max(0.0, seconds)
+
+
+def stats(live_seconds: dict[str, float] | None = None) -> dict:
+    """Per-codec traffic with bytes per agent-hour and codec CPU per message.
+
+    Bytes are application payload sizes (before permessage-deflate).
+    """
+    live_seconds = live_seconds or {}
+    with _lock:
+        snapshot = {codec: dict(bucket) for codec, bucket in _stats.items()}
+    out: dict[str, dict] = {}
+    for codec, bucket in snapshot.items():
+        agent_hours = (bucket["connection_seconds"] + live_seconds.get(codec, 0.0)) / 3600.0
+        frames = bucket["frames_in"] + bucket["frames_out"]
+        bucket["codec_seconds"] = round(bucket["codec_seconds"], 6)
+        bucket["connection_seconds"] = round(bucket["connection_seconds"], 1)
+        bucket["bytes_per_agent_hour"] = (
+            int((bucket["bytes_in"] + bucket["bytes_out"]) / agent_hours) if agent_hours > 0 else 0
+        )
+        bucket["codec_us_per_message"] = round(bucket["codec_seconds"] / frames * 1e6, 2) if frames else 0.0
+        out[codec] = bucket
+    return {"available": available(), "codecs": out}
+
+
+def clear_all() -> None:
+    with _lock:
+        _stats.clear()
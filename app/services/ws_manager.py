@@ -3,15 +3,21 @@
 from __future__ import annotations
 
 import asyncio
+import itertools
+import json
 import logging
+import math
 import os
+import re
 import time
-from datetime import datetime, timezone
+from collections import deque
 from typing import Optional
 
 from fastapi import WebSocket
 from starlette.websockets import WebSocketDisconnect
 
+from app.services import connection_registry, event_bus, ws_codec
+
 try:
     from websockets.exceptions import ConnectionClosed
 except Exception:  # pragma: no cover - optional dependency path
@@ -19,14 +25,77 @@ except Exception:  # pragma: no cover - optional dependency path
 
 logger = logging.getLogger("appcenter.ws")
 
+# Per-UI-connection outbound buffer; a client that falls this far behind (or
+# stalls a single send past the timeout) is disconnected so the rest keep flowing.
+UI_SEND_QUEUE_MAX = 256
+UI_SEND_TIMEOUT_SEC = 5.0
+UI_CLOSE_TIMEOUT_SEC = 1.0
+# Opted-in UI clients get agent status deltas coalesced into one frame per window.
+DEFAULT_STATUS_BATCH_INTERVAL_SEC = 0.5
+# Agent keepalive: one wheel task pings every agent once per interval, spread
+# over interval/tick slots, and drops agents whose pong is overdue.
+PING_TICK_SEC = 1.0
+DEFAULT_PING_INTERVAL_SEC = 30.0
+DEFAULT_PING_TIMEOUT_SEC = 15.0
+# UI topic subscriptions: a client that never subscribes receives every broadcast.
+# Per-agent outbound queue drained by one writer task; pushes beyond the limit are dropped.
+AGENT_SEND_QUEUE_MAX = 64
+AGENT_SEND_TIMEOUT_SEC = 10.0
+# "Look again" messages: a copy still waiting in the queue makes a new one redundant.
+_COALESCED_TYPES = frozenset({"server.signal", "server.ping"})
+# Patches merge into the queued one (later values win).
+_MERGED_TYPE = "server.config.patch"
+UI_MAX_TOPICS = 500
+TOPIC_FLEET_SUMMARY = "fleet-summary"
+_TOPIC_RE = re.compile(r"^(?:agent:[A-Za-z0-9_.-]{1,64}|deployment:\d{1,12}|announcement:\d{1,12}|fleet-summary)$")
+
+
+def is_valid_topic(topic: str) -> bool:
+    return isinstance(topic, str) and bool(_TOPIC_RE.match(topic))
+
+
+_MSG_ID_PREFIX = os.urandom(3).hex()
+_msg_counter = itertools.count(1)
+_ts_cache: tuple[int, str] = (0, "")
+
 
 def _msg_id() -> str:
-    """Generate a unique message id like msg_a1b2c3d4."""
-    return f"msg_{os.urandom(4).hex()}"
+    """Process-unique message id like msg_a1b2c31f (random prefix + counter)."""
+    return f"msg_{_MSG_ID_PREFIX}{next(_msg_counter):x}"
 
 
 def _now_iso() -> str:
-    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    # Envelope timestamps have second resolution; format once per second.
+    global _ts_cache
+    sec = int(time.time())
+    cached = _ts_cache
+    if cached[0] != sec:
+        cached = (sec, time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(sec)))
+        _ts_cache = cached
+    return cached[1]
+
+
+def encode_message(message: dict) -> str:
+    """Serialize once for fan-out (same format as Starlette's send_json)."""
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def _coalesce_key(message: dict) -> str | None:
+    msg_type = message.get("type")
+    if msg_type == _MERGED_TYPE:
+        return msg_type
+    if msg_type in _COALESCED_TYPES:
+        payload = message.get("payload") or {}
+        return "%s:%s" % (msg_type, payload.get("reason") or "")
+    return None
+
+
+def _merge_patch(queued: dict, message: dict) -> dict:
+    changes = dict((queued.get("payload") or {}).get("changes") or {})
+    changes.update((message.get("payload") or {}).get("changes") or {})
+    merged = dict(message)
+    merged["payload"] = {**(message.get("payload") or {}), "changes": changes}
+    return merged
 
 
 def make_message(msg_type: str, payload: dict | None = None, ack: bool = False) -> dict:
@@ -40,28 +109,62 @@ def make_message(msg_type: str, payload: dict | None = None, ack: bool = False)
     }
 
 
+async def send_agent_frame(ws: WebSocket, frame: ws_codec.Frame) -> None:
+    if isinstance(frame, bytes):
+        await ws.send_bytes(frame)
+    else:
+        await ws.send_text(frame)
+
+
 class AgentConnection:
     """Represents a connected agent's WS session."""
 
-    __slots__ = ("ws", "agent_uuid", "connected_at", "last_pong")
-
-    def __init__(self, ws: WebSocket, agent_uuid: str):
+    __slots__ = (
+        "ws",
+        "agent_uuid",
+        "connected_at",
+        "last_pong",
+        "ping_sent_at",
+        "codec",
+        "outbox",
+        "queued_keys",
+        "wake",
+        "writer",
+        "closing",
+    )
+
+    def __init__(self, ws: WebSocket, agent_uuid: str, codec: str = ws_codec.CODEC_JSON):
         self.ws = ws
         self.agent_uuid = agent_uuid
+        self.codec = codec
         self.connected_at = time.monotonic()
         self.last_pong = time.monotonic()
+        # Oldest unanswered ping (0 = none outstanding).
+        self.ping_sent_at = 0.0
+        # Entries are [coalesce_key, message dict or pre-encoded frame].
+        self.outbox: deque[list] = deque()
+        self.queued_keys: dict[str, list] = {}
+        self.wake = asyncio.Event()
+        self.writer: asyncio.Task | None = None
+        self.closing = False
 
 
 class UIConnection:
     """Represents a connected UI user's WS session."""
 
-    __slots__ = ("ws", "user_id", "role", "connected_at")
+    __slots__ = ("ws", "user_id", "role", "connected_at", "queue", "writer", "closing", "status_batch", "topics")
 
-    def __init__(self, ws: WebSocket, user_id: int, role: str):
+    def __init__(self, ws: WebSocket, user_id: int, role: str, status_batch: bool = False):
         self.ws = ws
         self.user_id = user_id
         self.role = role
         self.connected_at = time.monotonic()
+        self.status_batch = status_batch
+        self.queue: asyncio.Queue[str] = asyncio.Queue(maxsize=UI_SEND_QUEUE_MAX)
+        self.writer: asyncio.Task | None = None
+        self.closing = False
+        # None until the first ui.subscribe: legacy clients get the full firehose.
+        self.topics: set[str] | None = None
 
 
 class WSManager:
@@ -70,31 +173,147 @@ class WSManager:
         self._ui_clients: dict[int, list[UIConnection]] = {}  # user_id -> conns
         self._lock = asyncio.Lock()
         self._loop: asyncio.AbstractEventLoop | None = None
+        self._bg_tasks: set[asyncio.Task] = set()
+        # Ping wheel: slot -> agent uuids; mutated on the loop thread only.
+        self._ping_interval = DEFAULT_PING_INTERVAL_SEC
+        self._ping_timeout = DEFAULT_PING_TIMEOUT_SEC
+        self._ping_slots: list[set[str]] = [set() for _ in range(self._slot_count(self._ping_interval))]
+        self._ping_slot_of: dict[str, int] = {}
+        self._ping_cursor = 0
+        self._ping_task: asyncio.Task | None = None
+        self._ping_stats = {"pings": 0, "ping_failures": 0, "pong_timeouts": 0}
+        self._agent_stats = {
+            "queued": 0,
+            "sent": 0,
+            "coalesced": 0,
+            "dropped": 0,
+            "send_timeouts": 0,
+            "send_failures": 0,
+        }
+        # Routing indexes, mutated on the loop thread only.
+        self._ui_firehose: set[UIConnection] = set()
+        self._topic_index: dict[str, set[UIConnection]] = {}
+        # Latest server.agent.status payload per agent within the current batch window.
+        self._status_pending: dict[str, dict] = {}
+        self._status_flush_handle: asyncio.TimerHandle | None = None
+        self._status_batch_interval = DEFAULT_STATUS_BATCH_INTERVAL_SEC
+        # Mutated on the loop thread only; read lock-free by the stats endpoint.
+        self._ui_stats = {
+            "broadcasts": 0,
+            "sent": 0,
+            "dropped_messages": 0,
+            "slow_consumer_disconnects": 0,
+            "send_timeouts": 0,
+            "send_failures": 0,
+            "status_events": 0,
+            "status_batches": 0,
+            "status_coalesced": 0,
+            "topic_broadcasts": 0,
+        }
 
     def set_loop(self, loop: asyncio.AbstractEventLoop) -> None:
         """Store the main event loop reference for sync-context push."""
         self._loop = loop
 
-    def schedule_broadcast_to_ui(self, message: dict) -> None:
+    def schedule_broadcast_to_ui(self, message: dict, topics: tuple[str, ...] = ()) -> None:
         """Schedule a UI broadcast from a sync context (e.g. heartbeat endpoint)."""
         loop = self._loop
         if loop is None or loop.is_closed():
             return
-        asyncio.run_coroutine_threadsafe(self.broadcast_to_ui(message), loop)
+        distributed = event_bus.is_distributed()
+        if not self._ui_clients and not distributed:
+            return
+        # Serialize in the calling thread; the loop only enqueues.
+        text = encode_message(message)
+        if distributed:
+            event_bus.publish("ui", {"text": text, "topics": list(topics)})
+        if not self._ui_clients:
+            return
+        try:
+            loop.call_soon_threadsafe(self._broadcast_text, text, topics)
+        except RuntimeError:
+            pass
 
-    def schedule_send_to_agent(self, agent_uuid: str, message: dict) -> None:
-        """Schedule an agent push from a sync context."""
+    def schedule_agent_status(self, payload: dict) -> None:
+        """publish_agent_status from a sync context."""
         loop = self._loop
         if loop is None or loop.is_closed():
             return
-        asyncio.run_coroutine_threadsafe(self.send_to_agent(agent_uuid, message), loop)
+        event_bus.publish("agent_status", payload)
+        if not self._ui_clients:
+            return
+        try:
+            loop.call_soon_threadsafe(self._publish_agent_status_local, payload)
+        except RuntimeError:
+            pass
+
+    def schedule_send_to_agent(self, agent_uuid: str, message: dict) -> bool:
+        """Schedule an agent push from a sync context.
+
+        Agents connected to another worker are reached through the event bus,
+        addressed to the owning worker only. Returns False when the push could
+        not be handed off (no loop, or the event bus dropped it).
+        """
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return False
+        if agent_uuid not in self._agents:
+            return event_bus.publish_to_agent_owner(
+                "agent_push", {"agent_uuid": agent_uuid, "message": message}, agent_uuid
+            )
+        try:
+            loop.call_soon_threadsafe(self._push_local, agent_uuid, message)
+        except RuntimeError:
+            return False
+        return True
+
+    def schedule_send_to_all_agents(self, message: dict) -> None:
+        """Push ``message`` to every WS agent on every worker."""
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        event_bus.publish("agent_push_all", {"message": message})
+        if not self._agents:
+            return
+        try:
+            loop.call_soon_threadsafe(self._push_all_local, message)
+        except RuntimeError:
+            pass
+
+    # --- Event bus (messages published by other workers; run on the loop thread) ---
+    def _on_bus_agent_push(self, data: dict) -> None:
+        agent_uuid = str(data.get("agent_uuid") or "")
+        message = data.get("message")
+        if isinstance(message, dict):
+            self._push_local(agent_uuid, message)
+
+    def _on_bus_agent_push_all(self, data: dict) -> None:
+        message = data.get("message")
+        if isinstance(message, dict):
+            self._push_all_local(message)
+
+    def _on_bus_ui(self, data: dict) -> None:
+        text = data.get("text")
+        if isinstance(text, str) and self._ui_clients:
+            self._broadcast_text(text, tuple(data.get("topics") or ()))
+
+    def _on_bus_agent_status(self, data: dict) -> None:
+        if self._ui_clients:
+            self._publish_agent_status_local(data)
+
+    def _spawn(self, coro) -> None:
+        task = asyncio.create_task(coro)
+        self._bg_tasks.add(task)
+        task.add_done_callback(self._bg_tasks.discard)
 
     # --- Agent ---
-    async def register_agent(self, ws: WebSocket, agent_uuid: str) -> None:
+    async def register_agent(self, ws: WebSocket, agent_uuid: str, codec: str = ws_codec.CODEC_JSON) -> None:
         old_conn: AgentConnection | None = None
         async with self._lock:
             old_conn = self._agents.get(agent_uuid)
-            self._agents[agent_uuid] = AgentConnection(ws=ws, agent_uuid=agent_uuid)
+            self._agents[agent_uuid] = AgentConnection(ws=ws, agent_uuid=agent_uuid, codec=codec)
+            connection_registry.note_connected(agent_uuid, connection_registry.KIND_WS)
+            self._ping_add(agent_uuid)
             logger.info(
                 "ws agent registered uuid=%s agents=%s",
                 agent_uuid,
@@ -102,6 +321,7 @@ class WSManager:
             )
 
         if old_conn and old_conn.ws is not ws:
+            self._stop_agent_writer(old_conn)
             try:
                 await old_conn.ws.close(code=1001, reason="replaced")
             except Exception:
@@ -114,6 +334,10 @@ class WSManager:
             conn = self._agents.get(agent_uuid)
             if conn is not None and (ws is None or conn.ws is ws):
                 del self._agents[agent_uuid]
+                connection_registry.note_disconnected(agent_uuid, connection_registry.KIND_WS)
+                self._ping_remove(agent_uuid)
+                ws_codec.note_connection_closed(conn.codec, time.monotonic() - conn.connected_at)
+                self._stop_agent_writer(conn)
                 removed = True
                 count = len(self._agents)
             else:
@@ -121,6 +345,118 @@ class WSManager:
         if removed:
             logger.info("ws agent unregistered uuid=%s agents=%s", agent_uuid, count)
 
+    # --- Agent keepalive (ping wheel) ---
+    @staticmethod
+    def _slot_count(interval_sec: float) -> int:
+        return max(1, int(round(interval_sec / PING_TICK_SEC)))
+
+    def configure_ping(self, interval_sec: float, timeout_sec: float) -> None:
+        interval_sec = max(PING_TICK_SEC, float(interval_sec))
+        self._ping_timeout = max(PING_TICK_SEC, float(timeout_sec))
+        if interval_sec == self._ping_interval:
+            return
+        self._ping_interval = interval_sec
+        self._ping_slots = [set() for _ in range(self._slot_count(interval_sec))]
+        self._ping_slot_of.clear()
+        self._ping_cursor = 0
+        for agent_uuid in list(self._agents.keys()):
+            self._ping_add(agent_uuid)
+
+    def _ping_add(self, agent_uuid: str) -> None:
+        if agent_uuid not in self._ping_slot_of:
+            # Least-loaded slot keeps the per-tick ping count flat.
+            slot = min(range(len(self._ping_slots)), key=lambda idx: len(self._ping_slots[idx]))
+            self._ping_slots[slot].add(agent_uuid)
+            self._ping_slot_of[agent_uuid] = slot
+        if self._ping_task is None or self._ping_task.done():
+            self._ping_task = asyncio.create_task(self._ping_wheel())
+
+    def _ping_remove(self, agent_uuid: str) -> None:
+        slot = self._ping_slot_of.pop(agent_uuid, None)
+        if slot is not None and slot < len(self._ping_slots):
+            self._ping_slots[slot].discard(agent_uuid)
+
+    async def _ping_wheel(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_at = loop.time()
+        while True:
+            next_at += PING_TICK_SEC
+            await asyncio.sleep(max(0.0, next_at - loop.time()))
+            if loop.time() - next_at > PING_TICK_SEC:
+                next_at = loop.time()  # stalled loop: do not replay missed ticks in a burst
+            try:
+                self._ping_tick(time.monotonic())
+            except Exception as exc:
+                logger.warning("ws ping tick failed err=%s", exc)
+
+    def _ping_tick(self, now: float) -> None:
+        count = len(self._ping_slots)
+        slot = self._ping_cursor % count
+        self._ping_cursor = (slot + 1) % count
+        # Agents pinged `timeout` ago get their deadline checked now.
+        check = (slot - math.ceil(self._ping_timeout / PING_TICK_SEC)) % count
+        if check != slot:
+            for agent_uuid in list(self._ping_slots[check]):
+                conn = self._agents.get(agent_uuid)
+                if conn is not None:
+                    self._pong_overdue(conn, now)
+        ping = make_message("server.ping")
+        frames: dict[str, ws_codec.Frame] = {}
+        for agent_uuid in list(self._ping_slots[slot]):
+            conn = self._agents.get(agent_uuid)
+            if conn is None:
+                self._ping_remove(agent_uuid)
+                continue
+            if self._pong_overdue(conn, now):
+                continue
+            if conn.ping_sent_at <= conn.last_pong:
+                conn.ping_sent_at = now
+            frame = frames.get(conn.codec)
+            if frame is None:
+                frame = frames[conn.codec] = ws_codec.encode(conn.codec, ping, record=False)
+            if self._enqueue_agent(conn, frame, "server.ping:"):
+                self._ping_stats["pings"] += 1
+            else:
+                self._ping_stats["ping_failures"] += 1
+
+    def _pong_overdue(self, conn: AgentConnection, now: float) -> bool:
+        if conn.ping_sent_at <= conn.last_pong or now - conn.ping_sent_at < self._ping_timeout:
+            return False
+        self._ping_stats["pong_timeouts"] += 1
+        logger.warning(
+            "ws agent pong timeout uuid=%s waited=%.0fs; closing",
+            conn.agent_uuid,
+            now - conn.ping_sent_at,
+        )
+        self._ping_remove(conn.agent_uuid)
+        self._spawn(self._expire_agent(conn))
+        return True
+
+    async def _expire_agent(self, conn: AgentConnection) -> None:
+        # Unregister first so pushes stop targeting the half-open socket; the
+        # handler's teardown then marks the agent offline.
+        await self.unregister_agent(conn.agent_uuid, ws=conn.ws)
+        try:
+            await asyncio.wait_for(conn.ws.close(code=4008, reason="pong_timeout"), timeout=UI_CLOSE_TIMEOUT_SEC)
+        except BaseException:
+            pass
+
+    def ping_stats(self) -> dict:
+        sizes = [len(slot) for slot in self._ping_slots]
+        out = dict(self._ping_stats)
+        out["interval_sec"] = self._ping_interval
+        out["timeout_sec"] = self._ping_timeout
+        out["slots"] = len(sizes)
+        out["max_per_slot"] = max(sizes) if sizes else 0
+        return out
+
+    def agent_traffic_stats(self) -> dict:
+        now = time.monotonic()
+        live: dict[str, float] = {}
+        for conn in list(self._agents.values()):
+            live[conn.codec] = live.get(conn.codec, 0.0) + (now - conn.connected_at)
+        return ws_codec.stats(live)
+
     def get_agent(self, agent_uuid: str) -> Optional[AgentConnection]:
         # NOTE: read-only dict access here intentionally avoids asyncio.Lock.
         # This relies on CPython's GIL for safe concurrent reads from sync threads.
@@ -130,21 +466,105 @@ class WSManager:
         # NOTE: lock-free read; relies on CPython GIL for concurrent dict reads.
         return agent_uuid in self._agents
 
-    async def send_to_agent(self, agent_uuid: str, message: dict) -> bool:
+    async def send_to_agent(self, agent_uuid: str, message: dict, ws: WebSocket | None = None) -> bool:
+        """Queue ``message`` for the agent's writer; ``ws`` pins it to that connection."""
         conn = self.get_agent(agent_uuid)
-        if conn is None:
+        if conn is None or (ws is not None and conn.ws is not ws):
             return False
-
+        return self._enqueue_agent(conn, message, _coalesce_key(message))
+
+    def _push_local(self, agent_uuid: str, message: dict) -> None:
+        conn = self._agents.get(agent_uuid)
+        if conn is not None:
+            self._enqueue_agent(conn, message, _coalesce_key(message))
+
+    def _push_all_local(self, message: dict) -> None:
+        key = _coalesce_key(message)
+        for conn in list(self._agents.values()):
+            self._enqueue_agent(conn, message, key)
+
+    def _enqueue_agent(self, conn: AgentConnection, item: dict | ws_codec.Frame, key: str | None) -> bool:
+        """Loop thread only. ``item`` is a message dict or a frame already encoded for ``conn.codec``."""
+        if conn.closing:
+            self._agent_stats["dropped"] += 1
+            return False
+        if key is not None:
+            queued = conn.queued_keys.get(key)
+            if queued is not None:
+                if key == _MERGED_TYPE:
+                    queued[1] = _merge_patch(queued[1], item)
+                self._agent_stats["coalesced"] += 1
+                return True
+        if len(conn.outbox) >= AGENT_SEND_QUEUE_MAX:
+            self._agent_stats["dropped"] += 1
+            logger.warning("ws agent send queue full uuid=%s; dropping %s", conn.agent_uuid, key or "message")
+            return False
+        entry = [key, item]
+        conn.outbox.append(entry)
+        if key is not None:
+            conn.queued_keys[key] = entry
+        self._agent_stats["queued"] += 1
+        if conn.writer is None:
+            conn.writer = asyncio.create_task(self._agent_writer(conn))
+        conn.wake.set()
+        return True
+
+    async def _agent_writer(self, conn: AgentConnection) -> None:
+        """Single writer per agent socket, so pushes, replies and pings never interleave."""
+        reason = "send_failed"
+        while True:
+            if not conn.outbox:
+                conn.wake.clear()
+                await conn.wake.wait()
+                continue
+            entry = conn.outbox.popleft()
+            key, item = entry
+            if key is not None and conn.queued_keys.get(key) is entry:
+                del conn.queued_keys[key]
+            if isinstance(item, dict):
+                frame = ws_codec.encode(conn.codec, item)
+            else:
+                frame = item
+                ws_codec.note_sent(conn.codec, frame)
+            try:
+                await asyncio.wait_for(send_agent_frame(conn.ws, frame), timeout=AGENT_SEND_TIMEOUT_SEC)
+            except asyncio.TimeoutError:
+                self._agent_stats["send_timeouts"] += 1
+                logger.warning("ws agent send timeout uuid=%s; disconnecting", conn.agent_uuid)
+                reason = "send_timeout"
+                break
+            except (WebSocketDisconnect, ConnectionClosed, RuntimeError) as exc:
+                self._agent_stats["send_failures"] += 1
+                logger.warning("ws send failed agent_uuid=%s err=%s", conn.agent_uuid, exc)
+                break
+            except Exception as exc:
+                self._agent_stats["send_failures"] += 1
+                logger.warning("ws send unexpected failure agent_uuid=%s err=%s", conn.agent_uuid, exc)
+                break
+            self._agent_stats["sent"] += 1
+        await self.unregister_agent(conn.agent_uuid, ws=conn.ws)
         try:
-            await conn.ws.send_json(message)
-            return True
-        except (WebSocketDisconnect, ConnectionClosed, RuntimeError) as exc:
-            logger.warning("ws send failed agent_uuid=%s err=%s", agent_uuid, exc)
-        except Exception as exc:
-            logger.warning("ws send unexpected failure agent_uuid=%s err=%s", agent_uuid, exc)
-
-        await self.unregister_agent(agent_uuid, ws=conn.ws)
-        return False
+            await asyncio.wait_for(conn.ws.close(code=1013, reason=reason), timeout=UI_CLOSE_TIMEOUT_SEC)
+        except BaseException:
+            pass
+
+    def _stop_agent_writer(self, conn: AgentConnection) -> None:
+        conn.closing = True
+        self._agent_stats["dropped"] += len(conn.outbox)
+        conn.outbox.clear()
+        conn.queued_keys.clear()
+        writer = conn.writer
+        if writer is not None and writer is not asyncio.current_task():
+            writer.cancel()
+
+    def agent_send_stats(self) -> dict:
+        # NOTE: lock-free read; relies on CPython GIL for concurrent dict reads.
+        depths = [len(conn.outbox) for conn in list(self._agents.values())]
+        out = dict(self._agent_stats)
+        out["queue_depth_total"] = sum(depths)
+        out["queue_depth_max"] = max(depths) if depths else 0
+        out["queue_limit"] = AGENT_SEND_QUEUE_MAX
+        return out
 
     @property
     def agent_count(self) -> int:
@@ -157,52 +577,240 @@ class WSManager:
         return list(self._agents.keys())
 
     # --- UI ---
-    async def register_ui(self, ws: WebSocket, user_id: int, role: str) -> None:
+    async def register_ui(self, ws: WebSocket, user_id: int, role: str, status_batch: bool = False) -> UIConnection:
+        conn = UIConnection(ws=ws, user_id=user_id, role=role, status_batch=status_batch)
+        conn.writer = asyncio.create_task(self._ui_writer(conn))
         async with self._lock:
             bucket = self._ui_clients.setdefault(user_id, [])
-            bucket.append(UIConnection(ws=ws, user_id=user_id, role=role))
+            bucket.append(conn)
+            self._ui_firehose.add(conn)
             total = sum(len(conns) for conns in self._ui_clients.values())
             logger.info("ws ui registered user_id=%s role=%s ui_clients=%s", user_id, role, total)
+        return conn
 
     async def unregister_ui(self, user_id: int, ws: WebSocket | None = None) -> None:
-        removed = False
+        removed: list[UIConnection] = []
         async with self._lock:
             conns = self._ui_clients.get(user_id) or []
             if conns:
                 if ws is None:
-                    removed = bool(conns)
+                    removed = list(conns)
                     self._ui_clients.pop(user_id, None)
                 else:
                     kept = [conn for conn in conns if conn.ws is not ws]
-                    removed = len(kept) != len(conns)
+                    removed = [conn for conn in conns if conn.ws is ws]
                     if kept:
                         self._ui_clients[user_id] = kept
                     else:
                         self._ui_clients.pop(user_id, None)
+            for conn in removed:
+                self._unindex_ui(conn)
             count = sum(len(items) for items in self._ui_clients.values())
+        current = asyncio.current_task()
+        for conn in removed:
+            conn.closing = True
+            if conn.writer is not None and conn.writer is not current:
+                conn.writer.cancel()
         if removed:
             logger.info("ws ui unregistered user_id=%s ui_clients=%s", user_id, count)
 
-    async def broadcast_to_ui(self, message: dict) -> None:
-        clients = [
-            (user_id, conn)
-            for user_id, conns in list(self._ui_clients.items())
-            for conn in list(conns)
-        ]
-        dead_clients: list[tuple[int, WebSocket]] = []
-
-        for user_id, conn in clients:
+    def _unindex_ui(self, conn: UIConnection) -> None:
+        self._ui_firehose.discard(conn)
+        for topic in conn.topics or ():
+            subs = self._topic_index.get(topic)
+            if subs is not None:
+                subs.discard(conn)
+                if not subs:
+                    del self._topic_index[topic]
+
+    def subscribe_ui(self, conn: UIConnection, topics) -> tuple[list[str], list[str]]:
+        """Add topics for ``conn``; the first call switches it off the firehose.
+
+        Returns (subscribed topics, rejected topics).
+        """
+        rejected: list[str] = []
+        if conn.closing:
+            return [], list(topics)
+        if conn.topics is None:
+            conn.topics = set()
+            self._ui_firehose.discard(conn)
+        for topic in topics:
+            if topic in conn.topics:
+                continue
+            if not is_valid_topic(topic) or len(conn.topics) >= UI_MAX_TOPICS:
+                rejected.append(str(topic)[:100])
+                continue
+            conn.topics.add(topic)
+            self._topic_index.setdefault(topic, set()).add(conn)
+        return sorted(conn.topics), rejected
+
+    def unsubscribe_ui(self, conn: UIConnection, topics) -> list[str]:
+        """Remove topics for ``conn``; it stays in topic mode even when none remain."""
+        if conn.topics is None:
+            return []
+        for topic in topics:
+            if topic not in conn.topics:
+                continue
+            conn.topics.discard(topic)
+            subs = self._topic_index.get(topic)
+            if subs is not None:
+                subs.discard(conn)
+                if not subs:
+                    del self._topic_index[topic]
+        return sorted(conn.topics)
+
+    def has_topic_subscribers(self, prefix: str) -> bool:
+        """True when some client subscribed to a topic starting with ``prefix``."""
+        return any(topic.startswith(prefix) for topic in self._topic_index)
+
+    def _ui_recipients(self, topics: tuple[str, ...] = ()):
+        """Connections that should receive a message tagged with ``topics`` (untagged: everyone)."""
+        if not topics:
+            return [conn for conns in list(self._ui_clients.values()) for conn in conns]
+        recipients = set(self._ui_firehose)
+        for topic in topics:
+            subs = self._topic_index.get(topic)
+            if subs:
+                recipients |= subs
+        return recipients
+
+    async def _ui_writer(self, conn: UIConnection) -> None:
+        reason = "send_failed"
+        while True:
+            text = await conn.queue.get()
             try:
-                await conn.ws.send_json(message)
+                await asyncio.wait_for(conn.ws.send_text(text), timeout=UI_SEND_TIMEOUT_SEC)
+            except asyncio.TimeoutError:
+                self._ui_stats["send_timeouts"] += 1
+                logger.warning("ws ui send timeout user_id=%s; disconnecting", conn.user_id)
+                reason = "send_timeout"
+                break
             except (WebSocketDisconnect, ConnectionClosed, RuntimeError) as exc:
-                logger.warning("ws ui send failed user_id=%s err=%s", user_id, exc)
-                dead_clients.append((user_id, conn.ws))
+                self._ui_stats["send_failures"] += 1
+                logger.warning("ws ui send failed user_id=%s err=%s", conn.user_id, exc)
+                break
             except Exception as exc:
-                logger.warning("ws ui send unexpected failure user_id=%s err=%s", user_id, exc)
-                dead_clients.append((user_id, conn.ws))
-
-        for user_id, ws in dead_clients:
-            await self.unregister_ui(user_id, ws=ws)
+                self._ui_stats["send_failures"] += 1
+                logger.warning("ws ui send unexpected failure user_id=%s err=%s", conn.user_id, exc)
+                break
+            self._ui_stats["sent"] += 1
+        await self._drop_ui(conn, reason=reason)
+
+    async def _drop_ui(self, conn: UIConnection, reason: str) -> None:
+        conn.closing = True
+        try:
+            await asyncio.wait_for(conn.ws.close(code=1013, reason=reason), timeout=UI_CLOSE_TIMEOUT_SEC)
+        except BaseException:
+            pass
+        await self.unregister_ui(conn.user_id, ws=conn.ws)
+
+    def _enqueue_ui(self, text: str, recipients) -> None:
+        """Queue ``text`` for each connection in ``recipients``."""
+        self._ui_stats["broadcasts"] += 1
+        for conn in recipients:
+            self._enqueue_one(conn, text)
+
+    def _enqueue_one(self, conn: UIConnection, text: str) -> None:
+        if conn.closing:
+            return
+        try:
+            conn.queue.put_nowait(text)
+        except asyncio.QueueFull:
+            self._ui_stats["dropped_messages"] += 1
+            self._ui_stats["slow_consumer_disconnects"] += 1
+            logger.warning("ws ui slow consumer user_id=%s queue=%s; disconnecting", conn.user_id, conn.queue.qsize())
+            conn.closing = True
+            if conn.writer is not None:
+                conn.writer.cancel()
+            self._spawn(self._drop_ui(conn, reason="slow_consumer"))
+
+    async def send_to_ui_conn(self, conn: UIConnection, message: dict) -> None:
+        """Reply to one UI connection through its writer queue."""
+        self._enqueue_one(conn, encode_message(message))
+
+    def _broadcast_text(self, text: str, topics: tuple[str, ...] = ()) -> None:
+        if topics:
+            self._ui_stats["topic_broadcasts"] += 1
+        self._enqueue_ui(text, self._ui_recipients(topics))
+
+    async def broadcast_to_ui(self, message: dict, topics: tuple[str, ...] = ()) -> None:
+        """Send to every firehose client plus subscribers of any of ``topics``.
+
+        Without topics the message goes to all UI clients.
+        """
+        distributed = event_bus.is_distributed()
+        if not self._ui_clients and not distributed:
+            return
+        text = encode_message(message)
+        if distributed:
+            event_bus.publish("ui", {"text": text, "topics": list(topics)})
+        if self._ui_clients:
+            self._broadcast_text(text, topics)
+
+    def set_status_batch_interval(self, interval_sec: float) -> None:
+        self._status_batch_interval = max(0.0, float(interval_sec))
+
+    def publish_agent_status(self, payload: dict) -> None:
+        """Fan out one agent status delta: single event for legacy clients, coalesced batch for the rest."""
+        event_bus.publish("agent_status", payload)
+        self._publish_agent_status_local(payload)
+
+    def _publish_agent_status_local(self, payload: dict) -> None:
+        if not self._ui_clients:
+            return
+        self._ui_stats["status_events"] += 1
+        agent_uuid = str(payload.get("uuid") or "")
+        conns = [conn for conn in self._ui_recipients(("agent:" + agent_uuid, TOPIC_FLEET_SUMMARY)) if not conn.closing]
+        if not conns:
+            return
+        batching = self._status_batch_interval > 0
+        single = [conn for conn in conns if not (batching and conn.status_batch)]
+        if single:
+            self._enqueue_ui(encode_message(make_message("server.agent.status", payload)), single)
+        if len(single) == len(conns):
+            return
+        if agent_uuid in self._status_pending:
+            self._ui_stats["status_coalesced"] += 1
+        self._status_pending[agent_uuid] = payload
+        if self._status_flush_handle is None:
+            loop = asyncio.get_running_loop()
+            self._status_flush_handle = loop.call_later(self._status_batch_interval, self._flush_status_batch)
+
+    def _flush_status_batch(self) -> None:
+        self._status_flush_handle = None
+        items = list(self._status_pending.values())
+        self._status_pending.clear()
+        if not items:
+            return
+        self._ui_stats["status_batches"] += 1
+        # Firehose and fleet-summary subscribers share one full frame; agent-topic
+        # subscribers get only the agents they follow.
+        full = [conn for conn in self._ui_firehose if conn.status_batch]
+        full.extend(conn for conn in self._topic_index.get(TOPIC_FLEET_SUMMARY, ()) if conn.status_batch)
+        if full:
+            self._enqueue_ui(encode_message(make_message("server.agent.status.batch", {"items": items})), full)
+        full_set = set(full)
+        partial: dict[UIConnection, list[dict]] = {}
+        for item in items:
+            for conn in self._topic_index.get("agent:" + str(item.get("uuid") or ""), ()):
+                if conn.status_batch and conn not in full_set:
+                    partial.setdefault(conn, []).append(item)
+        for conn, conn_items in partial.items():
+            self._enqueue_one(conn, encode_message(make_message("server.agent.status.batch", {"items": conn_items})))
+
+    def ui_stats(self) -> dict:
+        # NOTE: lock-free read; relies on CPython GIL for concurrent dict reads.
+        depths = [conn.queue.qsize() for conns in list(self._ui_clients.values()) for conn in list(conns)]
+        out = dict(self._ui_stats)
+        out["connections"] = len(depths)
+        out["queue_depth_total"] = sum(depths)
+        out["queue_depth_max"] = max(depths) if depths else 0
+        out["queue_limit"] = UI_SEND_QUEUE_MAX
+        out["status_batch_interval_ms"] = int(self._status_batch_interval * 1000)
+        out["status_pending"] = len(self._status_pending)
+        out["firehose_connections"] = len(self._ui_firehose)
+        out["topics"] = len(self._topic_index)
+        return out
 
     @property
     def ui_count(self) -> int:
@@ -214,8 +822,23 @@ class WSManager:
         async with self._lock:
             agents = list(self._agents.values())
             ui_clients = [conn for conns in self._ui_clients.values() for conn in conns]
+            for agent_uuid, conn in self._agents.items():
+                connection_registry.note_disconnected(agent_uuid, connection_registry.KIND_WS)
+                self._stop_agent_writer(conn)
             self._agents.clear()
+            for slot in self._ping_slots:
+                slot.clear()
+            self._ping_slot_of.clear()
             self._ui_clients.clear()
+            self._ui_firehose.clear()
+            self._topic_index.clear()
+        if self._status_flush_handle is not None:
+            self._status_flush_handle.cancel()
+            self._status_flush_handle = None
+        self._status_pending.clear()
+        if self._ping_task is not None:
+            self._ping_task.cancel()
+            self._ping_task = None
 
         for conn in agents:
             try:
@@ -224,6 +847,9 @@ class WSManager:
                 pass
 
         for conn in ui_clients:
+            conn.closing = True
+            if conn.writer is not None:
+                conn.writer.cancel()
             try:
                 await conn.ws.close(code=1001, reason="server_shutdown")
             except Exception:
@@ -234,3 +860,7 @@ class WSManager:
 
 # Singleton
 ws_manager = WSManager()
+event_bus.register_handler("agent_push", ws_manager._on_bus_agent_push)
+event_bus.register_handler("agent_push_all", ws_manager._on_bus_agent_push_all)
+event_bus.register_handler("ui", ws_manager._on_bus_ui)
+event_bus.register_handler("agent_status", ws_manager._on_bus_agent_status)
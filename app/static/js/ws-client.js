@@ -10,6 +10,8 @@ class AppCenterWS {
         this._attempts = 0;
         this._timer = null;
         this._stopped = false;
+        // null = never subscribed: the server sends every UI event (firehose).
+        this._topics = null;
     }
 
     start() {
@@ -34,13 +36,17 @@ class AppCenterWS {
         }
 
         const proto = location.protocol === "https:" ? "wss:" : "ws:";
-        const url = `${proto}//${location.host}/api/v1/ui/ws?token=${encodeURIComponent(token)}`;
+        // status_batch=1: agent status deltas arrive coalesced as server.agent.status.batch.
+        const url = `${proto}//${location.host}/api/v1/ui/ws?token=${encodeURIComponent(token)}&status_batch=1`;
 
         this.ws = new WebSocket(url);
 
         this.ws.onopen = () => {
             this._attempts = 0;
             console.log("AppCenterWS: connected");
+            if (this._topics && this._topics.size) {
+                this._send("ui.subscribe", { topics: Array.from(this._topics) });
+            }
             this.onConnect();
         };
 
@@ -64,6 +70,26 @@ class AppCenterWS {
         };
     }
 
+    // Topics: "agent:<uuid>", "deployment:<id>", "announcement:<id>", "fleet-summary".
+    subscribe(topics) {
+        if (!this._topics) this._topics = new Set();
+        const added = (topics || []).filter((t) => !this._topics.has(t));
+        added.forEach((t) => this._topics.add(t));
+        if (added.length) this._send("ui.subscribe", { topics: added });
+    }
+
+    unsubscribe(topics) {
+        if (!this._topics) return;
+        const removed = (topics || []).filter((t) => this._topics.has(t));
+        removed.forEach((t) => this._topics.delete(t));
+        if (removed.length) this._send("ui.unsubscribe", { topics: removed });
+    }
+
+    _send(type, payload) {
+        if (!this.connected) return;
+        this.ws.send(JSON.stringify({ type: type, payload: payload || {} }));
+    }
+
     _reconnect() {
         this._attempts++;
         const delay = Math.min(2000 * Math.pow(2, this._attempts - 1), 30000);
@@ -9,12 +9,18 @@ from typing import Optional
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from app.config import get_settings
 from app.database import SessionLocal
-from app.models import Agent, AgentStatusHistory, SamReportSchedule, Setting, SoftwareChangeHistory, TaskHistory
+from app.models import Agent, AgentStatusHistory, SamReportSchedule, SoftwareChangeHistory, TaskHistory
 from app.services.announcement_service import check_expired_deliveries, check_scheduled_announcements
+from app.services import connection_registry
 from app.services import dynamic_group_service
+from app.services import group_capability_index
 from app.services import inventory_service
+from app.services import liveness_buffer
+from app.services import metrics_service
+from app.services import pending_work_service
 from app.services import remote_support_service
 from app.services import runtime_config_service as runtime_config
+from app.services import settings_snapshot_service
 from app.services.system_profile_service import cleanup_old_identity_history, cleanup_old_status_history, cleanup_old_system_history
 
 scheduler: Optional[AsyncIOScheduler] = None
@@ -23,11 +29,32 @@ logger = logging.getLogger("appcenter.scheduler")
 
 
 def _get_setting(db, key: str, default: str) -> str:
-    setting = db.query(Setting).filter(Setting.key == key).first()
-    return setting.value if setting else default
+    return settings_snapshot_service.get_snapshot(db).get_str(key, default)
 
 
+@metrics_service.timed_job
+def flush_liveness_buffer() -> None:
+    liveness_buffer.flush()
+
+
+@metrics_service.timed_job
+def flush_connection_registry() -> None:
+    connection_registry.flush()
+
+
+@metrics_service.timed_job
+def prune_work_marks_job() -> None:
+    db = SessionLocal()
+    try:
+        pending_work_service.prune_marks(db)
+    finally:
+        db.close()
+
+
+@metrics_service.timed_job
 def check_offline_agents() -> None:
+    # Buffered heartbeats/pongs must be visible before judging last_seen.
+    liveness_buffer.flush()
     db = SessionLocal()
     try:
         timeout_sec = int(_get_setting(db, "agent_timeout_sec", "300"))
@@ -54,6 +81,7 @@ def check_offline_agents() -> None:
         db.close()
 
 
+@metrics_service.timed_job
 def check_remote_support_timeouts() -> None:
     db = SessionLocal()
     try:
@@ -65,6 +93,7 @@ def check_remote_support_timeouts() -> None:
         db.close()
 
 
+@metrics_service.timed_job
 def cleanup_old_logs() -> None:
     db = SessionLocal()
     try:
@@ -76,6 +105,7 @@ def cleanup_old_logs() -> None:
         db.close()
 
 
+@metrics_service.timed_job
 def cleanup_old_inventory_history() -> None:
     db = SessionLocal()
     try:
@@ -87,6 +117,7 @@ def cleanup_old_inventory_history() -> None:
         db.close()
 
 
+@metrics_service.timed_job
 def cleanup_old_system_history_job() -> None:
     db = SessionLocal()
     try:
@@ -98,6 +129,7 @@ def cleanup_old_system_history_job() -> None:
         db.close()
 
 
+@metrics_service.timed_job
 def sync_dynamic_groups_job() -> None:
     global _last_dynamic_group_sync_at
     db = SessionLocal()
@@ -112,13 +144,16 @@ def sync_dynamic_groups_job() -> None:
             elapsed = (now - _last_dynamic_group_sync_at).total_seconds()
             if elapsed < interval_sec:
                 return
-        dynamic_group_service.apply_dynamic_groups_for_all_agents(db)
+        result = dynamic_group_service.apply_dynamic_groups_for_all_agents(db)
         db.commit()
+        if result.get("added") or result.get("removed"):
+            group_capability_index.invalidate()
         _last_dynamic_group_sync_at = now
     finally:
         db.close()
 
 
+@metrics_service.timed_job
 def run_due_sam_report_schedules() -> None:
     db = SessionLocal()
     try:
@@ -163,6 +198,7 @@ def run_due_sam_report_schedules() -> None:
         db.close()
 
 
+@metrics_service.timed_job
 def check_scheduled_announcements_job() -> None:
     db = SessionLocal()
     try:
@@ -171,6 +207,7 @@ def check_scheduled_announcements_job() -> None:
         db.close()
 
 
+@metrics_service.timed_job
 def check_expired_deliveries_job() -> None:
     db = SessionLocal()
     try:
@@ -188,7 +225,22 @@ def start_scheduler() -> None:
         return
 
     scheduler.add_job(check_offline_agents, "interval", minutes=2, id="offline_check", replace_existing=True)
+    scheduler.add_job(
+        flush_liveness_buffer,
+        "interval",
+        seconds=liveness_buffer.FLUSH_INTERVAL_SEC,
+        id="liveness_flush",
+        replace_existing=True,
+    )
+    scheduler.add_job(
+        flush_connection_registry,
+        "interval",
+        seconds=connection_registry.FLUSH_INTERVAL_SEC,
+        id="connection_registry_flush",
+        replace_existing=True,
+    )
     scheduler.add_job(cleanup_old_logs, "cron", hour=3, minute=0, id="log_cleanup", replace_existing=True)
+    scheduler.add_job(prune_work_marks_job, "interval", minutes=15, id="work_marks_prune", replace_existing=True)
     scheduler.add_job(cleanup_old_inventory_history, "cron", hour=3, minute=10, id="inventory_history_cleanup", replace_existing=True)
     scheduler.add_job(cleanup_old_system_history_job, "cron", hour=3, minute=20, id="system_history_cleanup", replace_existing=True)
     scheduler.add_job(check_remote_support_timeouts, "interval", seconds=30, id="rs_timeouts", replace_existing=True)
@@ -214,7 +266,22 @@ def start_scheduler() -> None:
         # Test/worker lifecycles may close event loops between app startups.
         scheduler = AsyncIOScheduler(timezone="UTC")
         scheduler.add_job(check_offline_agents, "interval", minutes=2, id="offline_check", replace_existing=True)
+        scheduler.add_job(
+            flush_liveness_buffer,
+            "interval",
+            seconds=liveness_buffer.FLUSH_INTERVAL_SEC,
+            id="liveness_flush",
+            replace_existing=True,
+        )
+        scheduler.add_job(
+            flush_connection_registry,
+            "interval",
+            seconds=connection_registry.FLUSH_INTERVAL_SEC,
+            id="connection_registry_flush",
+            replace_existing=True,
+        )
         scheduler.add_job(cleanup_old_logs, "cron", hour=3, minute=0, id="log_cleanup", replace_existing=True)
+        scheduler.add_job(prune_work_marks_job, "interval", minutes=15, id="work_marks_prune", replace_existing=True)
         scheduler.add_job(cleanup_old_inventory_history, "cron", hour=3, minute=10, id="inventory_history_cleanup", replace_existing=True)
         scheduler.add_job(cleanup_old_system_history_job, "cron", hour=3, minute=20, id="system_history_cleanup", replace_existing=True)
         scheduler.add_job(check_remote_support_timeouts, "interval", seconds=30, id="rs_timeouts", replace_existing=True)
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""Inventory write benchmark: rows written and commit latency per submit_inventory.
+
+Runs in-process against the configured Postgres (server/config/server.ini or
+DATABASE_URL). Creates throwaway "invbench-" agents, submits a full inventory
+for each, then replays rounds where --change-rate of the items change
+(version bumps, removals and installs), and reports per-submit rows written
+(INSERT/UPDATE/DELETE rowcount on agent_software_inventory) and submit/commit
+latency. ``--mode legacy`` replays the old delete-all + re-insert write path
+as the baseline.
+
+Examples:
+  python scripts/inventory_write_bench.py --agents 50 --software 300 --rounds 5
+  python scripts/inventory_write_bench.py --mode both --change-rate 0.02
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+import uuid as uuidlib
+from pathlib import Path
+from typing import Any, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import event  # noqa: E402
+
+from app.database import SessionLocal, engine  # noqa: E402
+from app.models import Agent, AgentSoftwareInventory  # noqa: E402
+from app.services import inventory_service, normalization_matcher, software_catalog  # noqa: E402
+
+TABLE = "agent_software_inventory"
+AGENT_PREFIX = "invbench-"
+
+
+class WriteCounter:
+    """Sums DML rowcounts on the inventory table and times commits."""
+
+    def __init__(self) -> None:
+        self.rows = 0
+        self.statements = 0
+        self.commit_started = 0.0
+        self.commit_ms = 0.0
+
+    def after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        head = statement.lstrip()[:120].upper()
+        if head.startswith(("INSERT", "UPDATE", "DELETE")) and TABLE.upper() in head:
+            self.statements += 1
+            if cursor.rowcount and cursor.rowcount > 0:
+                self.rows += cursor.rowcount
+
+    def before_commit(self, session) -> None:
+        self.commit_started = time.perf_counter()
+
+    def after_commit(self, session) -> None:
+        if self.commit_started:
+            self.commit_ms = (time.perf_counter() - self.commit_started) * 1000.0
+
+    def reset(self) -> None:
+        self.rows = 0
+        self.statements = 0
+        self.commit_started = 0.0
+        self.commit_ms = 0.0
+
+
+def _legacy_submit(db, agent_uuid: str, inventory_hash: str, items: list[dict]) -> None:
+    """Previous write path: delete every row of the agent and insert the list again."""
+    db.query(AgentSoftwareInventory).filter(AgentSoftwareInventory.agent_uuid == agent_uuid).delete()
+    matcher = normalization_matcher.get_matcher(db)
+    for item in items:
+        db.add(AgentSoftwareInventory(agent_uuid=agent_uuid, **inventory_service._inventory_values(matcher, item)))
+    agent = db.query(Agent).filter(Agent.uuid == agent_uuid).first()
+    agent.inventory_hash = inventory_hash
+    agent.software_count = len(items)
+    db.commit()
+
+
+def _inventory(rng: random.Random, size: int) -> list[dict]:
+    return [
+        {
+            "name": "Bench App %05d" % idx,
+            "version": "1.%d.0" % rng.randint(0, 9),
+            "publisher": "Bench Vendor %d" % (idx % 40),
+            "architecture": rng.choice(("x64", "x86", None)),
+            "estimated_size_kb": rng.randint(100, 500000),
+        }
+        for idx in range(size)
+    ]
+
+
+def _mutate(rng: random.Random, items: list[dict], change_rate: float, serial: int) -> list[dict]:
+    out = [dict(item) for item in items]
+    changes = max(1, int(len(out) * change_rate))
+    for _ in range(changes):
+        roll = rng.random()
+        if roll < 0.6 and out:
+            victim = out[rng.randrange(len(out))]
+            victim["version"] = "%s.%d" % (victim["version"], rng.randint(1, 9))
+        elif roll < 0.8 and out:
+            out.pop(rng.randrange(len(out)))
+        else:
+            out.append({"name": "Bench New %d-%d" % (serial, rng.randint(0, 10**6)), "version": "1.0"})
+    return out
+
+
+def _pct(ordered: list[float], pct: float) -> float:
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return round(ordered[idx], 2)
+
+
+def _run_mode(mode: str, args: argparse.Namespace, counter: WriteCounter) -> dict[str, Any]:
+    rng = random.Random(args.seed)
+    agents = ["%s%s" % (AGENT_PREFIX, uuidlib.uuid4()) for _ in range(args.agents)]
+    inventories: dict[str, list[dict]] = {}
+    db = SessionLocal()
+    try:
+        for agent_uuid in agents:
+            db.add(Agent(uuid=agent_uuid, hostname=agent_uuid[:40], platform="windows", status="offline"))
+        db.commit()
+        for agent_uuid in agents:
+            inventories[agent_uuid] = _inventory(rng, args.software)
+            inventory_service.submit_inventory(db, agent_uuid, "seed", inventories[agent_uuid])
+
+        rows: list[int] = []
+        statements: list[int] = []
+        submit_ms: list[float] = []
+        commit_ms: list[float] = []
+        for round_no in range(args.rounds):
+            for agent_uuid in agents:
+                items = _mutate(rng, inventories[agent_uuid], args.change_rate, round_no)
+                inventories[agent_uuid] = items
+                before = software_catalog.agent_rows(db, agent_uuid) if mode == "legacy" else None
+                counter.reset()
+                started = time.perf_counter()
+                if mode == "legacy":
+                    _legacy_submit(db, agent_uuid, "r%d" % round_no, items)
+                else:
+                    inventory_service.submit_inventory(db, agent_uuid, "r%d" % round_no, items)
+                submit_ms.append((time.perf_counter() - started) * 1000.0)
+                if before is not None:
+                    # Keep the catalog consistent outside the measured window (the old path had none).
+                    software_catalog.apply_change(db, "windows", before, software_catalog.agent_rows(db, agent_uuid))
+                    db.commit()
+                commit_ms.append(counter.commit_ms)
+                rows.append(counter.rows)
+                statements.append(counter.statements)
+    finally:
+        db.rollback()
+        for agent_uuid in agents:
+            software_catalog.remove_agent(db, agent_uuid)
+        db.query(Agent).filter(Agent.uuid.in_(agents)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+    submit_ms.sort()
+    commit_ms.sort()
+    return {
+        "submits": len(rows),
+        "rows_written_avg": round(sum(rows) / len(rows), 1) if rows else 0.0,
+        "rows_written_max": max(rows) if rows else 0,
+        "statements_avg": round(sum(statements) / len(statements), 1) if statements else 0.0,
+        "submit_p50_ms": _pct(submit_ms, 50),
+        "submit_p95_ms": _pct(submit_ms, 95),
+        "commit_p50_ms": _pct(commit_ms, 50),
+        "commit_p95_ms": _pct(commit_ms, 95),
+    }
+
+
+def parse_args(argv: Optional[list[str]] = None) -> argparse.Namespace:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--agents", type=int, default=20)
+    p.add_argument("--software", type=int, default=300, help="items per agent inventory")
+    p.add_argument("--rounds", type=int, default=5, help="resubmits per agent after the seed submit")
+    p.add_argument("--change-rate", type=float, default=0.05, help="share of items changed per round")
+    p.add_argument("--mode", choices=("incremental", "legacy", "both"), default="both")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--output", default="", help="write JSON result to this path")
+    return p.parse_args(argv)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    args = parse_args(argv)
+    counter = WriteCounter()
+    event.listen(engine, "after_cursor_execute", counter.after_cursor_execute)
+    event.listen(SessionLocal, "before_commit", counter.before_commit)
+    event.listen(SessionLocal, "after_commit", counter.after_commit)
+
+    modes = ("incremental", "legacy") if args.mode == "both" else (args.mode,)
+    result: dict[str, Any] = {
+        "agents": args.agents,
+        "software": args.software,
+        "rounds": args.rounds,
+        "change_rate": args.change_rate,
+        "modes": {mode: _run_mode(mode, args, counter) for mode in modes},
+    }
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n", encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
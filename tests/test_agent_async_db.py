@@ -0,0 +1,117 @@
+"""Tests for the agent endpoint session runner."""
+
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import text
+
+from app import database
+from app.services import loop_monitor
+from app.services import metrics_service as metrics
+
+
+class _FakeSession:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_async_url_swaps_driver_and_keeps_credentials():
+    url = database._async_database_url("postgresql+psycopg2://u:p%40ss@db:5432/appcenter")
+    assert url == "postgresql+asyncpg://u:p%40ss@db:5432/appcenter"
+
+
+def test_run_agent_db_falls_back_to_thread_pool(monkeypatch):
+    session = _FakeSession()
+    monkeypatch.setattr(database, "AsyncSessionLocal", None)
+    monkeypatch.setattr(database, "SessionLocal", lambda: session)
+
+    result = asyncio.run(database.run_agent_db(lambda db, a, b: (db, a + b), 2, 3))
+
+    assert result == (session, 5)
+    assert session.closed is True
+
+
+def test_run_agent_db_on_timed_async_pool_under_request_scope(monkeypatch):
+    pytest.importorskip("aiosqlite")
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    async_engine = create_async_engine("sqlite+aiosqlite://", poolclass=metrics.TimedAsyncAdaptedQueuePool)
+    metrics.instrument_engine(async_engine.sync_engine)
+    monkeypatch.setattr(database, "AsyncSessionLocal", async_sessionmaker(bind=async_engine))
+    scope = metrics._Scope(route="/api/v1/agent/heartbeat", deferred=True)
+
+    async def _run():
+        token = metrics._current.set(scope)
+        try:
+            return await database.run_agent_db(lambda db: db.execute(text("SELECT 1")).scalar())
+        finally:
+            metrics._current.reset(token)
+            await async_engine.dispose()
+
+    assert asyncio.run(_run()) == 1
+    assert scope.checkouts == 1
+    assert scope.statements == 1
+
+
+def test_timed_async_pool_returns_the_checked_out_connection():
+    # Without an async sqlite driver, drive the async pool from a greenlet the
+    # way AsyncSession.run_sync does.
+    from sqlalchemy import create_engine
+    from sqlalchemy.util import greenlet_spawn
+
+    eng = create_engine("sqlite://", poolclass=metrics.TimedAsyncAdaptedQueuePool)
+    scope = metrics._Scope(route="/api/v1/agent/heartbeat", deferred=True)
+
+    def _query():
+        with eng.connect() as conn:
+            return conn.execute(text("SELECT 1")).scalar()
+
+    async def _run():
+        token = metrics._current.set(scope)
+        try:
+            return await greenlet_spawn(_query)
+        finally:
+            metrics._current.reset(token)
+
+    try:
+        assert asyncio.run(_run()) == 1
+    finally:
+        eng.dispose()
+    assert scope.checkouts == 1
+
+
+def test_run_db_in_thread_keeps_the_event_loop_responsive(monkeypatch):
+    monkeypatch.setattr(database, "SessionLocal", _FakeSession)
+    monkeypatch.setattr(loop_monitor, "SAMPLE_INTERVAL_SEC", 0.01)
+
+    def busy_handler(db):
+        time.sleep(0.2)  # stands in for ORM / Python work of a WS handler
+        return db
+
+    async def on_loop():
+        # What AsyncSession.run_sync does: the handler runs on the loop thread.
+        return busy_handler(_FakeSession())
+
+    async def in_thread():
+        return await database.run_db_in_thread(busy_handler)
+
+    def max_lag_ms(runner) -> float:
+        async def scenario():
+            loop_monitor.start()
+            await asyncio.sleep(0.03)
+            await runner()
+            await asyncio.sleep(0.03)
+            await loop_monitor.stop()
+
+        loop_monitor.clear_all()
+        asyncio.run(scenario())
+        return loop_monitor.stats()["max_ms"]
+
+    try:
+        assert max_lag_ms(on_loop) >= 150.0
+        assert max_lag_ms(in_thread) < 100.0
+    finally:
+        loop_monitor.clear_all()
@@ -0,0 +1,65 @@
+"""Tests for the in-memory agent credential cache."""
+
+import pytest
+
+from app.services import agent_credential_cache as cache
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    cache.clear_all()
+    yield
+    cache.clear_all()
+
+
+def test_verify_hit_after_remember():
+    cache.remember("a1", "sk_one", "windows")
+    entry = cache.verify("a1", "sk_one")
+    assert entry is not None
+    assert entry.platform == "windows"
+    assert cache.stats()["hits"] == 1
+
+
+def test_wrong_secret_is_a_miss():
+    cache.remember("a1", "sk_one")
+    assert cache.verify("a1", "sk_two") is None
+    assert cache.verify("unknown", "sk_one") is None
+    assert cache.stats()["misses"] == 2
+
+
+def test_invalidate_drops_entry():
+    cache.remember("a1", "sk_one")
+    cache.invalidate("a1")
+    assert cache.verify("a1", "sk_one") is None
+
+
+def test_expired_entry_is_evicted(monkeypatch):
+    monkeypatch.setattr(cache, "TTL_SEC", -1.0)
+    cache.remember("a1", "sk_one")
+    assert cache.verify("a1", "sk_one") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_lru_bound(monkeypatch):
+    monkeypatch.setattr(cache, "MAX_ENTRIES", 2)
+    cache.remember("a1", "s1")
+    cache.remember("a2", "s2")
+    assert cache.verify("a1", "s1") is not None  # a1 becomes most recent
+    cache.remember("a3", "s3")
+    assert cache.verify("a2", "s2") is None
+    assert cache.verify("a1", "s1") is not None
+    assert cache.verify("a3", "s3") is not None
+
+
+def test_update_platform_keeps_secret():
+    cache.remember("a1", "sk_one", "windows")
+    cache.update_platform("a1", "linux")
+    entry = cache.verify("a1", "sk_one")
+    assert entry is not None and entry.platform == "linux"
+
+
+def test_secrets_match():
+    assert cache.secrets_match("abc", "abc")
+    assert not cache.secrets_match("abc", "abd")
+    assert not cache.secrets_match(None, "abc")
+    assert not cache.secrets_match("abc", "")
@@ -120,3 +120,88 @@ def test_ws_remote_support_request_includes_requires_approval(client, auth_heade
             assert payload["admin_name"] == "admin"
             assert "timeout_at" in payload
             assert "approval_timeout_at" not in payload
+
+
+def test_ws_reconnect_with_resume_token_gets_abbreviated_hello(client, auth_headers):
+    agent_uuid = str(uuid.uuid4())
+    reg = client.post(
+        "/api/v1/agent/register",
+        json={
+            "uuid": agent_uuid,
+            "hostname": "ws-resume-pc",
+            "os_version": "Windows 11",
+            "agent_version": "1.0.0",
+        },
+    )
+    assert reg.status_code == 200
+    secret = reg.json()["secret_key"]
+
+    updated = client.put(
+        "/api/v1/settings",
+        headers=auth_headers,
+        json={"values": {"ws_agent_enabled": "true", "ws_resume_enabled": "true"}},
+    )
+    assert updated.status_code == 200
+
+    hello_payload = {"hostname": "ws-resume-pc", "platform": "windows", "ip_address": "10.1.1.9"}
+
+    def _connect(resume_token: str | None) -> dict:
+        with client.websocket_connect("/api/v1/agent/ws") as ws:
+            auth = {"uuid": agent_uuid, "secret": secret}
+            if resume_token:
+                auth["resume_token"] = resume_token
+            ws.send_json(_ws_msg("agent.auth", auth))
+            assert ws.receive_json()["type"] == "server.auth.ok"
+            ws.send_json(_ws_msg("agent.hello", hello_payload))
+            hello = ws.receive_json()
+            assert hello["type"] == "server.hello"
+            return hello["payload"]
+
+    first = _connect(None)
+    assert "config" in first and first["resume_token"]
+
+    second = _connect(first["resume_token"])
+    assert second.get("resumed") is True
+    assert "config" not in second
+
+    hello_payload["ip_address"] = "10.1.1.10"
+    third = _connect(second["resume_token"])
+    assert "config" in third
+
+
+def test_ws_chunked_inventory_upload(client, auth_headers):
+    import hashlib
+    import json
+
+    agent_uuid = str(uuid.uuid4())
+    reg = client.post(
+        "/api/v1/agent/register",
+        json={"uuid": agent_uuid, "hostname": "ws-inv-pc", "os_version": "Windows 11", "agent_version": "1.0.0"},
+    )
+    assert reg.status_code == 200
+    secret = reg.json()["secret_key"]
+    updated = client.put("/api/v1/settings", headers=auth_headers, json={"values": {"ws_agent_enabled": "true"}})
+    assert updated.status_code == 200
+
+    items = [{"name": f"Tool {i}", "version": "1.0", "publisher": "Contoso"} for i in range(5)]
+    inventory_hash = hashlib.sha256(json.dumps(items, sort_keys=True).encode("utf-8")).hexdigest()
+
+    with client.websocket_connect("/api/v1/agent/ws") as ws:
+        ws.send_json(_ws_msg("agent.auth", {"uuid": agent_uuid, "secret": secret}))
+        assert ws.receive_json()["type"] == "server.auth.ok"
+        ws.send_json(_ws_msg("agent.hello", {"hostname": "ws-inv-pc", "platform": "windows"}))
+        assert ws.receive_json()["type"] == "server.hello"
+
+        ws.send_json(_ws_msg("agent.inventory.begin", {"inventory_hash": inventory_hash, "software_count": 5}))
+        assert ws.receive_json()["type"] == "server.inventory.ready"
+        ws.send_json(_ws_msg("agent.inventory.chunk", {"seq": 0, "items": items[:3]}))
+        ws.send_json(_ws_msg("agent.inventory.chunk", {"seq": 1, "items": items[3:]}))
+        ws.send_json(_ws_msg("agent.inventory.commit", {"inventory_hash": inventory_hash}))
+        result = ws.receive_json()
+        assert result["type"] == "server.inventory.result"
+        assert result["payload"]["ok"] is True
+        assert result["payload"]["software_count"] == 5
+
+    listed = client.get(f"/api/v1/agents/{agent_uuid}/inventory", headers=auth_headers)
+    assert listed.status_code == 200
+    assert listed.json()["total"] == 5
@@ -0,0 +1,48 @@
+"""Tests for the connection-ownership registry bookkeeping (DB writes are exercised in integration)."""
+
+import pytest
+
+from app.services import agent_signal, connection_registry as registry
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    registry.clear_all()
+    agent_signal.clear_all()
+    yield
+    registry.clear_all()
+    agent_signal.clear_all()
+
+
+def test_plan_upserts_new_and_deletes_gone_connections():
+    registry.note_connected("a1", registry.KIND_WS)
+    registry.note_connected("a2", registry.KIND_WS)
+    plan = registry._plan()
+    assert plan == {registry.KIND_WS: ({"a1", "a2"}, set())}
+    registry._persisted[registry.KIND_WS] |= {"a1", "a2"}
+
+    registry.note_disconnected("a2", registry.KIND_WS)
+    assert registry._plan() == {registry.KIND_WS: (set(), {"a2"})}
+
+
+def test_reconnect_within_flush_window_is_upserted_again():
+    registry.note_connected("a1", registry.KIND_WS)
+    registry._plan()
+    registry._persisted[registry.KIND_WS].add("a1")
+    # Disconnect + reconnect between flushes: another worker may have taken the row meanwhile.
+    registry.note_disconnected("a1", registry.KIND_WS)
+    registry.note_connected("a1", registry.KIND_WS)
+    assert registry._plan() == {registry.KIND_WS: ({"a1"}, set())}
+    assert registry._plan() == {}
+
+
+def test_local_mode_uses_in_process_state_without_db():
+    agent_signal.mark_listener_active("a1")
+    registry.note_connected("a2", registry.KIND_WS)
+    assert registry.flush() == 0
+    assert registry.ws_agent_uuids(None) == ["a2"]
+    assert registry.is_ws_connected(None, "a2") is True
+    assert registry.is_ws_connected(None, "a1") is False
+    assert registry.fleet_counts(None) == {"ws_agents": 1, "signal_listeners": 1, "workers": 1}
+    agent_signal.mark_listener_inactive("a1")
+    assert registry.stats()["local_signal"] == 0
@@ -0,0 +1,129 @@
+"""Tests for the cross-worker event bus (LISTEN/NOTIFY transport is faked)."""
+
+import asyncio
+import json
+
+import pytest
+
+from app.services import agent_signal, event_bus
+from app.services import ws_manager as wsm
+
+
+class _CapturingBackend:
+    def __init__(self):
+        self.sent: list[str] = []
+        self.targets: list = []
+
+    def submit(self, text: str, agent_uuid=None) -> bool:
+        self.sent.append(text)
+        self.targets.append(agent_uuid)
+        return True
+
+    def stop(self) -> None:
+        pass
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    event_bus.stop()
+    event_bus.clear_all()
+    agent_signal.clear_all()
+    yield
+    event_bus.stop()
+    event_bus.clear_all()
+    agent_signal.clear_all()
+
+
+def _from_other_worker(text: str) -> str:
+    envelope = json.loads(text)
+    envelope["o"] = "other-worker"
+    return json.dumps(envelope)
+
+
+def test_local_mode_publishes_nothing():
+    async def scenario():
+        event_bus.start(asyncio.get_running_loop(), "local", "postgresql+psycopg2://u:p@h/db")
+        event_bus.publish("signal", {"agent_uuid": "a1"})
+        return event_bus.is_distributed(), event_bus.stats()
+
+    distributed, stats = asyncio.run(scenario())
+    assert distributed is False
+    assert stats["backend"] == "local"
+    assert stats["published"] == 0
+
+
+def test_signal_reaches_long_poll_on_other_worker(monkeypatch):
+    backend = _CapturingBackend()
+    monkeypatch.setattr(event_bus, "_backend", backend)
+
+    async def scenario():
+        monkeypatch.setattr(event_bus, "_loop", asyncio.get_running_loop())
+        ev = agent_signal.get_or_create_event("a1")
+        agent_signal.notify_agent("a2")  # no local listener for a2
+        # Our own notification comes back on LISTEN and must be ignored.
+        event_bus._on_payload(backend.sent[0])
+        await asyncio.sleep(0)
+        own_ignored = not ev.is_set()
+        event_bus._on_payload(_from_other_worker(backend.sent[0].replace('"a2"', '"a1"')))
+        await asyncio.wait_for(ev.wait(), timeout=1.0)
+        return own_ignored
+
+    assert asyncio.run(scenario()) is True
+    assert json.loads(backend.sent[0])["k"] == "signal"
+    assert backend.targets == ["a2"]  # addressed to the owning worker only
+    assert event_bus.stats()["received"] == 1
+
+
+def test_push_for_remote_agent_is_delivered_by_owning_worker(monkeypatch):
+    backend = _CapturingBackend()
+    monkeypatch.setattr(event_bus, "_backend", backend)
+
+    class _AgentWS:
+        def __init__(self):
+            self.sent = []
+
+        async def send_text(self, text):
+            self.sent.append(json.loads(text))
+
+    async def scenario():
+        monkeypatch.setattr(event_bus, "_loop", asyncio.get_running_loop())
+        sender, owner = wsm.WSManager(), wsm.WSManager()
+        sender.set_loop(asyncio.get_running_loop())
+        agent_ws = _AgentWS()
+        await owner.register_agent(agent_ws, "a1")
+        sender.schedule_send_to_agent("a1", {"type": "server.signal"})
+        envelope = json.loads(backend.sent[0])
+        owner._on_bus_agent_push(envelope["d"])
+        await asyncio.sleep(0.01)
+        return agent_ws.sent, envelope["k"]
+
+    sent, kind = asyncio.run(scenario())
+    assert kind == "agent_push"
+    assert backend.targets == ["a1"]
+    assert sent == [{"type": "server.signal"}]
+
+
+def test_oversized_payload_is_not_published(monkeypatch):
+    backend = _CapturingBackend()
+    monkeypatch.setattr(event_bus, "_backend", backend)
+    assert event_bus.publish("ui", {"text": "x" * (event_bus.MAX_PAYLOAD_BYTES + 1)}) is False
+    assert backend.sent == []
+    assert event_bus.stats()["dropped_oversized"] == 1
+
+
+def test_oversized_remote_agent_push_reports_failure(monkeypatch):
+    backend = _CapturingBackend()
+    monkeypatch.setattr(event_bus, "_backend", backend)
+
+    async def scenario():
+        sender = wsm.WSManager()
+        sender.set_loop(asyncio.get_running_loop())
+        # Turkish text is ~2 bytes per char in the envelope (ensure_ascii=False).
+        big = {"type": "server.announcement.push", "payload": {"message": "ğ" * 5000}}
+        small = {"type": "server.signal"}
+        return sender.schedule_send_to_agent("a1", big), sender.schedule_send_to_agent("a1", small)
+
+    big_sent, small_sent = asyncio.run(scenario())
+    assert big_sent is False
+    assert small_sent is True
+    assert len(backend.sent) == 1
@@ -0,0 +1,44 @@
+"""Tests for the heartbeat unchanged-payload fingerprint helpers."""
+
+from app.models import Agent
+from app.schemas import HeartbeatRequest
+from app.services import heartbeat_service as hb
+
+
+def _payload(**kwargs) -> HeartbeatRequest:
+    base = {"hostname": "pc-01", "ip_address": "10.0.0.5", "uptime_sec": 100, "disk_free_gb": 40}
+    base.update(kwargs)
+    return HeartbeatRequest(**base)
+
+
+def test_liveness_fields_do_not_change_payload_fingerprint():
+    a = hb._payload_fingerprint(_payload())
+    b = hb._payload_fingerprint(_payload(uptime_sec=999, disk_free_gb=12, inventory_hash="x"))
+    assert a == b
+
+
+def test_identity_change_changes_payload_fingerprint():
+    a = hb._payload_fingerprint(_payload())
+    b = hb._payload_fingerprint(_payload(ip_address="10.0.0.6"))
+    assert a != b
+
+
+def test_client_fingerprint_is_used_verbatim():
+    assert hb._payload_fingerprint(_payload(state_fingerprint="abc")) == "c:abc"
+
+
+def test_state_fingerprint_tracks_stored_columns():
+    agent = Agent(uuid="u1", hostname="pc-01", ip_address="10.0.0.5", remote_support_state="idle")
+    fp = hb._payload_fingerprint(_payload())
+    before = hb._state_fingerprint(agent, fp, False)
+    assert before == hb._state_fingerprint(agent, fp, False)
+    agent.remote_support_state = "pending_approval"
+    assert before != hb._state_fingerprint(agent, fp, False)
+    assert hb._state_fingerprint(agent, fp, False) != hb._state_fingerprint(agent, fp, True)
+
+
+def test_percentile():
+    values = [float(i) for i in range(1, 101)]
+    assert hb._percentile(values, 50) in (50.0, 51.0)
+    assert hb._percentile(values, 99) == 99.0
+    assert hb._percentile([], 99) == 0.0
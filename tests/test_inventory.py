@@ -468,3 +468,248 @@ def test_publisher_normalization_on_inventory(client, auth_headers):
     first = inv.json()["items"][0]
     assert first["publisher"] == "Microsoft"
     assert first["normalized_publisher"] == "Microsoft"
+
+
+def test_inventory_resubmit_only_writes_changed_rows(client):
+    from app.database import SessionLocal
+    from app.models import AgentSoftwareInventory
+
+    uid, _secret, headers = _register_agent(client)
+
+    def _rows():
+        db = SessionLocal()
+        try:
+            return {
+                (r.software_name, r.architecture): (r.id, r.software_version)
+                for r in db.query(AgentSoftwareInventory).filter(AgentSoftwareInventory.agent_uuid == uid)
+            }
+        finally:
+            db.close()
+
+    client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "inc-1",
+        "software_count": 4,
+        "items": [
+            {"name": "Keep App", "version": "1.0"},
+            {"name": "Bump App", "version": "1.0"},
+            {"name": "Gone App", "version": "1.0"},
+            {"name": "Runtime", "version": "8.0", "architecture": "x64"},
+        ],
+    }, headers=headers)
+    before = _rows()
+
+    resp = client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "inc-2",
+        "software_count": 5,
+        "items": [
+            {"name": "Keep App", "version": "1.0"},
+            {"name": "Bump App", "version": "2.0"},
+            {"name": "New App", "version": "1.0"},
+            {"name": "Runtime", "version": "8.0", "architecture": "x64"},
+            {"name": "Runtime", "version": "8.0", "architecture": "x86"},
+        ],
+    }, headers=headers)
+    assert resp.status_code == 200
+    after = _rows()
+
+    assert set(after) == {
+        ("Keep App", None), ("Bump App", None), ("New App", None), ("Runtime", "x64"), ("Runtime", "x86"),
+    }
+    assert after[("Keep App", None)] == before[("Keep App", None)]
+    assert after[("Runtime", "x64")] == before[("Runtime", "x64")]
+    assert after[("Bump App", None)] == (before[("Bump App", None)][0], "2.0")
+
+
+def test_inventory_delta_submit(client, auth_headers):
+    uid, _secret, headers = _register_agent(client)
+    client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "d-1",
+        "software_count": 3,
+        "items": [
+            {"name": "Delta Keep", "version": "1.0"},
+            {"name": "Delta Bump", "version": "1.0", "architecture": "x64"},
+            {"name": "Delta Gone", "version": "1.0"},
+        ],
+    }, headers=headers)
+
+    hb = client.post("/api/v1/agent/heartbeat", json={"hostname": "test-pc", "inventory_hash": "d-2"}, headers=headers)
+    assert hb.json()["config"]["inventory_base_hash"] == "d-1"
+
+    delta = {
+        "base_hash": "d-1",
+        "new_hash": "d-2",
+        "software_count": 3,
+        "added": [{"name": "Delta New", "version": "5.0"}],
+        "removed": [{"name": "Delta Gone"}],
+        "changed": [{"name": "Delta Bump", "version": "2.0", "architecture": "x64"}],
+    }
+    resp = client.post("/api/v1/agent/inventory/delta", json=delta, headers=headers)
+    assert resp.status_code == 200
+    assert resp.json()["status"] == "ok"
+    assert resp.json()["changes"] == {"installed": 1, "removed": 1, "updated": 1}
+
+    inv = client.get(f"/api/v1/agents/{uid}/inventory", headers=auth_headers).json()
+    assert {i["software_name"]: i["software_version"] for i in inv["items"]} == {
+        "Delta Keep": "1.0", "Delta Bump": "2.0", "Delta New": "5.0",
+    }
+    history = client.get(f"/api/v1/agents/{uid}/inventory/changes", headers=auth_headers)
+    assert history.status_code == 200
+    assert sorted(i["change_type"] for i in history.json()["items"]) == ["installed", "removed", "updated"]
+
+    # Stale base (already moved to d-2) -> full sync, nothing written.
+    stale = client.post("/api/v1/agent/inventory/delta", json=delta, headers=headers)
+    assert stale.status_code == 200
+    assert stale.json()["status"] == "full_sync_required"
+
+    # Count mismatch -> rolled back.
+    bad = dict(delta, base_hash="d-2", new_hash="d-3", software_count=9, added=[], removed=[], changed=[])
+    assert client.post("/api/v1/agent/inventory/delta", json=bad, headers=headers).json()["status"] == "full_sync_required"
+    hb = client.post("/api/v1/agent/heartbeat", json={"hostname": "test-pc", "inventory_hash": "d-2"}, headers=headers)
+    assert hb.json()["config"]["inventory_sync_required"] is False
+
+
+def test_inventory_delta_matches_non_ascii_names(client, auth_headers):
+    uid, _secret, headers = _register_agent(client)
+    client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "tr-1",
+        "software_count": 2,
+        "items": [
+            {"name": "İnternet Araçları", "version": "1.0"},
+            {"name": "Straße Karten", "version": "1.0"},
+        ],
+    }, headers=headers)
+
+    resp = client.post("/api/v1/agent/inventory/delta", json={
+        "base_hash": "tr-1",
+        "new_hash": "tr-2",
+        "software_count": 1,
+        "added": [],
+        "removed": [{"name": "Straße Karten"}],
+        "changed": [{"name": "İnternet Araçları", "version": "2.0"}],
+    }, headers=headers)
+    assert resp.json()["status"] == "ok"
+    assert resp.json()["changes"] == {"installed": 0, "removed": 1, "updated": 1}
+
+    inv = client.get(f"/api/v1/agents/{uid}/inventory", headers=auth_headers).json()
+    assert {i["software_name"]: i["software_version"] for i in inv["items"]} == {"İnternet Araçları": "2.0"}
+
+
+def test_normalization_reapply_runs_in_background(client, auth_headers):
+    from app.database import SessionLocal
+    from app.models import AgentSoftwareInventory
+    from app.services import normalization_reapply
+
+    uid, _secret, headers = _register_agent(client)
+    client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "reapply-1",
+        "software_count": 1,
+        "items": [{"name": "Reapplytool Enterprise Edition", "version": "1.0"}],
+    }, headers=headers)
+
+    resp = client.post("/api/v1/inventory/normalization", json={
+        "pattern": "reapplytool",
+        "normalized_name": "ReapplyTool",
+        "match_type": "starts_with",
+    }, headers=auth_headers)
+    assert resp.status_code == 201
+    assert normalization_reapply.wait(30)
+
+    db = SessionLocal()
+    try:
+        row = db.query(AgentSoftwareInventory).filter(AgentSoftwareInventory.agent_uuid == uid).one()
+        assert row.normalized_name == "ReapplyTool"
+    finally:
+        db.close()
+
+    status_resp = client.get("/api/v1/inventory/normalization/reapply", headers=auth_headers)
+    assert status_resp.status_code == 200
+    assert status_resp.json()["state"] == "done"
+    assert status_resp.json()["rows_updated"] >= 1
+
+    started = client.post("/api/v1/inventory/normalization/reapply", headers=auth_headers)
+    assert started.status_code == 202
+    assert normalization_reapply.wait(30)
+    client.delete(f"/api/v1/inventory/normalization/{resp.json()['id']}", headers=auth_headers)
+    assert normalization_reapply.wait(30)
+
+
+def test_software_catalog_is_maintained_incrementally(client, auth_headers):
+    from app.database import SessionLocal
+    from app.models import SoftwareCatalogEntry, SoftwareCatalogVariant
+
+    def _catalog():
+        db = SessionLocal()
+        try:
+            entries = {
+                e.name: (e.total_agents, e.windows_agents, e.linux_agents, e.install_rows, e.windows_rows, e.linux_rows)
+                for e in db.query(SoftwareCatalogEntry).filter(SoftwareCatalogEntry.name.like("CatalogTest%"))
+            }
+            variants = {
+                (v.name, v.platform, v.software_name, v.software_version, v.publisher): v.install_rows
+                for v in db.query(SoftwareCatalogVariant).filter(SoftwareCatalogVariant.name.like("CatalogTest%"))
+            }
+            return entries, variants
+        finally:
+            db.close()
+
+    win_uid, _s, win_headers = _register_agent(client)
+    lin_uid = str(uuid.uuid4())
+    reg = client.post("/api/v1/agent/register", json={
+        "uuid": lin_uid, "hostname": "lin-pc", "os_version": "Ubuntu 22.04", "agent_version": "1.0.0", "platform": "linux",
+    })
+    lin_headers = {"X-Agent-UUID": lin_uid, "X-Agent-Secret": reg.json()["secret_key"]}
+
+    client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "cat-w1", "software_count": 3,
+        "items": [
+            {"name": "CatalogTest Shared", "version": "1.0", "publisher": "Acme"},
+            {"name": "CatalogTest Shared", "version": "1.0", "architecture": "x86"},
+            {"name": "CatalogTest Win Only", "version": "7"},
+        ],
+    }, headers=win_headers)
+    client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "cat-l1", "software_count": 1,
+        "items": [{"name": "CatalogTest Shared", "version": "2.0"}],
+    }, headers=lin_headers)
+    # Resubmit (one removal) and a delta (one change, one install).
+    client.post("/api/v1/agent/inventory", json={
+        "inventory_hash": "cat-w2", "software_count": 2,
+        "items": [
+            {"name": "CatalogTest Shared", "version": "1.0", "publisher": "Acme"},
+            {"name": "CatalogTest Win Only", "version": "7"},
+        ],
+    }, headers=win_headers)
+    delta = client.post("/api/v1/agent/inventory/delta", json={
+        "base_hash": "cat-l1", "new_hash": "cat-l2", "software_count": 2,
+        "added": [{"name": "CatalogTest Linux Only", "version": "0.9"}],
+        "changed": [{"name": "CatalogTest Shared", "version": "2.1"}],
+    }, headers=lin_headers)
+    assert delta.json()["status"] == "ok"
+
+    entries, variants = _catalog()
+    assert entries["CatalogTest Shared"] == (2, 1, 1, 2, 1, 1)
+    assert entries["CatalogTest Win Only"] == (1, 1, 0, 1, 1, 0)
+    assert entries["CatalogTest Linux Only"] == (1, 0, 1, 1, 0, 1)
+    assert variants[("CatalogTest Shared", "linux", "CatalogTest Shared", "2.1", "")] == 1
+
+    catalog = client.get("/api/v1/sam/catalog?search=CatalogTest&platform=linux", headers=auth_headers)
+    assert catalog.status_code == 200
+    by_name = {i["name"]: i for i in catalog.json()["items"]}
+    assert set(by_name) == {"CatalogTest Shared", "CatalogTest Linux Only"}
+    assert by_name["CatalogTest Shared"]["versions"] == ["2.1"]
+
+    rebuilt = client.post("/api/v1/inventory/catalog/rebuild", headers=auth_headers)
+    assert rebuilt.status_code == 200
+    assert _catalog() == (entries, variants)
+
+    assert client.delete(f"/api/v1/agents/{lin_uid}", headers=auth_headers).status_code == 200
+    entries, _variants = _catalog()
+    assert entries["CatalogTest Shared"] == (1, 1, 0, 1, 1, 0)
+    assert "CatalogTest Linux Only" not in entries
+
+    # Platform change re-buckets the agent's rows.
+    hb = client.post("/api/v1/agent/heartbeat", json={"hostname": "test-pc", "platform": "linux"}, headers=win_headers)
+    assert hb.status_code == 200
+    entries, _variants = _catalog()
+    assert entries["CatalogTest Shared"] == (1, 0, 1, 1, 0, 1)
+    assert entries["CatalogTest Win Only"] == (1, 0, 1, 1, 0, 1)
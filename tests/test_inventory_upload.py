@@ -0,0 +1,94 @@
+"""Tests for chunked WS inventory uploads (no database)."""
+
+import hashlib
+import json
+
+import pytest
+
+from app.services import inventory_upload as iu
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    iu.clear_all()
+    yield
+    iu.clear_all()
+
+
+def _items(n: int) -> list[dict]:
+    return [{"name": f"App {i}", "version": f"1.{i}", "publisher": "Contoso"} for i in range(n)]
+
+
+def _hash(items: list[dict]) -> str:
+    return hashlib.sha256(json.dumps(items, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def test_chunks_hash_to_the_whole_list():
+    items = _items(7)
+    upload = iu.ChunkedInventoryUpload(_hash(items), len(items))
+    for seq, offset in enumerate(range(0, 7, 3)):
+        upload.add_chunk(seq, items[offset : offset + 3])
+    stored = upload.finish(_hash(items))
+    assert [item.name for item in stored] == [item["name"] for item in items]
+    assert iu.stats()["completed"] == 1 and iu.stats()["chunks"] == 3
+
+
+def test_empty_inventory_is_accepted():
+    upload = iu.ChunkedInventoryUpload(_hash([]), 0)
+    assert upload.finish() == []
+
+
+def test_hash_mismatch_is_rejected():
+    items = _items(2)
+    upload = iu.ChunkedInventoryUpload(_hash(items), 2)
+    upload.add_chunk(0, [items[0], {**items[1], "version": "9.9"}])
+    with pytest.raises(iu.InventoryUploadError) as err:
+        upload.finish()
+    assert err.value.code == "hash_mismatch"
+
+
+@pytest.mark.parametrize(
+    "seq, chunk, code",
+    [
+        (1, _items(1), "out_of_order"),
+        (0, _items(3), "too_large"),
+        (0, [{"version": "1.0"}], "invalid"),
+        (0, "not-a-list", "invalid"),
+    ],
+)
+def test_bad_chunks_are_rejected(seq, chunk, code):
+    upload = iu.ChunkedInventoryUpload("abc", 2)
+    with pytest.raises(iu.InventoryUploadError) as err:
+        upload.add_chunk(seq, chunk)
+    assert err.value.code == code
+
+
+def test_missing_items_and_oversized_announcements():
+    upload = iu.ChunkedInventoryUpload("abc", 2)
+    upload.add_chunk(0, _items(1))
+    with pytest.raises(iu.InventoryUploadError) as err:
+        upload.finish()
+    assert err.value.code == "incomplete"
+    with pytest.raises(iu.InventoryUploadError) as err:
+        iu.ChunkedInventoryUpload("abc", iu.MAX_ITEMS + 1)
+    assert err.value.code == "too_large"
+
+
+def test_stale_upload_times_out():
+    items = _items(2)
+    upload = iu.ChunkedInventoryUpload(_hash(items), 2)
+    upload.add_chunk(0, items[:1])
+    upload.started_at -= iu.UPLOAD_TIMEOUT_SEC + 1
+    with pytest.raises(iu.InventoryUploadError) as err:
+        upload.add_chunk(1, items[1:])
+    assert err.value.code == "timeout"
+    assert iu.stats()["timeouts"] == 1
+
+
+def test_chunk_window_spans_uploads_and_resets_each_minute():
+    window = iu.ChunkWindow()
+    assert all(window.allow() for _ in range(iu.MAX_CHUNKS_PER_MINUTE))
+    assert window.allow() is False
+    assert iu.stats()["chunk_rate_limited"] == 1
+    window.window_start -= 60
+    assert window.allow() is True
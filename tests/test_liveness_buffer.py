@@ -0,0 +1,93 @@
+"""Tests for the write-behind agent liveness buffer."""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.services import liveness_buffer
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    liveness_buffer.clear_all()
+    yield
+    liveness_buffer.clear_all()
+
+
+class _FailingSession:
+    def execute(self, *args, **kwargs):
+        raise RuntimeError("db down")
+
+    def commit(self):
+        raise AssertionError("commit must not be reached")
+
+    def rollback(self):
+        pass
+
+
+def test_updates_coalesce_per_agent():
+    t0 = datetime.now(timezone.utc)
+    liveness_buffer.record("a1", t0, uptime_sec=10, disk_free_gb=50)
+    liveness_buffer.record("a1", t0 + timedelta(seconds=30), uptime_sec=40)
+    liveness_buffer.record("a2", t0)
+    assert liveness_buffer.pending_count() == 2
+    assert liveness_buffer.pending_last_seen("a1") == t0 + timedelta(seconds=30)
+    stats = liveness_buffer.stats()
+    assert stats["recorded"] == 3
+    assert stats["coalesced"] == 1
+
+
+def test_older_timestamp_does_not_regress():
+    t0 = datetime.now(timezone.utc)
+    liveness_buffer.record("a1", t0)
+    liveness_buffer.record("a1", t0 - timedelta(seconds=5))
+    assert liveness_buffer.pending_last_seen("a1") == t0
+
+
+def test_discard_removes_pending():
+    liveness_buffer.record("a1", datetime.now(timezone.utc))
+    liveness_buffer.discard("a1")
+    assert liveness_buffer.pending_last_seen("a1") is None
+    assert liveness_buffer.flush(_FailingSession()) == 0
+
+
+def test_failed_flush_requeues_batch():
+    t0 = datetime.now(timezone.utc)
+    liveness_buffer.record("a1", t0, uptime_sec=10)
+    assert liveness_buffer.flush(_FailingSession()) == 0
+    assert liveness_buffer.pending_last_seen("a1") == t0
+    assert liveness_buffer.stats()["flush_errors"] == 1
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.params = []
+
+    def execute(self, statement, params=None):
+        self.params.append(params)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+def test_snapshot_seen_stamps_coalesce_and_flush():
+    t0 = datetime.now(timezone.utc)
+    liveness_buffer.record("a1", t0, sessions_seen_at=t0, remote_support_seen_at=t0)
+    liveness_buffer.record("a1", t0 + timedelta(seconds=30))
+    session = _RecordingSession()
+    assert liveness_buffer.flush(session) == 1
+    params = session.params[0]
+    assert params["t0"] == t0 + timedelta(seconds=30)
+    assert params["s0"] == t0
+    assert params["r0"] == t0
+
+
+def test_unstamped_update_leaves_snapshot_columns_alone():
+    liveness_buffer.record("a1", datetime.now(timezone.utc))
+    session = _RecordingSession()
+    liveness_buffer.flush(session)
+    assert session.params[0]["s0"] is None
+    assert session.params[0]["r0"] is None
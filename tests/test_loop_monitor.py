@@ -0,0 +1,34 @@
+"""Tests for the event-loop lag sampler."""
+
+import asyncio
+import time
+
+import pytest
+
+from app.services import loop_monitor
+
+
+@pytest.fixture(autouse=True)
+def _clean(monkeypatch):
+    loop_monitor.clear_all()
+    monkeypatch.setattr(loop_monitor, "SAMPLE_INTERVAL_SEC", 0.01)
+    yield
+    loop_monitor.clear_all()
+
+
+def test_blocking_call_shows_up_as_lag():
+    async def scenario():
+        loop_monitor.start()
+        await asyncio.sleep(0.05)
+        time.sleep(0.1)  # stall the loop like a sync DB call would
+        await asyncio.sleep(0.05)
+        await loop_monitor.stop()
+
+    asyncio.run(scenario())
+    out = loop_monitor.stats()
+    assert out["samples"] > 0
+    assert out["max_ms"] >= 50.0
+
+
+def test_stats_empty():
+    assert loop_monitor.stats() == {"current_ms": 0.0, "p99_ms": 0.0, "max_ms": 0.0, "samples": 0}
@@ -0,0 +1,104 @@
+"""Tests for per-route SQL instrumentation and the Prometheus renderer."""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, text
+
+from app.services import metrics_service as metrics
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    metrics.reset()
+    yield
+    metrics.reset()
+
+
+@pytest.fixture()
+def sql_engine():
+    eng = create_engine("sqlite://")
+    metrics.instrument_engine(eng)
+    yield eng
+    eng.dispose()
+
+
+def _app(sql_engine) -> FastAPI:
+    app = FastAPI()
+    app.add_middleware(metrics.RequestMetricsMiddleware)
+
+    @app.get("/items/{item_id}")
+    def read_item(item_id: int):
+        with sql_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT 2"))
+        return {"id": item_id}
+
+    return app
+
+
+def test_sync_route_sql_is_attributed_to_route_template(sql_engine):
+    client = TestClient(_app(sql_engine))
+    assert client.get("/items/1").status_code == 200
+    assert client.get("/items/2").status_code == 200
+    body = metrics.render()
+    assert 'appcenter_db_statements_total{route="/items/{item_id}"} 4' in body
+    assert 'appcenter_http_request_db_statements_count{route="/items/{item_id}"} 2' in body
+    assert 'appcenter_http_requests_total{route="/items/{item_id}",method="GET",status="200"} 2' in body
+
+
+def test_unmatched_path_uses_single_label(sql_engine):
+    client = TestClient(_app(sql_engine))
+    client.get("/nope/1")
+    client.get("/nope/2")
+    assert 'appcenter_http_requests_total{route="unmatched",method="GET",status="404"} 2' in metrics.render()
+
+
+def test_timed_pool_checkout_under_deferred_request_scope():
+    eng = create_engine("sqlite://", poolclass=metrics.TimedQueuePool)
+    metrics.instrument_engine(eng)
+    scope = metrics._Scope(route="/x", deferred=True)
+    token = metrics._current.set(scope)
+    try:
+        with eng.connect() as conn:
+            assert conn.execute(text("SELECT 1")).scalar() == 1
+    finally:
+        metrics._current.reset(token)
+        eng.dispose()
+    assert scope.checkouts == 1
+    assert "appcenter_db_pool_checkout_wait_seconds_count" not in metrics.render()
+
+
+def test_timed_pool_wait_is_folded_into_the_request():
+    eng = create_engine("sqlite://", poolclass=metrics.TimedQueuePool)
+    metrics.instrument_engine(eng)
+    client = TestClient(_app(eng))
+    try:
+        assert client.get("/items/1").status_code == 200
+    finally:
+        eng.dispose()
+    body = metrics.render()
+    assert 'appcenter_db_statements_total{route="/items/{item_id}"} 2' in body
+    assert 'appcenter_db_pool_checkout_wait_seconds_count{route="/items/{item_id}"} 1' in body
+
+
+def test_timed_job_labels_sql_and_records_duration(sql_engine):
+    @metrics.timed_job
+    def nightly_job():
+        with sql_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+    nightly_job()
+    body = metrics.render()
+    assert 'appcenter_db_statements_total{route="job:nightly_job"} 1' in body
+    assert 'appcenter_scheduler_job_duration_seconds_count{job="nightly_job"} 1' in body
+
+
+def test_histogram_buckets_are_cumulative_and_gauges_rendered():
+    metrics._observe("appcenter_http_request_db_statements", ("/x",), metrics.STATEMENT_BUCKETS, 3)
+    metrics._observe("appcenter_http_request_db_statements", ("/x",), metrics.STATEMENT_BUCKETS, 200)
+    body = metrics.render({"appcenter_ws_agent_connections": ("help", 7)})
+    assert 'appcenter_http_request_db_statements_bucket{route="/x",le="3"} 1' in body
+    assert 'appcenter_http_request_db_statements_bucket{route="/x",le="+Inf"} 2' in body
+    assert "# TYPE appcenter_ws_agent_connections gauge" in body
+    assert "appcenter_ws_agent_connections 7" in body
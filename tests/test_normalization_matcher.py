@@ -0,0 +1,60 @@
+"""Tests for the compiled normalization rule matcher (checked against the rule-by-rule scan)."""
+
+import random
+
+from app.services import inventory_service
+from app.services.normalization_matcher import CompiledMatcher
+
+
+def _scan(rules, key):
+    # The previous implementation: rules by ascending id, first match wins.
+    for rule_id, match_type, pattern, name in sorted(rules):
+        if match_type == "exact" and key == pattern:
+            return name
+        if match_type == "contains" and pattern in key:
+            return name
+        if match_type == "starts_with" and key.startswith(pattern):
+            return name
+    return None
+
+
+def test_lowest_id_wins_across_match_types():
+    rules = [
+        (5, "exact", "google chrome", "Chrome (exact)"),
+        (3, "starts_with", "google", "Google"),
+        (4, "contains", "chrome", "Chrome"),
+        (9, "contains", "", "Anything"),
+    ]
+    matcher = CompiledMatcher(rules)
+    assert matcher.match("google chrome") == "Google"
+    assert matcher.match("chrome beta") == "Chrome"
+    assert matcher.match("notepad++") == "Anything"
+    assert CompiledMatcher(rules[:3]).match("notepad++") is None
+
+
+def test_overlapping_contains_patterns_use_failure_links():
+    rules = [(2, "contains", "she", "She"), (1, "contains", "hers", "Hers"), (3, "contains", "his", "His")]
+    matcher = CompiledMatcher(rules)
+    assert matcher.match("ushers") == "Hers"
+    assert matcher.match("ushe") == "She"
+    assert matcher.match("this") == "His"
+
+
+def test_matches_reference_scan_on_random_rules():
+    rng = random.Random(7)
+    alphabet = "abc "
+    for _ in range(50):
+        rules = []
+        for rule_id in rng.sample(range(1, 200), 12):
+            pattern = "".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4)))
+            rules.append((rule_id, rng.choice(["exact", "starts_with", "contains"]), pattern, f"r{rule_id}"))
+        matcher = CompiledMatcher(rules)
+        for _ in range(40):
+            key = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 10)))
+            assert matcher.match(key) == _scan(rules, key), (rules, key)
+
+
+def test_apply_normalization_falls_back_to_version_stripping():
+    matcher = CompiledMatcher([(1, "contains", "visual studio code", "VS Code")])
+    assert inventory_service._apply_normalization(matcher, "Microsoft Visual Studio Code") == "VS Code"
+    assert inventory_service._apply_normalization(matcher, "7-Zip 23.01") == "7-Zip"
@@ -0,0 +1,117 @@
+"""Tests for the background normalization reapply job (DB work replaced by a fake)."""
+
+import threading
+
+import pytest
+
+from app.services import inventory_service, normalization_matcher, normalization_reapply, software_catalog
+
+
+def test_request_runs_in_background_and_coalesces_reruns(monkeypatch):
+    normalization_reapply.clear_all()
+    release = threading.Event()
+    entered = threading.Event()
+    calls = []
+
+    def fake_reapply(db, progress=None):
+        calls.append(1)
+        entered.set()
+        progress(10, 4)
+        release.wait(5)
+        return 4
+
+    monkeypatch.setattr(inventory_service, "reapply_normalization_rules", fake_reapply)
+
+    first = normalization_reapply.request()
+    assert first["state"] in ("queued", "running")
+    assert entered.wait(5)
+    running = normalization_reapply.status()
+    assert running["state"] == "running"
+    assert running["names_done"] == 10
+
+    # Two more edits while running -> exactly one extra pass.
+    normalization_reapply.request()
+    assert normalization_reapply.request()["rerun_pending"] is True
+    release.set()
+    assert normalization_reapply.wait(5)
+
+    done = normalization_reapply.status()
+    assert len(calls) == 2
+    assert done["state"] == "done"
+    assert done["runs"] == 2
+    assert done["rows_updated"] == 4
+    assert done["rerun_pending"] is False
+    normalization_reapply.clear_all()
+
+
+def test_failed_run_is_reported(monkeypatch):
+    normalization_reapply.clear_all()
+
+    def broken(db, progress=None):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(inventory_service, "reapply_normalization_rules", broken)
+    normalization_reapply.request()
+    assert normalization_reapply.wait(5)
+    out = normalization_reapply.status()
+    assert out["state"] == "failed"
+    assert out["error"] == "boom"
+    normalization_reapply.clear_all()
+
+
+class _Result:
+    rowcount = 3
+
+
+class _Query:
+    def __init__(self, session):
+        self.session = session
+
+    def filter(self, *args):
+        return self
+
+    def group_by(self, *args):
+        return self
+
+    def order_by(self, *args):
+        return self
+
+    def limit(self, *args):
+        return self
+
+    def all(self):
+        self.session.pages += 1
+        if self.session.pages > 1:
+            raise RuntimeError("connection lost")
+        return [("Old Name ", None, None, 1)]
+
+
+class _PagedSession:
+    def __init__(self):
+        self.pages = 0
+        self.commits = 0
+
+    def query(self, *args):
+        return _Query(self)
+
+    def execute(self, *args, **kwargs):
+        return _Result()
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def test_failed_reapply_still_rebuilds_catalog_after_committed_pages(monkeypatch):
+    rebuilt = []
+    monkeypatch.setattr(normalization_matcher, "get_matcher", lambda db: None)
+    monkeypatch.setattr(inventory_service, "_apply_normalization", lambda matcher, name: name)
+    monkeypatch.setattr(software_catalog, "rebuild", lambda db: rebuilt.append(db))
+
+    session = _PagedSession()
+    with pytest.raises(RuntimeError):
+        inventory_service.reapply_normalization_rules(session)
+    assert session.commits == 1
+    assert rebuilt == [session]
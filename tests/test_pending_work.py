@@ -0,0 +1,54 @@
+"""Tests for the pending-work set that lets idle heartbeats skip work queries."""
+
+from datetime import timedelta
+
+import pytest
+
+from app.services import pending_work_service as pw
+
+
+class _Collector:
+    def __init__(self):
+        self.added = []
+
+    def add_all(self, rows):
+        self.added.extend(rows)
+
+
+@pytest.fixture(autouse=True)
+def _clean(monkeypatch):
+    pw.clear_all()
+    monkeypatch.setattr(pw, "_sync", lambda db: None)
+    yield
+    pw.clear_all()
+
+
+def test_unmarked_agent_is_skipped():
+    assert pw.has_pending(None, "a1") is False
+    assert pw.stats()["skips"] == 1
+
+
+def test_mark_persists_and_flags_agent():
+    db = _Collector()
+    pw.mark(db, ["a1", "a1", "a2"], pw.KIND_DEPLOYMENT)
+    assert [row.agent_uuid for row in db.added] == ["a1", "a2"]
+    assert pw.has_pending(None, "a1") is True
+    assert pw.has_pending(None, "a2") is True
+
+
+def test_clear_after_check_that_started_later():
+    pw.mark(_Collector(), ["a1"], pw.KIND_STORE_INSTALL)
+    checked_at = pw._utcnow() + timedelta(seconds=pw.CLEAR_MARGIN_SEC + 1)
+    pw.clear("a1", checked_at)
+    assert pw.has_pending(None, "a1") is False
+
+
+def test_mark_inside_margin_survives_clear():
+    pw.mark(_Collector(), ["a1"], pw.KIND_ANNOUNCEMENT)
+    pw.clear("a1", pw._utcnow())
+    assert pw.has_pending(None, "a1") is True
+
+
+def test_full_recheck_safety_net(monkeypatch):
+    monkeypatch.setattr(pw, "FULL_RECHECK_SEC", 0.0)
+    assert pw.has_pending(None, "a1") is True
@@ -6,6 +6,7 @@ from fastapi.testclient import TestClient
 
 from app.database import SessionLocal
 from app.models import RemoteSupportSession, User
+from app.services import pending_work_service
 from tests.test_phase5_api import _register_agent
 
 
@@ -74,3 +75,44 @@ def test_agent_approve_returns_helper_flags_and_operator_name(
     assert body["helper_connection_overlay_enabled"] is True
     assert body["helper_user_display_name"] == "admin"
     assert body["vnc_password"] == "test-pass-123"
+
+
+def test_admin_end_is_delivered_on_next_heartbeat(client: TestClient, auth_headers: dict[str, str]) -> None:
+    agent_uuid = "agent-rs-admin-end-1"
+    agent_headers = _register_agent(client, uuid=agent_uuid)
+
+    with SessionLocal() as db:
+        admin = db.query(User).filter(User.username == "admin").first()
+        assert admin is not None
+        session = RemoteSupportSession(
+            agent_uuid=agent_uuid,
+            admin_user_id=admin.id,
+            status="active",
+            reason="Admin end test",
+            requested_at=datetime.now(timezone.utc),
+            connected_at=datetime.now(timezone.utc),
+            max_duration_min=60,
+        )
+        db.add(session)
+        db.commit()
+        db.refresh(session)
+        session_id = session.id
+
+    # Idle agent: the heartbeat skips the work queries until something marks it.
+    pending_work_service.forget(agent_uuid)
+    pending_work_service.clear(
+        agent_uuid, datetime.now(timezone.utc) + timedelta(seconds=pending_work_service.CLEAR_MARGIN_SEC)
+    )
+    with SessionLocal() as db:
+        assert pending_work_service.has_pending(db, agent_uuid) is False
+
+    end_resp = client.post(f"/api/v1/remote-support/sessions/{session_id}/end", headers=auth_headers)
+    assert end_resp.status_code == 200
+
+    hb = client.post(
+        "/api/v1/agent/heartbeat",
+        headers=agent_headers,
+        json={"hostname": "PC-RS-END", "apps_changed": False, "installed_apps": []},
+    )
+    assert hb.status_code == 200
+    assert hb.json()["remote_support_end"] == {"session_id": session_id}
@@ -0,0 +1,42 @@
+"""Tests for the in-process settings snapshot accessors."""
+
+from types import MappingProxyType
+
+from app.services.settings_snapshot_service import SettingsSnapshot
+
+
+def _snap(**values: str) -> SettingsSnapshot:
+    return SettingsSnapshot(version=1, values=MappingProxyType(dict(values)))
+
+
+def test_get_str_default_only_for_missing_key():
+    snap = _snap(a="x", empty="")
+    assert snap.get_str("a", "d") == "x"
+    assert snap.get_str("empty", "d") == ""
+    assert snap.get_str("missing", "d") == "d"
+
+
+def test_get_bool_and_int():
+    snap = _snap(on="Yes", off="false", n="42", bad="abc")
+    assert snap.get_bool("on") is True
+    assert snap.get_bool("off", default=True) is False
+    assert snap.get_bool("missing", default=True) is True
+    assert snap.get_int("n", 0) == 42
+    assert snap.get_int("bad", 7) == 7
+    assert snap.get_int("n", 0, maximum=10) == 10
+    assert snap.get_int("n", 0, minimum=100) == 100
+
+
+def test_get_map_fills_missing_keys():
+    snap = _snap(a="1")
+    assert snap.get_map(["a", "b"]) == {"a": "1", "b": ""}
+
+
+def test_values_are_read_only():
+    snap = _snap(a="1")
+    try:
+        snap.values["a"] = "2"  # type: ignore[index]
+    except TypeError:
+        pass
+    else:
+        raise AssertionError("snapshot values must be immutable")
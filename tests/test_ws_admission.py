@@ -0,0 +1,50 @@
+"""Tests for agent WS resume tokens and the accept token bucket."""
+
+import pytest
+
+from app.services import ws_admission
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    ws_admission.clear_all()
+    yield
+    ws_admission.clear_all()
+
+
+def test_bucket_caps_burst_then_refills(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(ws_admission.time, "monotonic", lambda: clock[0])
+    ws_admission.clear_all()
+    ws_admission.configure(rate_per_sec=10, burst=5)
+    assert [ws_admission.try_admit() for _ in range(6)] == [True] * 5 + [False]
+    clock[0] += 0.2  # two tokens
+    assert [ws_admission.try_admit() for _ in range(3)] == [True, True, False]
+    stats = ws_admission.stats()
+    assert stats["admitted"] == 7 and stats["rejected_busy"] == 2
+
+
+def test_zero_rate_disables_admission_control():
+    ws_admission.configure(rate_per_sec=0, burst=1)
+    assert all(ws_admission.try_admit() for _ in range(50))
+
+
+def test_resume_token_round_trip_and_binding():
+    config = {"bandwidth_limit_kbps": 1024, "store_tray_enabled": False}
+    hello = {"hostname": "pc-1", "platform": "windows"}
+    token = ws_admission.issue_resume_token("a1", "windows", config, hello, ttl_sec=600)
+
+    claims = ws_admission.read_resume_token(token, "a1")
+    assert claims["cfg"] == ws_admission.config_hash(dict(reversed(list(config.items()))))
+    assert claims["hh"] == ws_admission.hello_hash(hello)
+    assert claims["pf"] == "windows"
+    assert ws_admission.read_resume_token(token, "a2") is None
+    assert ws_admission.read_resume_token(token + "x", "a1") is None
+    assert ws_admission.read_resume_token(None, "a1") is None
+    assert ws_admission.stats()["resume_invalid"] == 2
+
+
+def test_changed_config_or_hello_changes_hash():
+    assert ws_admission.config_hash({"a": 1}) != ws_admission.config_hash({"a": 2})
+    assert ws_admission.hello_hash(None) == ws_admission.hello_hash({})
+    assert ws_admission.hello_hash({"ip_address": "10.0.0.1"}) != ws_admission.hello_hash({"ip_address": "10.0.0.2"})
@@ -0,0 +1,92 @@
+"""Tests for the per-agent outbound queue (single writer, coalescing, bounds)."""
+
+import asyncio
+import json
+
+from app.services import ws_manager as wsm
+
+
+class _SlowAgentWS:
+    def __init__(self, delay: float = 0.01):
+        self.delay = delay
+        self.sent = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def send_text(self, text: str) -> None:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.sent.append(json.loads(text))
+        self.in_flight -= 1
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        pass
+
+
+def test_wake_signals_coalesce_and_sends_never_overlap():
+    async def scenario():
+        mgr = wsm.WSManager()
+        mgr.set_loop(asyncio.get_running_loop())
+        agent_ws = _SlowAgentWS()
+        await mgr.register_agent(agent_ws, "a1")
+        await mgr.send_to_agent("a1", wsm.make_message("server.task", {"n": 1}))
+        for _ in range(10):  # e.g. one wake per seeded app of a deployment
+            mgr.schedule_send_to_agent("a1", wsm.make_message("server.signal", {"reason": "wake"}))
+        await asyncio.sleep(0.1)
+        stats = mgr.agent_send_stats()
+        await mgr.close_all()
+        return agent_ws, stats
+
+    agent_ws, stats = asyncio.run(scenario())
+    assert [m["type"] for m in agent_ws.sent] == ["server.task", "server.signal"]
+    assert agent_ws.max_in_flight == 1
+    assert stats["coalesced"] == 9
+    assert stats["sent"] == 2
+
+
+def test_queued_config_patches_merge():
+    async def scenario():
+        mgr = wsm.WSManager()
+        agent_ws = _SlowAgentWS()
+        await mgr.register_agent(agent_ws, "a1")
+        await mgr.send_to_agent("a1", wsm.make_message("server.task", {"n": 1}))
+        await mgr.send_to_agent("a1", wsm.make_message("server.config.patch", {"changes": {"a": "1", "b": "1"}}))
+        await mgr.send_to_agent("a1", wsm.make_message("server.config.patch", {"changes": {"b": "2"}}))
+        await asyncio.sleep(0.1)
+        await mgr.close_all()
+        return agent_ws.sent
+
+    sent = asyncio.run(scenario())
+    assert [m["type"] for m in sent] == ["server.task", "server.config.patch"]
+    assert sent[1]["payload"]["changes"] == {"a": "1", "b": "2"}
+
+
+def test_full_queue_drops_instead_of_growing(monkeypatch):
+    monkeypatch.setattr(wsm, "AGENT_SEND_QUEUE_MAX", 3)
+
+    async def scenario():
+        mgr = wsm.WSManager()
+        await mgr.register_agent(_SlowAgentWS(delay=1.0), "a1")
+        results = [await mgr.send_to_agent("a1", wsm.make_message("server.task", {"n": i})) for i in range(6)]
+        stats = mgr.agent_send_stats()
+        await mgr.close_all()
+        return results, stats
+
+    results, stats = asyncio.run(scenario())
+    assert results == [True, True, True, False, False, False]
+    assert stats["dropped"] == 3
+    assert stats["queue_depth_max"] == 3
+
+
+def test_send_is_pinned_to_the_given_connection():
+    async def scenario():
+        mgr = wsm.WSManager()
+        old_ws, new_ws = _SlowAgentWS(), _SlowAgentWS()
+        await mgr.register_agent(old_ws, "a1")
+        await mgr.register_agent(new_ws, "a1")
+        stale = await mgr.send_to_agent("a1", wsm.make_message("server.hello"), ws=old_ws)
+        await mgr.close_all()
+        return stale
+
+    assert asyncio.run(scenario()) is False
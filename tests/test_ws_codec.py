@@ -0,0 +1,79 @@
+"""Tests for agent WS codec negotiation and envelope helpers."""
+
+import asyncio
+import json
+
+import pytest
+
+from app.services import ws_codec
+from app.services import ws_manager as wsm
+
+
+@pytest.fixture(autouse=True)
+def _clean():
+    ws_codec.clear_all()
+    yield
+    ws_codec.clear_all()
+
+
+def test_old_agents_and_unknown_codecs_fall_back_to_json():
+    assert ws_codec.negotiate(None) == ws_codec.CODEC_JSON
+    assert ws_codec.negotiate("msgpack") == ws_codec.CODEC_JSON
+    assert ws_codec.negotiate(["cbor"]) == ws_codec.CODEC_JSON
+    assert ws_codec.negotiate(["cbor", "json"]) == ws_codec.CODEC_JSON
+
+
+def test_msgpack_offered_only_when_installed(monkeypatch):
+    monkeypatch.setattr(ws_codec, "msgpack", None)
+    assert ws_codec.available() == [ws_codec.CODEC_JSON]
+    assert ws_codec.negotiate(["msgpack", "json"]) == ws_codec.CODEC_JSON
+
+
+def test_exceeds_counts_utf8_bytes_near_the_limit():
+    assert ws_codec.exceeds("a" * 10, 40) is False
+    assert ws_codec.exceeds("ğ" * 10, 20) is False
+    assert ws_codec.exceeds("ğ" * 11, 20) is True
+    assert ws_codec.exceeds(b"x" * 21, 20) is True
+
+
+def test_message_ids_are_unique_and_timestamps_cached():
+    first, second = wsm.make_message("server.ping"), wsm.make_message("server.ping")
+    assert first["id"] != second["id"]
+    assert first["id"].startswith("msg_")
+    assert first["ts"].endswith("Z") and len(first["ts"]) == 20
+
+
+def test_json_traffic_is_counted_per_codec():
+    frame = ws_codec.encode(ws_codec.CODEC_JSON, {"type": "server.ping", "payload": {}})
+    assert isinstance(frame, str)
+    assert ws_codec.decode(ws_codec.CODEC_JSON, frame)["type"] == "server.ping"
+    ws_codec.note_connection(ws_codec.CODEC_JSON, deflate=True)
+    ws_codec.note_connection_closed(ws_codec.CODEC_JSON, 1800)
+    stats = ws_codec.stats()["codecs"]["json"]
+    assert stats["frames_out"] == 1 and stats["frames_in"] == 1
+    assert stats["deflate_connections"] == 1
+    assert stats["bytes_per_agent_hour"] == 2 * len(frame) * 2
+
+
+def test_msgpack_connection_gets_binary_frames():
+    msgpack = pytest.importorskip("msgpack")
+
+    class _AgentWS:
+        def __init__(self):
+            self.frames = []
+
+        async def send_bytes(self, data):
+            self.frames.append(data)
+
+    async def scenario():
+        mgr = wsm.WSManager()
+        agent_ws = _AgentWS()
+        await mgr.register_agent(agent_ws, "a1", codec=ws_codec.CODEC_MSGPACK)
+        await mgr.send_to_agent("a1", {"type": "server.signal", "payload": {"n": 1}})
+        await asyncio.sleep(0.01)
+        await mgr.close_all()
+        return agent_ws.frames
+
+    frames = asyncio.run(scenario())
+    assert msgpack.unpackb(frames[0], raw=False) == {"type": "server.signal", "payload": {"n": 1}}
+    assert json.dumps(ws_codec.stats()["codecs"]["msgpack"])  # serializable for /ws/stats
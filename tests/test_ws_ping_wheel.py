@@ -0,0 +1,62 @@
+"""Tests for the shared agent ping wheel."""
+
+import asyncio
+import json
+
+from app.services import ws_manager as wsm
+
+
+class _AgentWS:
+    def __init__(self, manager=None, uuid: str = "", answers: bool = True):
+        self.manager = manager
+        self.uuid = uuid
+        self.answers = answers
+        self.pings = 0
+        self.closed_with = None
+
+    async def send_text(self, text: str) -> None:
+        assert json.loads(text)["type"] == "server.ping"
+        self.pings += 1
+        if self.answers:
+            self.manager.get_agent(self.uuid).last_pong = wsm.time.monotonic()
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.closed_with = (code, reason)
+
+
+def test_agents_are_spread_over_slots():
+    async def scenario():
+        mgr = wsm.WSManager()
+        mgr.configure_ping(10, 5)
+        for i in range(25):
+            await mgr.register_agent(_AgentWS(mgr, f"a{i}"), f"a{i}")
+        stats = mgr.ping_stats()
+        await mgr.close_all()
+        return stats
+
+    stats = asyncio.run(scenario())
+    assert stats["slots"] == 10
+    assert stats["max_per_slot"] == 3
+
+
+def test_missing_pong_closes_connection_and_unregisters(monkeypatch):
+    monkeypatch.setattr(wsm, "PING_TICK_SEC", 0.01)
+
+    async def scenario():
+        mgr = wsm.WSManager()
+        mgr.configure_ping(0.05, 0.02)
+        alive = _AgentWS(mgr, "alive")
+        dead = _AgentWS(mgr, "dead", answers=False)
+        await mgr.register_agent(alive, "alive")
+        await mgr.register_agent(dead, "dead")
+        await asyncio.sleep(0.3)
+        result = (mgr.is_agent_connected("alive"), mgr.is_agent_connected("dead"), mgr.ping_stats())
+        await mgr.close_all()
+        return alive, dead, result
+
+    alive, dead, (alive_connected, dead_connected, stats) = asyncio.run(scenario())
+    assert alive_connected is True
+    assert alive.pings >= 2
+    assert dead_connected is False
+    assert dead.closed_with == (4008, "pong_timeout")
+    assert stats["pong_timeouts"] == 1
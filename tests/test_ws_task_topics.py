@@ -0,0 +1,37 @@
+"""Tests for server.task.update topic resolution on the agent WebSocket (no database)."""
+
+import asyncio
+
+import pytest
+
+from app.api.v1 import agent_ws
+from app.services import event_bus
+from app.services.ws_manager import ws_manager
+
+
+@pytest.fixture(autouse=True)
+def lookups(monkeypatch):
+    agent_ws._task_deployments.clear()
+    lookups = []
+
+    async def fake_run_agent_db(fn, task_id):
+        lookups.append(task_id)
+        return 7
+
+    monkeypatch.setattr(agent_ws, "run_agent_db", fake_run_agent_db)
+    monkeypatch.setattr(ws_manager, "has_topic_subscribers", lambda prefix: False)
+    yield lookups
+    agent_ws._task_deployments.clear()
+
+
+def test_deployment_topic_skipped_without_local_subscribers(lookups):
+    topics = asyncio.run(agent_ws._task_update_topics("a1", 5))
+    assert topics == ("agent:a1", "fleet-summary")
+    assert lookups == []
+
+
+def test_deployment_topic_always_resolved_when_distributed(lookups, monkeypatch):
+    monkeypatch.setattr(event_bus, "is_distributed", lambda: True)
+    assert asyncio.run(agent_ws._task_update_topics("a1", 5)) == ("agent:a1", "fleet-summary", "deployment:7")
+    assert asyncio.run(agent_ws._task_update_topics("a1", "5"))[-1] == "deployment:7"
+    assert lookups == [5]
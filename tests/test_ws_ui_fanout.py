@@ -0,0 +1,175 @@
+"""Tests for the per-connection UI broadcast queues."""
+
+import asyncio
+import json
+
+from app.services import ws_manager as wsm
+
+
+class _FakeWS:
+    def __init__(self, stall: bool = False):
+        self.sent: list[str] = []
+        self.closed_with = None
+        self.stall = stall
+
+    async def send_text(self, text: str) -> None:
+        if self.stall:
+            await asyncio.sleep(3600)
+        self.sent.append(text)
+
+    async def close(self, code: int = 1000, reason: str = "") -> None:
+        self.closed_with = (code, reason)
+
+
+def test_payload_serialized_once_and_delivered_to_all(monkeypatch):
+    calls = []
+    real_encode = wsm.encode_message
+
+    def _counting_encode(message):
+        calls.append(message)
+        return real_encode(message)
+
+    monkeypatch.setattr(wsm, "encode_message", _counting_encode)
+
+    async def scenario():
+        mgr = wsm.WSManager()
+        a, b = _FakeWS(), _FakeWS()
+        await mgr.register_ui(a, user_id=1, role="admin")
+        await mgr.register_ui(b, user_id=2, role="viewer")
+        await mgr.broadcast_to_ui({"type": "x", "payload": {"n": 1}})
+        await asyncio.sleep(0.01)
+        await mgr.close_all()
+        return a, b, mgr.ui_stats()
+
+    a, b, stats = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert a.sent == b.sent == ['{"type":"x","payload":{"n":1}}']
+    assert stats["sent"] == 2
+
+
+def test_stalled_client_does_not_block_others(monkeypatch):
+    monkeypatch.setattr(wsm, "UI_SEND_TIMEOUT_SEC", 0.05)
+
+    async def scenario():
+        mgr = wsm.WSManager()
+        slow, fast = _FakeWS(stall=True), _FakeWS()
+        await mgr.register_ui(slow, user_id=1, role="admin")
+        await mgr.register_ui(fast, user_id=2, role="admin")
+        for i in range(3):
+            await mgr.broadcast_to_ui({"n": i})
+        await asyncio.sleep(0.01)
+        fast_count = len(fast.sent)
+        await asyncio.sleep(0.1)
+        return mgr, slow, fast_count
+
+    mgr, slow, fast_count = asyncio.run(scenario())
+    assert fast_count == 3
+    assert slow.closed_with == (1013, "send_timeout")
+    assert mgr.ui_count == 1
+    assert mgr.ui_stats()["send_timeouts"] == 1
+
+
+def test_queue_overflow_disconnects_slow_consumer(monkeypatch):
+    monkeypatch.setattr(wsm, "UI_SEND_QUEUE_MAX", 2)
+
+    async def scenario():
+        mgr = wsm.WSManager()
+        slow = _FakeWS(stall=True)
+        await mgr.register_ui(slow, user_id=1, role="admin")
+        for i in range(5):
+            await mgr.broadcast_to_ui({"n": i})
+        await asyncio.sleep(0.01)
+        return mgr, slow
+
+    mgr, slow = asyncio.run(scenario())
+    assert slow.closed_with == (1013, "slow_consumer")
+    assert mgr.ui_count == 0
+    assert mgr.ui_stats()["slow_consumer_disconnects"] == 1
+
+
+def test_status_batch_coalesces_per_agent_and_keeps_legacy_events():
+    async def scenario():
+        mgr = wsm.WSManager()
+        mgr.set_status_batch_interval(0.02)
+        legacy, batched = _FakeWS(), _FakeWS()
+        await mgr.register_ui(legacy, user_id=1, role="admin")
+        await mgr.register_ui(batched, user_id=2, role="admin", status_batch=True)
+        mgr.publish_agent_status({"uuid": "a1", "status": "online"})
+        mgr.publish_agent_status({"uuid": "a2", "status": "online"})
+        mgr.publish_agent_status({"uuid": "a1", "status": "offline"})
+        await asyncio.sleep(0.05)
+        await mgr.close_all()
+        return legacy, batched, mgr.ui_stats()
+
+    legacy, batched, stats = asyncio.run(scenario())
+    legacy_types = [json.loads(t)["type"] for t in legacy.sent]
+    assert legacy_types == ["server.agent.status"] * 3
+    assert len(batched.sent) == 1
+    frame = json.loads(batched.sent[0])
+    assert frame["type"] == "server.agent.status.batch"
+    assert frame["payload"]["items"] == [{"uuid": "a1", "status": "offline"}, {"uuid": "a2", "status": "online"}]
+    assert stats["status_coalesced"] == 1
+
+
+def test_status_batch_disabled_sends_single_events_to_everyone():
+    async def scenario():
+        mgr = wsm.WSManager()
+        mgr.set_status_batch_interval(0)
+        batched = _FakeWS()
+        await mgr.register_ui(batched, user_id=1, role="admin", status_batch=True)
+        mgr.publish_agent_status({"uuid": "a1", "status": "online"})
+        await asyncio.sleep(0.01)
+        await mgr.close_all()
+        return batched
+
+    batched = asyncio.run(scenario())
+    assert [json.loads(t)["type"] for t in batched.sent] == ["server.agent.status"]
+
+
+def test_topic_broadcast_reaches_only_matching_subscribers_and_firehose():
+    async def scenario():
+        mgr = wsm.WSManager()
+        firehose, agent_sub, other = _FakeWS(), _FakeWS(), _FakeWS()
+        await mgr.register_ui(firehose, user_id=1, role="admin")
+        conn_a = await mgr.register_ui(agent_sub, user_id=2, role="admin")
+        conn_o = await mgr.register_ui(other, user_id=3, role="admin")
+        topics, rejected = mgr.subscribe_ui(conn_a, ["agent:a1", "bogus topic"])
+        mgr.subscribe_ui(conn_o, ["announcement:7"])
+        await mgr.broadcast_to_ui({"n": 1}, topics=("agent:a1", "fleet-summary"))
+        await mgr.broadcast_to_ui({"n": 2})
+        mgr.unsubscribe_ui(conn_a, ["agent:a1"])
+        await mgr.broadcast_to_ui({"n": 3}, topics=("agent:a1",))
+        await asyncio.sleep(0.01)
+        await mgr.close_all()
+        return firehose, agent_sub, other, topics, rejected, mgr
+
+    firehose, agent_sub, other, topics, rejected, mgr = asyncio.run(scenario())
+    assert topics == ["agent:a1"]
+    assert rejected == ["bogus topic"]
+    assert [json.loads(t)["n"] for t in firehose.sent] == [1, 2, 3]
+    assert [json.loads(t)["n"] for t in agent_sub.sent] == [1, 2]
+    assert [json.loads(t)["n"] for t in other.sent] == [2]
+    assert mgr._topic_index == {}
+
+
+def test_status_batch_filtered_per_agent_subscription():
+    async def scenario():
+        mgr = wsm.WSManager()
+        mgr.set_status_batch_interval(0.02)
+        summary, agent_sub = _FakeWS(), _FakeWS()
+        conn_s = await mgr.register_ui(summary, user_id=1, role="admin", status_batch=True)
+        conn_a = await mgr.register_ui(agent_sub, user_id=2, role="admin", status_batch=True)
+        mgr.subscribe_ui(conn_s, ["fleet-summary"])
+        mgr.subscribe_ui(conn_a, ["agent:a2"])
+        mgr.publish_agent_status({"uuid": "a1", "status": "online"})
+        mgr.publish_agent_status({"uuid": "a2", "status": "online"})
+        await asyncio.sleep(0.05)
+        await mgr.unregister_ui(2)
+        stats = mgr.ui_stats()
+        await mgr.close_all()
+        return summary, agent_sub, stats
+
+    summary, agent_sub, stats = asyncio.run(scenario())
+    assert [len(json.loads(t)["payload"]["items"]) for t in summary.sent] == [2]
+    assert [json.loads(t)["payload"]["items"] for t in agent_sub.sent] == [[{"uuid": "a2", "status": "online"}]]
+    assert stats["topics"] == 1